@@ -52,6 +52,8 @@ def create_app() -> Flask:
     for apis in ConfigClass.API_MODULES:
         api = importlib.import_module(apis)
         api.module_api.init_app(app)
+        for command in getattr(api, 'commands', []):
+            app.cli.add_command(command)
 
     instrument_app(app)
 
@@ -64,10 +64,42 @@ class Settings(BaseSettings):
     WORKERS: int = 4
     THREADS: int = 2
     WORKER_CONNECTIONS: int = 5
+    PRELOAD_APP: bool = True
     DEBUG: bool = True
     NEO4J_URL: str
     NEO4J_USER: str
     NEO4J_PASS: str
+    NEO4J_MAX_CONNECTIONS: int = 50
+    NEO4J_CONNECTION_ACQUISITION_TIMEOUT: float = 60
+    NEO4J_MAX_CONNECTION_LIFETIME: int = 3600
+    NEO4J_WARM_UP: bool = True
+    NEO4J_MAX_SESSIONS: int = 20
+    NEO4J_SESSION_ACQUIRE_TIMEOUT: float = 30
+    NEO4J_SCHEMA_CACHE_TTL: int = 60
+    NEO4J_SHADOW_PROPERTIES_ENABLED: bool = False
+    NEO4J_SHADOW_PROPERTIES: List[str] = ['name', 'code', 'email']
+    NEO4J_SHADOW_INDEX_LABELS: List[str] = ['User', 'Container', 'File', 'Folder']
+    NEO4J_FULLTEXT_INDEXES: Dict[str, Dict[str, List[str]]] = {
+        'file_search': {'labels': ['File', 'Folder'], 'properties': ['name', 'description']},
+    }
+    NEO4J_TAG_INDEX_ENABLED: bool = False
+    NEO4J_SCHEMA_REQUIRED_FOR_READINESS: bool = False
+    NEO4J_COUNT_CACHE_ENABLED: bool = True
+    NEO4J_COUNT_CACHE_SIZE: int = 1024
+    NEO4J_COUNT_CACHE_TTL: int = 10
+    NEO4J_GEID_CACHE_ENABLED: bool = True
+    NEO4J_GEID_CACHE_SIZE: int = 10000
+    NEO4J_GEID_CACHE_TTL: int = 5
+    NEO4J_PROPERTY_CATALOG_ENABLED: bool = False
+    NEO4J_PROPERTY_CATALOG_MAX_VALUES: int = 1000
+    NEO4J_SINGLE_FLIGHT_ENABLED: bool = True
+    NEO4J_SINGLE_FLIGHT_IGNORED_KEYS: List[str] = []
+    NEO4J_INGEST_BATCH_SIZE: int = 1000
+    NEO4J_INGEST_PARALLELISM: int = 4
+    NEO4J_INGEST_JOB_TTL: int = 3600
+    NEO4J_GROUP_COMMIT_ENABLED: bool = False
+    NEO4J_GROUP_COMMIT_MAX_WAIT: float = 0.005
+    NEO4J_GROUP_COMMIT_MAX_BATCH: int = 100
     DATA_OPS_UTIL: str
     API_MODULES: List[str] = ['neo4j_api']
     OPEN_TELEMETRY_ENABLED: bool = False
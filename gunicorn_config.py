@@ -27,6 +27,21 @@ threads = _settings.THREADS
 bind = f'{_settings.HOST}:{_settings.PORT}'
 daemon = 'false'
 worker_connections = _settings.WORKER_CONNECTIONS
+preload_app = _settings.PRELOAD_APP
 accesslog = 'access.log'
 errorlog = 'error.log'
 loglevel = _settings.LOGLEVEL
+
+
+def post_fork(server, worker):
+    # the neo4j pools are opened lazily per process, warming up
+    # here moves the connect cost out of the first request
+    if not _settings.NEO4J_WARM_UP:
+        return
+
+    from neo4j_api import neo4j_gateway
+
+    try:
+        neo4j_gateway.warm_up()
+    except Exception as e:
+        server.log.warning(f'Neo4j warm up failed in worker {worker.pid}: {e}')
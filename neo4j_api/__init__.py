@@ -26,7 +26,22 @@
 # from flask_restful import Api
 from flask_restx import Api, Resource, fields
 from config import ConfigClass
-from neo4j import GraphDatabase
+from .neo4j_gateway import Neo4jGateway
+from .neo4j_session import SessionManager
+from .cache import CountCache
+from .cache import GeidCache
+from .cache import WriteEpochs
+from .count_planner import CountPlanner
+from .fulltext import FulltextIndexes
+from .group_commit import GroupCommit
+from .ingest import IngestJobs
+from .property_catalog import PropertyCatalog
+from .query_planner import PredicatePlanner
+from .query_planner import SchemaIndexCatalog
+from .schema_registry import SchemaRegistry
+from .shadow_properties import ShadowProperties
+from .single_flight import SingleFlight
+from .tag_index import TagIndex
 
 # first check the necessary config parameter
 required_parameters = ["NEO4J_URL", "NEO4J_PASS", "NEO4J_USER"]
@@ -35,8 +50,78 @@ for x in required_parameters:
 		raise Exception("Error: Missing the attribute %s in config."%x)
 
 
-neo4j_connection = GraphDatabase.driver(ConfigClass.NEO4J_URL, 
-	auth=(ConfigClass.NEO4J_USER, ConfigClass.NEO4J_PASS),encrypted=False)
+# the single gateway shared by every resource of this worker,
+# it only connects on first use after the worker is forked
+neo4j_gateway = Neo4jGateway(
+	ConfigClass.NEO4J_URL,
+	ConfigClass.NEO4J_USER,
+	ConfigClass.NEO4J_PASS,
+	max_connections=ConfigClass.NEO4J_MAX_CONNECTIONS,
+	connection_acquisition_timeout=ConfigClass.NEO4J_CONNECTION_ACQUISITION_TIMEOUT,
+	max_connection_lifetime=ConfigClass.NEO4J_MAX_CONNECTION_LIFETIME,
+)
+# kept for the scripts still using neo4j_connection.session()
+neo4j_connection = neo4j_gateway
+# bounded, request scoped sessions on top of the gateway driver
+neo4j_sessions = SessionManager(
+	neo4j_gateway,
+	max_sessions=ConfigClass.NEO4J_MAX_SESSIONS,
+	acquire_timeout=ConfigClass.NEO4J_SESSION_ACQUIRE_TIMEOUT,
+)
+# the indexes known to neo4j, used to choose the query operators
+schema_index_catalog = SchemaIndexCatalog(neo4j_sessions, ttl=ConfigClass.NEO4J_SCHEMA_CACHE_TTL)
+# lower cased copies of the properties searched case insensitive
+shadow_properties = ShadowProperties(
+	ConfigClass.NEO4J_SHADOW_PROPERTIES,
+	enabled=ConfigClass.NEO4J_SHADOW_PROPERTIES_ENABLED,
+)
+predicate_planner = PredicatePlanner(
+	schema_index_catalog,
+	shadow_properties=shadow_properties,
+)
+# lucene indexes used by the fulltext search mode
+fulltext_indexes = FulltextIndexes(schema_index_catalog, ConfigClass.NEO4J_FULLTEXT_INDEXES)
+# (:Tag) nodes linked from the tagged nodes
+tag_index = TagIndex(neo4j_sessions, enabled=ConfigClass.NEO4J_TAG_INDEX_ENABLED)
+# indexes and constraints the queries rely on
+schema_registry = SchemaRegistry(schema_index_catalog)
+# counts answered from the count store or an index
+count_planner = CountPlanner(schema_index_catalog, neo4j_sessions)
+# bumped by the writes of this worker, they invalidate the cached counts
+write_epochs = WriteEpochs()
+count_cache = CountCache(
+	write_epochs,
+	maxsize=ConfigClass.NEO4J_COUNT_CACHE_SIZE,
+	ttl=ConfigClass.NEO4J_COUNT_CACHE_TTL,
+	enabled=ConfigClass.NEO4J_COUNT_CACHE_ENABLED,
+)
+# serialised nodes by global_entity_id, the ttl bounds the staleness
+# left by the writes of the other workers
+geid_cache = GeidCache(
+	maxsize=ConfigClass.NEO4J_GEID_CACHE_SIZE,
+	ttl=ConfigClass.NEO4J_GEID_CACHE_TTL,
+	enabled=ConfigClass.NEO4J_GEID_CACHE_ENABLED,
+)
+# distinct property values per label, kept up to date by the writes
+property_catalog = PropertyCatalog(
+	neo4j_sessions,
+	enabled=ConfigClass.NEO4J_PROPERTY_CATALOG_ENABLED,
+	max_values=ConfigClass.NEO4J_PROPERTY_CATALOG_MAX_VALUES,
+)
+# identical reads running at the same time share one execution
+single_flight = SingleFlight(
+	write_epochs,
+	enabled=ConfigClass.NEO4J_SINGLE_FLIGHT_ENABLED,
+	ignored_keys=ConfigClass.NEO4J_SINGLE_FLIGHT_IGNORED_KEYS,
+)
+# progress of the ndjson streams written by this worker
+ingest_jobs = IngestJobs(ttl=ConfigClass.NEO4J_INGEST_JOB_TTL)
+# single node and relation writes arriving together share a transaction
+group_commit = GroupCommit(
+	max_wait=ConfigClass.NEO4J_GROUP_COMMIT_MAX_WAIT,
+	max_batch=ConfigClass.NEO4J_GROUP_COMMIT_MAX_BATCH,
+	enabled=ConfigClass.NEO4J_GROUP_COMMIT_ENABLED,
+)
 
 page_description="Neo4j is the GraphDB modeling used in project. " \
 				 "As of the Release 0.2.0, there are 2 different types" \
@@ -58,6 +143,10 @@ module_api = Api(version='1.0', title='Neo4j API',
 node_ns = module_api.namespace('Node', description='Operation on Neo4j Nodes', path ='/')
 # create namespace for relationship
 relationship_ns = module_api.namespace('Relationship', description='Operation on Neo4j Relationship', path ='/')
+# create namespace for service administration
+admin_ns = module_api.namespace('Admin', description='Operation on the service itself', path ='/')
+# create namespace for the streaming writes
+ingest_ns = module_api.namespace('Ingest', description='Streaming writes of nodes and relationships', path ='/')
 
 
 from .neo4j_node_api import (
@@ -70,9 +159,11 @@ from .neo4j_node_api import (
 	ActionOnProperty,
     ChangeLabels,
     NodeQueryAPI,
+    NodeFacetsAPI,
 	NodeQuickCountAPI,
 	FileQuickCountAPI,
 	BatchUpdate,
+	BatchPatch,
     QueryByGeidBulk,
     BulkUpdate,
 )
@@ -86,6 +177,20 @@ from .neo4j_relation_api import (
 	RelationshipQueryV2,
 	RelationConnected
 )
+from .neo4j_admin_api import (
+	PoolStats,
+	CacheStats,
+	SchemaStatus,
+	Readiness,
+)
+from .neo4j_ingest_api import (
+	IngestStream,
+	IngestJobStatus,
+)
+from .commands import neo4j_cli
+
+# flask cli commands registered by create_app
+commands = [neo4j_cli]
 
 
 node_ns.add_resource(ActionOnNodeById, '/v1/neo4j/nodes/<label>/node/<id>')
@@ -95,6 +200,7 @@ node_ns.add_resource(BatchCreateNode, '/v1/neo4j/nodes/<label>/batch')
 node_ns.add_resource(ActionOnNodeByQuery, '/v1/neo4j/nodes/<label>/query')
 node_ns.add_resource(CountActionOnNodeByQuery, '/v1/neo4j/nodes/<label>/query/count')
 node_ns.add_resource(NodeQueryAPI, '/v2/neo4j/nodes/query')
+node_ns.add_resource(NodeFacetsAPI, '/v2/neo4j/nodes/query/facets')
 node_ns.add_resource(NodeQuickCountAPI, '/v1/neo4j/nodes/quick/count')
 node_ns.add_resource(FileQuickCountAPI, '/v1/neo4j/file/quick/count')
 node_ns.add_resource(BatchUpdate,'/v1/neo4j/nodes/<node_property>/batch/update')
@@ -102,6 +208,7 @@ node_ns.add_resource(ActionOnProperty, '/v1/neo4j/nodes/<label>/properties')
 node_ns.add_resource(ChangeLabels, '/v1/neo4j/nodes/<id>/labels')
 node_ns.add_resource(QueryByGeidBulk, '/v1/neo4j/nodes/query/geids')
 node_ns.add_resource(BulkUpdate, '/v2/neo4j/nodes/batch/update')
+node_ns.add_resource(BatchPatch, '/v2/neo4j/nodes/batch/patch')
 
 relationship_ns.add_resource(RelationshipActions, '/v1/neo4j/relations/<label>')
 relationship_ns.add_resource(BatchRelationshipActions, '/v1/neo4j/relations/<label>/batch')
@@ -114,6 +221,14 @@ relationship_ns.add_resource(ActionOnNodeByRelationships, '/v1/neo4j/relations/<
 
 relationship_ns.add_resource(RelationConnected, '/v1/neo4j/relations/connected/<geid>')
 
+admin_ns.add_resource(PoolStats, '/v1/neo4j/admin/pool')
+admin_ns.add_resource(CacheStats, '/v1/neo4j/admin/cache')
+admin_ns.add_resource(SchemaStatus, '/v1/neo4j/admin/schema')
+admin_ns.add_resource(Readiness, '/v1/neo4j/admin/ready')
+
+ingest_ns.add_resource(IngestStream, '/v1/neo4j/ingest')
+ingest_ns.add_resource(IngestJobStatus, '/v1/neo4j/ingest/jobs/<job_id>')
+
 # # Actions on specific dataset
 # module_api.add_resource(dataset, '/v1/datasets/<dataset_id>')
 
@@ -0,0 +1,262 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+#
+# in process caches of the query results. the entries are
+# bounded in number and in age, and the counts are also
+# dropped as soon as a write touches one of their labels:
+# every write path bumps the epoch of the labels it wrote
+# and a count is only served while the epochs it was taken
+# at are unchanged. the epochs are per worker, the writes
+# done by another worker are only seen after the ttl
+#
+
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from neo4j_api.cypher_builder import split_labels
+
+# epoch bumped by the writes whose labels are not known,
+# every stamp depends on it
+ANY_LABEL = '*'
+# epoch of the relationships, relationship counts depend on it
+RELATIONSHIPS = '()-[]-()'
+
+MISSING = object()
+
+
+class TTLCache(object):
+    '''
+    thread safe lru mapping whose entries expire after ttl
+    seconds
+    '''
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, MISSING)
+            if entry is MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, MISSING)
+        return None if entry is MISSING else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evictions': self.evictions,
+            }
+
+
+class WriteEpochs(object):
+    '''
+    per label write counters
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._epochs = {}
+        self._total = 0
+
+    def bump(self, labels=None):
+        names = set(split_labels(labels)) or {ANY_LABEL}
+        with self._lock:
+            for name in names:
+                self._epochs[name] = self._epochs.get(name, 0) + 1
+            self._total += 1
+
+    def stamp(self, labels):
+        '''
+        the epochs a result read from the labels depends on, a
+        result read without labels depends on every write
+        '''
+        if labels is None:
+            with self._lock:
+                return (self._total,)
+        names = sorted(set(split_labels(labels)) | {ANY_LABEL})
+        with self._lock:
+            return tuple(self._epochs.get(name, 0) for name in names)
+
+
+def cache_key(shape, params):
+    '''
+    the key of a query shape with its parameters, the same
+    parameters in another order give the same key
+    '''
+    return shape, json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)
+
+
+class CountCache(object):
+    '''
+    counts keyed by the query shape and parameters, dropped when
+    one of the labels they were read from is written
+    '''
+
+    def __init__(self, epochs, maxsize=1024, ttl=10, enabled=True):
+        self.epochs = epochs
+        self.enabled = enabled
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.stale = 0
+
+    def get_or_count(self, shape, labels, params, count):
+        '''
+        return the cached count of the shape and parameters, the
+        count() function is only called on a miss
+        '''
+        if not self.enabled:
+            return count()
+        key = cache_key(shape, params)
+        # taken before counting, a write landing meanwhile makes
+        # the new entry stale straight away
+        stamp = self.epochs.stamp(labels)
+        entry = self._cache.get(key, MISSING)
+        if entry is not MISSING:
+            if entry[0] == stamp:
+                return entry[1]
+            self.stale += 1
+        result = count()
+        self._cache.set(key, (stamp, result))
+        return result
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        stats = self._cache.stats()
+        # the stale entries were found but not served
+        stats['hits'] -= self.stale
+        stats['misses'] += self.stale
+        stats.update({'enabled': self.enabled, 'stale': self.stale})
+        return stats
+
+
+class GeidCache(object):
+    '''
+    read through cache of the serialised nodes keyed by their
+    global_entity_id. the writes of this worker invalidate the
+    entries, the ttl bounds how long a write of another worker
+    can go unseen
+    '''
+
+    def __init__(self, maxsize=10000, ttl=5, enabled=True):
+        self.enabled = enabled
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        # bumped by every invalidation, a load overlapping one is
+        # not cached as it may have read the old node
+        self._generation = 0
+        self.invalidations = 0
+
+    def get_many(self, geids, load):
+        '''
+        return the serialised nodes of the geids, load(geids) is
+        called with the ones missing from the cache and returns
+        their serialised nodes. the geids not found are left out
+        '''
+        if not self.enabled:
+            return load(list(geids))
+        geids = list(dict.fromkeys(geids))
+        found = {}
+        for geid in geids:
+            node = self._cache.get(geid, MISSING)
+            if node is not MISSING:
+                found[geid] = node
+        missing = [x for x in geids if x not in found]
+        if missing:
+            generation = self._generation
+            loaded = {x.get('global_entity_id'): x for x in load(missing)}
+            with self._lock:
+                if generation == self._generation:
+                    for geid, node in loaded.items():
+                        self._cache.set(geid, copy.deepcopy(node))
+            found.update(loaded)
+        # deep copies, the callers are free to change them down to
+        # their nested lists
+        return [copy.deepcopy(found[x]) for x in geids if x in found]
+
+    def get(self, geid, load):
+        nodes = self.get_many([geid], load)
+        return nodes[0] if nodes else None
+
+    def invalidate(self, geids=None):
+        '''
+        drop the entries of the geids, None drops all of them
+        '''
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            if geids is None:
+                self._cache.clear()
+                return
+            for geid in geids:
+                if geid is not None:
+                    self._cache.pop(geid)
+
+    def stats(self):
+        stats = self._cache.stats()
+        stats.update({'enabled': self.enabled, 'invalidations': self.invalidations})
+        return stats
@@ -0,0 +1,109 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+#
+# maintenance commands, they are registered on the flask cli
+# by create_app and run with:
+#
+#   FLASK_APP="app:create_app()" flask neo4j <command>
+#
+
+import click
+from flask.cli import AppGroup
+
+from config import ConfigClass
+from neo4j_api import fulltext_indexes
+from neo4j_api import neo4j_sessions
+from neo4j_api import property_catalog
+from neo4j_api import schema_registry
+from neo4j_api import shadow_properties
+from neo4j_api import tag_index
+
+neo4j_cli = AppGroup('neo4j', help='Maintenance of the neo4j data used by the service.')
+
+
+@neo4j_cli.command('backfill-shadow-properties')
+@click.option('--label', default=None, help='Only backfill the nodes with this label.')
+@click.option('--batch-size', default=10000, show_default=True, help='Nodes updated per transaction.')
+@click.option('--skip-indexes', is_flag=True, help='Do not create the indexes on the shadow properties.')
+def backfill_shadow_properties(label, batch_size, skip_indexes):
+    """Write the lower cased shadow properties of the existing nodes."""
+
+    if not skip_indexes:
+        labels = [label] if label else ConfigClass.NEO4J_SHADOW_INDEX_LABELS
+        shadow_properties.create_indexes(neo4j_sessions, labels)
+        click.echo(f'Indexes created for {", ".join(labels)}')
+
+    updated = shadow_properties.backfill(neo4j_sessions, label=label, batch_size=batch_size)
+    for key, count in updated.items():
+        click.echo(f'{key}: {count} nodes updated')
+
+
+@neo4j_cli.command('create-fulltext-indexes')
+def create_fulltext_indexes():
+    """Create the fulltext indexes of NEO4J_FULLTEXT_INDEXES missing in neo4j."""
+
+    created = fulltext_indexes.create(neo4j_sessions)
+    click.echo(f'Created: {", ".join(created) or "nothing"}')
+
+
+@neo4j_cli.command('drop-fulltext-index')
+@click.argument('name')
+def drop_fulltext_index(name):
+    """Drop a fulltext index."""
+
+    fulltext_indexes.drop(neo4j_sessions, name)
+    click.echo(f'Dropped {name}')
+
+
+@neo4j_cli.command('rebuild-tag-index')
+@click.option('--batch-size', default=10000, show_default=True, help='Nodes relinked per transaction.')
+def rebuild_tag_index(batch_size):
+    """Link every tagged node to its (:Tag) nodes."""
+
+    tag_index.create_indexes(neo4j_sessions)
+    count = tag_index.rebuild(neo4j_sessions, batch_size=batch_size)
+    click.echo(f'{count} nodes relinked')
+
+
+@neo4j_cli.command('rebuild-property-catalog')
+@click.option('--label', default=None, help='Only rebuild the catalog of this label.')
+@click.option('--batch-size', default=10000, show_default=True, help='Nodes read per query.')
+def rebuild_property_catalog(label, batch_size):
+    """Record the distinct property values of every node in the property catalog."""
+
+    property_catalog.create_indexes(neo4j_sessions)
+    count = property_catalog.rebuild(neo4j_sessions, label=label, batch_size=batch_size)
+    click.echo(f'{count} nodes recorded')
+
+
+@neo4j_cli.command('ensure-schema')
+@click.option('--dry-run', is_flag=True, help='Only report what would be created.')
+def ensure_schema(dry_run):
+    """Create the missing indexes and uniqueness constraints of the schema registry."""
+
+    result = schema_registry.ensure(neo4j_sessions, dry_run=dry_run)
+    for definition in schema_registry.status(refresh=True):
+        click.echo(f'{definition["name"]}: {definition["state"]}')
+    click.echo(f'{"Would create" if dry_run else "Created"}: {", ".join(result["created"]) or "nothing"}')
+    for name in result['skipped']:
+        click.echo(f'Skipped {name}: a plain index exists on the property, drop it to add the constraint')
+    for name, error in result['failed'].items():
+        click.echo(f'Failed {name}: {error}')
@@ -0,0 +1,98 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+#
+# conditional requests. the node responses carry strong etags
+# hashed from the serialised body, so any change of a property
+# changes them, with or without a new time_lastmodified. a
+# client sending back the etag in If-None-Match, or the
+# Last-Modified date of a single node in If-Modified-Since,
+# gets a 304 without the body. Last-Modified only follows
+# time_lastmodified, the lists do not send it since a deleted
+# node does not change their newest time_lastmodified
+#
+
+import hashlib
+import json
+from datetime import datetime
+from datetime import timezone
+
+from flask import request
+from werkzeug.http import http_date
+from werkzeug.http import parse_date
+from werkzeug.http import quote_etag
+from werkzeug.http import unquote_etag
+
+
+def _digest(value):
+    return hashlib.sha1(json.dumps(value, default=str, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+
+
+def body_etag(*parts):
+    '''
+    strong etag of the serialised body of a response, the extra
+    parts are the headers it depends on
+    '''
+    return quote_etag(_digest(list(parts)))
+
+
+def last_modified(nodes):
+    '''
+    http date of the newest time_lastmodified of the nodes, the
+    stored times are utc
+    '''
+    modified = [x.get('time_lastmodified') for x in nodes if x.get('time_lastmodified')]
+    if not modified:
+        return None
+    try:
+        newest = datetime.fromisoformat(max(modified)[:19])
+    except ValueError:
+        return None
+    return http_date(newest.replace(tzinfo=timezone.utc))
+
+
+def conditional_request():
+    return bool(request.if_none_match) or request.if_modified_since is not None
+
+
+def not_modified(etag, modified=None):
+    '''
+    whether the validators of the request match the current ones,
+    If-Modified-Since is only checked without If-None-Match
+    '''
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(unquote_etag(etag)[0])
+    if modified and request.if_modified_since:
+        return parse_date(modified).replace(tzinfo=None) <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+
+def validated(result, etag, modified=None, status=200, headers=None):
+    '''
+    the flask-restx return value of a response carrying the
+    validators, a 304 without body when the client has it
+    '''
+    headers = dict(headers or {})
+    headers['ETag'] = etag
+    if modified:
+        headers['Last-Modified'] = modified
+    if not_modified(etag, modified):
+        return None, 304, headers
+    return result, status, headers
@@ -0,0 +1,69 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+#
+# the quick counts all ran a full match. neo4j keeps the number
+# of nodes of each label in its count store, so a count on a
+# single label without filter is answered in constant time,
+# and a count filtered on equalities of an indexed property
+# only reads the index. the planner picks the cheapest shape
+# and reports it, the other filters keep the full match
+#
+
+from neo4j_api.cypher_builder import CypherQuery
+from neo4j_api.cypher_builder import escape_identifier
+from neo4j_api.cypher_builder import format_labels
+from neo4j_api.cypher_builder import split_labels
+
+# the paths a count can take, reported in COUNT_PATH_HEADER
+COUNT_STORE = 'count-store'
+COUNT_INDEX = 'index'
+COUNT_MATCH = 'match'
+
+COUNT_PATH_HEADER = 'X-Count-Path'
+
+
+class CountPlanner(object):
+
+    def __init__(self, index_catalog, sessions):
+        self.index_catalog = index_catalog
+        self._sessions = sessions
+
+    def plan(self, labels, equalities):
+        '''
+        return the path and the (query, params) counting the nodes
+        of the labels whose properties equal the given values
+        '''
+        names = split_labels(labels)
+        if not equalities and len(names) == 1:
+            path = COUNT_STORE
+        elif any(self.index_catalog.has_index(names, key) for key in equalities):
+            path = COUNT_INDEX
+        else:
+            path = COUNT_MATCH
+        query = CypherQuery()
+        query.add(f'MATCH (n{format_labels(names)})')
+        query.where([f'n.{escape_identifier(key)} = {query.param(key, value)}' for key, value in equalities.items()])
+        query.add('RETURN count(n) AS count')
+        return path, query.build()
+
+    def count(self, labels, equalities):
+        path, (query, params) = self.plan(labels, equalities)
+        return self._sessions.run(query, **params)[0][0], path
@@ -0,0 +1,136 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+#
+# small helper to build cypher text with a stable shape. all
+# the values go to the parameter map, the query text only
+# depends on which keys and operators are used so neo4j can
+# reuse the cached plan between requests. labels, types and
+# property keys can not be parameters and are escaped instead
+#
+
+import re
+
+import neo4j.time
+import neotime
+
+_SIMPLE_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def escape_identifier(name):
+    name = str(name)
+    if _SIMPLE_IDENTIFIER.match(name):
+        return name
+    return '`' + name.replace('`', '``') + '`'
+
+
+def split_labels(labels, separator=':'):
+    '''
+    the label names of a label, a list of labels or a
+    "Greenroom:File" style string
+    '''
+    if not labels:
+        return []
+    if not isinstance(labels, (list, tuple)):
+        labels = [labels]
+    names = []
+    for label in labels:
+        if label:
+            names.extend(x for x in str(label).split(separator) if x)
+    return names
+
+
+def format_labels(labels, separator=':'):
+    '''
+    turn a label, a list of labels or a "Greenroom:File" style
+    string into the ":Greenroom:File" cypher fragment
+    '''
+    names = split_labels(labels, separator)
+    if not names:
+        return ''
+    return ':' + separator.join(escape_identifier(x) for x in names)
+
+
+def driver_value(value):
+    '''
+    the neo4j driver only packs its own temporal types, the
+    neotime ones used with py2neo are converted
+    '''
+    if isinstance(value, neotime.DateTime):
+        return neo4j.time.DateTime.from_iso_format(value.iso_format())
+    return value
+
+
+def format_order_type(order_type):
+    if not order_type:
+        return ''
+    if order_type.lower() not in ['asc', 'desc']:
+        raise Exception('Invalid order_type')
+    return ' ' + order_type.upper()
+
+
+class CypherQuery(object):
+
+    def __init__(self):
+        self.clauses = []
+        self.params = {}
+
+    def param(self, name, value):
+        '''
+        register the value and return the placeholder for it, the
+        name is suffixed when it is already taken
+        '''
+        name = re.sub(r'\W', '_', str(name))
+        unique_name = name
+        count = 1
+        while unique_name in self.params:
+            unique_name = f'{name}_{count}'
+            count += 1
+        self.params[unique_name] = driver_value(value)
+        return '$' + unique_name
+
+    def bind(self, params):
+        '''
+        register values whose placeholders are already in the
+        clauses, such as the ones of compiled py2neo predicates
+        '''
+        self.params.update({name: driver_value(value) for name, value in params.items()})
+        return self
+
+    def add(self, clause):
+        if clause:
+            self.clauses.append(clause)
+        return self
+
+    def where(self, conditions, keyword='WHERE'):
+        conditions = [x for x in conditions if x]
+        if conditions:
+            self.clauses.append(keyword + ' ' + ' AND '.join(conditions))
+        return self
+
+    def page(self, skip=None, limit=None):
+        if skip:
+            self.clauses.append('SKIP ' + self.param('skip', int(skip)))
+        if limit:
+            self.clauses.append('LIMIT ' + self.param('limit', int(limit)))
+        return self
+
+    def build(self):
+        return ' '.join(self.clauses), self.params
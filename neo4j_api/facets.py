@@ -0,0 +1,85 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+#
+# value counts of several properties over the nodes matching
+# a query, for the filter sidebars. each matching node is
+# read once and its value of every facet is counted, the
+# labels facet counts the labels of the nodes and the list
+# properties count each of their items
+#
+
+FACET_LABELS = 'labels'
+# properties holding a list of values
+LIST_FACETS = ['tags', 'system_tags']
+
+DEFAULT_FACET_LIMIT = 20
+MAX_FACET_LIMIT = 1000
+
+# appended to a match binding the nodes to "_"
+_AGGREGATION = f'''
+WITH _ UNWIND $facets AS facet
+UNWIND CASE
+    WHEN facet = '{FACET_LABELS}' THEN labels(_)
+    WHEN facet IN $list_facets THEN coalesce(_[facet], [])
+    ELSE [_[facet]]
+END AS value
+WITH facet, value, count(*) AS count WHERE value IS NOT NULL
+WITH facet, value, count ORDER BY count DESC
+RETURN facet, collect({{value: value, count: count}})[..$facet_limit] AS values
+'''
+
+
+def check_facets(facets):
+    if not facets or not isinstance(facets, list) or not all(isinstance(x, str) for x in facets):
+        raise Exception('facets needs to be a list of properties')
+
+
+def facet_query(match_query, facets, limit=DEFAULT_FACET_LIMIT):
+    '''
+    turn the "... RETURN _" query of a node match into the
+    aggregation of the facets, return the query and its extra
+    parameters
+    '''
+    check_facets(facets)
+    query = match_query[:match_query.rindex(' RETURN _')] + _AGGREGATION
+    params = {
+        'facets': list(dict.fromkeys(facets)),
+        'list_facets': LIST_FACETS,
+        'facet_limit': max(1, min(int(limit), MAX_FACET_LIMIT)),
+    }
+    return query, params
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (bool, int, float, str, list)):
+        return value
+    return str(value)
+
+
+def facet_result(records, facets):
+    '''
+    {<facet>: [{"value": <value>, "count": <count>}]}, with an
+    empty list for the facets without any value
+    '''
+    result = {x: [] for x in facets}
+    for record in records:
+        result[record['facet']] = [{'value': _json_value(x['value']), 'count': x['count']} for x in record['values']]
+    return result
@@ -0,0 +1,117 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+#
+# the partial search compares every node of the label with a
+# regex or CONTAINS. the fulltext search mode asks one of the
+# configured lucene indexes for the matching nodes instead.
+# requests on keys that no online fulltext index covers keep
+# the regular partial search
+#
+
+import re
+
+from logger import LoggerFactory
+
+FULLTEXT_MODE = 'fulltext'
+
+_LUCENE_SPECIAL = re.compile(r'([+\-&|!(){}\[\]^"~*?:\\/])')
+
+
+def lucene_term(value):
+    '''
+    turn a user input into a lucene query matching every word of
+    it anywhere in the field
+    '''
+    words = [_LUCENE_SPECIAL.sub(r'\\\1', x.lower()) for x in value.split()]
+    return ' AND '.join(f'*{x}*' for x in words if x)
+
+
+class FulltextIndexes(object):
+
+    def __init__(self, index_catalog, definitions):
+        self._logger = LoggerFactory('api_invitation').get_logger()
+        self.index_catalog = index_catalog
+        # {<index-name>: {'labels': [...], 'properties': [...]}}
+        self.definitions = definitions
+
+    def online(self):
+        return {
+            x['name'] for x in self.index_catalog.indexes()
+            if x['type'] == 'FULLTEXT' and x['state'] == 'ONLINE'
+        }
+
+    def find(self, labels, keys):
+        '''
+        return the name of the online index covering the most of
+        the keys together with the covered keys
+        '''
+        if isinstance(labels, str):
+            labels = [labels]
+        online = self.online()
+        best_name, best_keys = None, []
+        for name, definition in self.definitions.items():
+            if name not in online or not set(labels) & set(definition['labels']):
+                continue
+            covered = [x for x in keys if x in definition['properties']]
+            if len(covered) > len(best_keys):
+                best_name, best_keys = name, covered
+        return best_name, best_keys
+
+    def plan(self, labels, filters):
+        '''
+        split the string filters between the fulltext index and the
+        regular predicates. return the index name, the lucene query
+        and the keys it handles, or None when no index applies
+        '''
+        keys = [key for key, value in filters.items() if isinstance(value, str) and value]
+        name, covered = self.find(labels, keys)
+        if not name:
+            return None
+        search = ' AND '.join(f'{key}:({lucene_term(filters[key])})' for key in covered)
+        return name, search, covered
+
+    @staticmethod
+    def call_clause(index_param, search_param, variable):
+        return f'CALL db.index.fulltext.queryNodes({index_param}, {search_param}) YIELD node AS {variable}'
+
+    def create(self, sessions):
+        '''
+        create the configured indexes missing in neo4j
+        '''
+        existing = {x['name'] for x in self.index_catalog.refresh()}
+        created = []
+        for name, definition in self.definitions.items():
+            if name in existing:
+                continue
+            sessions.run(
+                'CALL db.index.fulltext.createNodeIndex($name, $labels, $properties)',
+                name=name,
+                labels=definition['labels'],
+                properties=definition['properties'],
+            )
+            self._logger.info(f'Created the fulltext index {name}')
+            created.append(name)
+        self.index_catalog.refresh()
+        return created
+
+    def drop(self, sessions, name):
+        sessions.run('CALL db.index.fulltext.drop($name)', name=name)
+        self.index_catalog.refresh()
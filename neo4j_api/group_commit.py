@@ -0,0 +1,123 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+#
+# group commit. the single node and relation writes of a worker
+# arriving within max_wait seconds of each other are written in
+# one transaction. the first write of a batch waits for the
+# others, up to max_wait or max_batch items, then writes them all
+# and hands each caller its own result. when the transaction of
+# a batch fails its items are written again one by one, so one
+# invalid item only fails its own request
+#
+
+import threading
+
+
+class _Batch(object):
+
+    def __init__(self):
+        self.items = []
+        self.results = None
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class GroupCommit(object):
+
+    def __init__(self, max_wait=0.005, max_batch=100, enabled=False):
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._batches = {}
+        self.batches = 0
+        self.items = 0
+        self.retried = 0
+
+    def submit(self, key, item, write):
+        '''
+        return the result of item, written with the items of the same key
+        by write(key, items). write returns one result per item, an
+        exception in place of a result is raised to the caller of its item
+        '''
+        if not self.enabled:
+            return self._result(write(key, [item])[0])
+        with self._lock:
+            batch = self._batches.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._batches[key] = _Batch()
+            index = len(batch.items)
+            batch.items.append(item)
+            if len(batch.items) >= self.max_batch:
+                # the next item of the key starts another batch
+                del self._batches[key]
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.max_wait)
+            with self._lock:
+                if self._batches.get(key) is batch:
+                    del self._batches[key]
+            try:
+                batch.results = self._write(key, batch.items, write)
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+        return self._result(batch.results[index])
+
+    def _write(self, key, items, write):
+        with self._lock:
+            self.batches += 1
+            self.items += len(items)
+        try:
+            return write(key, items)
+        except Exception as e:
+            if len(items) == 1:
+                return [e]
+        with self._lock:
+            self.retried += 1
+        results = []
+        for item in items:
+            try:
+                results += write(key, [item])
+            except Exception as e:
+                results.append(e)
+        return results
+
+    @staticmethod
+    def _result(result):
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'max_wait': self.max_wait,
+                'max_batch': self.max_batch,
+                'batches': self.batches,
+                'items': self.items,
+                'retried': self.retried,
+                'open': len(self._batches),
+            }
@@ -0,0 +1,347 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+#
+# chunked ingest. a large batch written in one transaction
+# holds its locks and its whole state in the neo4j heap until
+# the commit. the rows are cut in chunks written in their own
+# transaction, a bounded number of them at the same time. the
+# rows are read lazily, only the chunks being written are in
+# memory. each chunk reports its own status, the failed ones
+# can be sent again alone. the ndjson streams go through the
+# same pipeline, their records are parsed one line at a time
+# and grouped in batches of the same labels
+#
+
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ALL_COMPLETED
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from itertools import islice
+
+from .cache import TTLCache
+
+CHUNK_SUCCESS = 'success'
+CHUNK_FAILED = 'failed'
+
+NODE_RECORD = 'node'
+RELATIONSHIP_RECORD = 'relationship'
+INGEST_JOB_HEADER = 'X-Ingest-Job'
+# the first errors of a job are kept, the other ones only counted
+MAX_JOB_ERRORS = 20
+
+
+def chunks(rows, size):
+    '''
+    yield (offset, rows) for consecutive chunks of the rows
+    '''
+    rows = iter(rows)
+    offset = 0
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield offset, chunk
+        offset += len(chunk)
+
+
+def _positive(value, name):
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValueError(f'{name} needs to be a positive integer')
+    return value
+
+
+def batch_options(options, batch_size, parallelism, max_parallelism):
+    '''
+    the batch_size and parallelism of the request options, with the
+    defaults given. parallelism is capped by max_parallelism, the
+    values that are not positive integers raise a ValueError
+    '''
+    batch_size = _positive(options.get('batch_size', batch_size), 'batch_size')
+    parallelism = _positive(options.get('parallelism', parallelism), 'parallelism')
+    return batch_size, min(parallelism, max_parallelism)
+
+
+def _write_chunk(write, index, offset, rows):
+    status = {'chunk': index, 'offset': offset, 'size': len(rows)}
+    try:
+        result = write(rows)
+        status['status'] = CHUNK_SUCCESS
+        if isinstance(result, dict):
+            status.update(result)
+    except Exception as e:
+        status['status'] = CHUNK_FAILED
+        status['error'] = str(e)
+    return status
+
+
+def pipeline(batches, parallelism=4):
+    '''
+    write the (phase, offset, rows, write) batches, at most parallelism
+    at a time, and yield the status of each batch once written. a batch
+    of another phase waits for the running ones, the relations are only
+    written after the nodes they link
+    '''
+    if parallelism < 1:
+        raise Exception('parallelism needs to be positive')
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        pending = set()
+        current = None
+        for index, (phase, offset, rows, write) in enumerate(batches):
+            if pending and phase != current:
+                done, pending = wait(pending, return_when=ALL_COMPLETED)
+                yield from (x.result() for x in done)
+            elif len(pending) >= parallelism:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from (x.result() for x in done)
+            current = phase
+            pending.add(executor.submit(_write_chunk, write, index, offset, rows))
+        yield from (x.result() for x in pending)
+
+
+def run_chunks(rows, write, batch_size=1000, parallelism=4):
+    '''
+    call write(chunk) for every chunk of batch_size rows, at most
+    parallelism at a time, and return the status of each chunk
+    in order. a failed chunk does not stop the others
+    '''
+    if batch_size < 1 or parallelism < 1:
+        raise Exception('batch_size and parallelism need to be positive')
+    batches = ((None, offset, chunk, write) for offset, chunk in chunks(rows, batch_size))
+    return sorted(pipeline(batches, parallelism), key=lambda x: x['chunk'])
+
+
+def read_ndjson(stream):
+    '''
+    yield (line, record) for the lines of the stream, the record is
+    the exception of the line when it is not a json object
+    '''
+    for line, text in enumerate(iter(stream.readline, b'')):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+            if not isinstance(record, dict):
+                raise ValueError('the record is not a json object')
+        except ValueError as e:
+            record = e
+        yield line, record
+
+
+def _endpoint(record, side):
+    if record.get(f'{side}_id') is not None:
+        return None, record[f'{side}_id']
+    params = record.get(f'{side}_params')
+    if not params or not isinstance(params, dict):
+        raise ValueError(f'{side}_id or {side}_params is required')
+    return tuple(sorted(params)), params
+
+
+def record_shape(record):
+    '''
+    the (shape, row) of a ndjson record. the records of the same shape
+    are written by the same query
+    '''
+    if isinstance(record, Exception):
+        raise record
+    properties = record.get('properties') or {}
+    if not isinstance(properties, dict):
+        raise ValueError('properties needs to be a json object')
+    if record.get('type') == NODE_RECORD:
+        labels = record.get('labels')
+        if isinstance(labels, str):
+            labels = [labels]
+        if not labels:
+            raise ValueError('labels is required')
+        return (NODE_RECORD, tuple(labels)), properties
+    if record.get('type') == RELATIONSHIP_RECORD:
+        if not record.get('label'):
+            raise ValueError('label is required')
+        start_keys, start = _endpoint(record, 'start')
+        end_keys, end = _endpoint(record, 'end')
+        shape = (RELATIONSHIP_RECORD, record['label'], record.get('start_label'), record.get('end_label'),
+                 start_keys, end_keys)
+        return shape, {'start': start, 'end': end, 'properties': properties}
+    raise ValueError(f'type needs to be {NODE_RECORD} or {RELATIONSHIP_RECORD}')
+
+
+def _rejected(error):
+    def write(rows):
+        raise error
+    return write
+
+
+def record_batches(records, write_batch, batch_size=1000):
+    '''
+    group the consecutive (line, record) of the same shape in batches
+    of batch_size at most and yield them as pipeline batches. the rows
+    are written with write_batch(shape, rows), an invalid record is a
+    failed batch of its own
+    '''
+    if batch_size < 1:
+        raise Exception('batch_size needs to be positive')
+    shape, offset, rows = None, None, []
+    for line, record in records:
+        try:
+            record_kind, row = record_shape(record)
+        except ValueError as e:
+            yield (shape[0] if shape else None), line, [record], _rejected(e)
+            continue
+        if rows and (record_kind != shape or len(rows) >= batch_size):
+            yield shape[0], offset, rows, _batch_writer(write_batch, shape)
+            rows = []
+        if not rows:
+            shape, offset = record_kind, line
+        if record_kind[0] == RELATIONSHIP_RECORD:
+            row['index'] = line
+        rows.append(row)
+    if rows:
+        yield shape[0], offset, rows, _batch_writer(write_batch, shape)
+
+
+def _batch_writer(write_batch, shape):
+    return lambda rows: write_batch(shape, rows)
+
+
+def relation_rows(payload, params_location):
+    '''
+    the (start_keys, end_keys, rows) of a batch of relations. the ends
+    in params_location are matched on their params, the other ones on
+    their id. the items of a batch share the same keys
+    '''
+    keys, rows = None, []
+    for index, item in enumerate(payload):
+        row = {'index': index, 'properties': item.get('properties') or {}}
+        item_keys = []
+        for side in ('start', 'end'):
+            if side in params_location:
+                params = item.get(f'{side}_params')
+                if not params:
+                    raise Exception(f'{side}_params is required')
+                item_keys.append(tuple(sorted(params)))
+                row[side] = params
+            else:
+                if item.get(f'{side}_id') is None:
+                    raise Exception(f'{side}_id is required')
+                item_keys.append(None)
+                row[side] = item[f'{side}_id']
+        if keys is None:
+            keys = item_keys
+        elif item_keys != keys:
+            raise Exception('the items need the same start_params and end_params keys')
+        rows.append(row)
+    start_keys, end_keys = keys or (None, None)
+    return start_keys, end_keys, rows
+
+
+class IngestJob(object):
+    '''
+    the progress of a stream, updated as its batches are written
+    '''
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = 'running'
+        self.started_at = time.time()
+        self.finished_at = None
+        self.records = 0
+        self.written = 0
+        self.failed = 0
+        self.chunks = 0
+        self.failed_chunks = 0
+        self.missing = 0
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def update(self, status):
+        with self._lock:
+            self.chunks += 1
+            self.records += status['size']
+            if status['status'] == CHUNK_FAILED:
+                self.failed_chunks += 1
+                self.failed += status['size']
+                if len(self.errors) < MAX_JOB_ERRORS:
+                    self.errors.append({'offset': status['offset'], 'error': status['error']})
+            else:
+                missing = len(status.get('missing', []))
+                self.missing += missing
+                self.written += status['size'] - missing
+
+    def finish(self, error=None):
+        with self._lock:
+            self.finished_at = time.time()
+            if error is not None:
+                self.status = 'failed'
+                self.errors.append({'offset': None, 'error': str(error)})
+            elif self.failed_chunks or self.missing:
+                self.status = 'partial'
+            else:
+                self.status = 'success'
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'job_id': self.id,
+                'status': self.status,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'records': self.records,
+                'written': self.written,
+                'failed': self.failed,
+                'missing_endpoints': self.missing,
+                'chunks': self.chunks,
+                'failed_chunks': self.failed_chunks,
+                'errors': list(self.errors),
+            }
+
+
+class IngestJobs(object):
+    '''
+    the recent jobs of this worker
+    '''
+
+    def __init__(self, maxsize=100, ttl=3600):
+        self._jobs = TTLCache(maxsize, ttl)
+
+    def start(self):
+        job = IngestJob()
+        self._jobs.set(job.id, job)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+
+def ingest_summary(statuses):
+    '''
+    the overall result and http status of the chunk statuses
+    '''
+    failed = [x for x in statuses if x['status'] == CHUNK_FAILED]
+    if not failed:
+        return 'success', 200
+    if len(failed) == len(statuses):
+        return 'failed', 500
+    return 'partial', 207
@@ -0,0 +1,165 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+from flask_restx import Resource
+
+from config import ConfigClass
+
+from . import admin_ns
+from . import count_cache
+from . import geid_cache
+from . import group_commit
+from . import neo4j_gateway
+from . import neo4j_sessions
+from . import schema_registry
+from . import single_flight
+
+
+class PoolStats(Resource):
+
+    get_returns = """
+    {
+        "max_connections": 50,
+        "connection_acquisition_timeout": 60,
+        "max_connection_lifetime": 3600,
+        "driver": {"size": 3, "in_use": 1, "addresses": {<address>: {"size": 3, "in_use": 1}}},
+        "graph": {"size": 2, "in_use": 0, "addresses": {<address>: {"size": 2, "in_use": 0}}},
+        "sessions": {"opened": 120, "closed": 119, "active": 1, "waiting": 0,
+                     "timeouts": 0, "abandoned": 0, "max_sessions": 20}
+    }
+    """
+
+    @admin_ns.response(200, get_returns)
+    @admin_ns.response(403, 'Exception')
+    def get(self):
+        """
+        Get the connection pool and session statistics of this worker
+        Usage: used for monitoring the connections to neo4j
+        """
+        try:
+            result = neo4j_gateway.pool_stats()
+            result['sessions'] = neo4j_sessions.stats()
+        except Exception as e:
+            return str(e), 403
+
+        return result, 200
+
+
+class CacheStats(Resource):
+
+    get_returns = """
+    {
+        "count": {"enabled": true, "size": 12, "maxsize": 1024, "ttl": 10, "hits": 340, "misses": 25,
+                  "expired": 10, "evictions": 0, "stale": 3},
+        "geid": {"enabled": true, "size": 830, "maxsize": 10000, "ttl": 5, "hits": 5120, "misses": 912,
+                 "expired": 80, "evictions": 0, "invalidations": 45},
+        "single_flight": {"enabled": true, "executions": 1200, "coalesced": 340, "errors": 0, "in_flight": 2},
+        "group_commit": {"enabled": true, "max_wait": 0.005, "max_batch": 100, "batches": 310, "items": 2400,
+                         "retried": 1, "open": 0}
+    }
+    """
+
+    @admin_ns.response(200, get_returns)
+    @admin_ns.response(403, 'Exception')
+    def get(self):
+        """
+        Get the statistics of the query caches, of the request coalescing and of the group commit of this worker
+        Usage: used for monitoring the cache hit rates
+        """
+        try:
+            result = {
+                'count': count_cache.stats(),
+                'geid': geid_cache.stats(),
+                'single_flight': single_flight.stats(),
+                'group_commit': group_commit.stats(),
+            }
+        except Exception as e:
+            return str(e), 403
+
+        return result, 200
+
+
+class SchemaStatus(Resource):
+
+    get_returns = """
+    {
+        "ready": false,
+        "schema": [{"name": "File_global_entity_id_unique", "label": "File", "property": "global_entity_id",
+                    "unique": true, "state": "ONLINE"}, ...],
+        "unsupported_query_shapes": [{"labels": ["File"], "keys": ["uploader"], "count": 1200}, ...]
+    }
+    """
+
+    post_returns = """
+    {"created": ["User_email"], "failed": {<name>: <error>}, "skipped": ["Container_code_unique"]}
+    """
+
+    @admin_ns.response(200, get_returns)
+    @admin_ns.response(403, 'Exception')
+    def get(self):
+        """
+        Get the state of the declared indexes and constraints
+        Usage: used to find the frequent queries of this worker without a supporting index
+        """
+        try:
+            schema = schema_registry.status()
+            result = {
+                'ready': all(x['state'] == 'ONLINE' for x in schema),
+                'schema': schema,
+                'unsupported_query_shapes': schema_registry.unsupported_shapes(),
+            }
+        except Exception as e:
+            return str(e), 403
+
+        return result, 200
+
+    @admin_ns.response(200, post_returns)
+    @admin_ns.response(403, 'Exception')
+    def post(self):
+        """
+        Create the missing indexes and constraints
+        Usage: the indexes are populated in the background, check their state with GET
+        """
+        try:
+            result = schema_registry.ensure(neo4j_sessions)
+        except Exception as e:
+            return str(e), 403
+
+        return result, 200
+
+
+class Readiness(Resource):
+
+    @admin_ns.response(200, 'ready')
+    @admin_ns.response(503, 'not ready')
+    def get(self):
+        """
+        Readiness of the service
+        Usage: with NEO4J_SCHEMA_REQUIRED_FOR_READINESS the service is ready once the declared indexes are online
+        """
+        if not ConfigClass.NEO4J_SCHEMA_REQUIRED_FOR_READINESS:
+            return {'ready': True}, 200
+        try:
+            pending = [x['name'] for x in schema_registry.status() if x['state'] != 'ONLINE']
+        except Exception as e:
+            return {'ready': False, 'error': str(e)}, 503
+        if pending:
+            return {'ready': False, 'pending': pending}, 503
+        return {'ready': True}, 200
@@ -25,61 +25,209 @@
 #
 
 import ast
-import re
-from datetime import datetime
 
 import neotime
 from logger import LoggerFactory
-from py2neo import Graph
 from py2neo import Node
 from py2neo import Relationship
-from py2neo.bulk import create_nodes
-from py2neo.bulk import create_relationships
 from py2neo.bulk import merge_nodes
 from py2neo.matching import IN
-from py2neo.matching import LIKE
+from py2neo.matching import EqualTo
 from py2neo.matching import NodeMatcher
+from py2neo.matching import Predicate
 from py2neo.matching import RelationshipMatcher
 
-from config import ConfigClass
-from neo4j_api import neo4j_connection
+from neo4j_api import count_planner
+from neo4j_api import fulltext_indexes
+from neo4j_api import geid_cache
+from neo4j_api import group_commit
+from neo4j_api import neo4j_gateway
+from neo4j_api import neo4j_sessions
+from neo4j_api import predicate_planner
+from neo4j_api import property_catalog
+from neo4j_api import schema_registry
+from neo4j_api import shadow_properties
+from neo4j_api import tag_index
+from neo4j_api import write_epochs
+from neo4j_api.cache import RELATIONSHIPS
+from neo4j_api.count_planner import COUNT_MATCH
+from neo4j_api.cypher_builder import CypherQuery
+from neo4j_api.cypher_builder import driver_value
+from neo4j_api.cypher_builder import escape_identifier
+from neo4j_api.cypher_builder import format_labels
+from neo4j_api.cypher_builder import format_order_type
+from neo4j_api.facets import DEFAULT_FACET_LIMIT
+from neo4j_api.facets import facet_query
+from neo4j_api.facets import facet_result
+from neo4j_api.fulltext import FULLTEXT_MODE
+from neo4j_api.fulltext import FulltextIndexes
+from neo4j_api.ingest import NODE_RECORD
+from neo4j_api.ingest import pipeline
+from neo4j_api.ingest import record_batches
+from neo4j_api.ingest import run_chunks
+from neo4j_api.pagination import TOTAL_ESTIMATE
+from neo4j_api.pagination import TOTAL_EXACT
+from neo4j_api.pagination import TOTAL_NONE
+from neo4j_api.pagination import check_total_mode
+from neo4j_api.pagination import cursor_condition
+from neo4j_api.pagination import decode_cursor
+from neo4j_api.pagination import order_clause
+from neo4j_api.pagination import short_page_total
+from neo4j_api.query_planner import StartingNodeMatch
+from neo4j_api.query_planner import match_query
+from neo4j_api.query_planner import split_time_ranges
+from neo4j_api.query_planner import time_range_predicate
+from neo4j_api.sketches import sketch_properties
+from utils import node_2_json
+
+
+def fetch(match):
+    '''
+    read the nodes or relationships of a py2neo match. list(match)
+    and match.all() ask for the length first, which runs a count
+    '''
+    return list(iter(match))
+
+
+def cursor_predicate(cursor, order_by, order_type):
+    '''
+    (condition, parameters) predicate selecting the nodes after
+    the cursor of a query_node page
+    '''
+    value, node_id = decode_cursor(cursor, order_by, order_type)
+    condition = cursor_condition('_', order_by, order_type, 'id(_)', value, '$cursor_value', '$cursor_id')
+    return condition, {'cursor_value': value, 'cursor_id': node_id}
 
 
 class Neo4jClient(object):
 
     def __init__(self):
         self._logger = LoggerFactory('api_invitation').get_logger()
-        try:
-            self.graph = Graph(
-                ConfigClass.NEO4J_URL,
-                username=ConfigClass.NEO4J_USER,
-                password=ConfigClass.NEO4J_PASS,
-                max_connections=200,
-            )
-            self.nodes = NodeMatcher(self.graph)
-            self.relationships = RelationshipMatcher(self.graph)
-        except Exception as e:
-            self._logger.error(
-                "Error in __init__ connecting to Neo4j:" + str(e))
 
-    def bulk_add_node(self, label, data, extra_labels=[]):
-        if extra_labels and len(extra_labels) > 0:
-            extra_labels = set(extra_labels)
-            extra_labels.add(label)
+    # the graph is resolved on every access so that nothing
+    # connects before the worker has been forked
+    @property
+    def graph(self):
+        return neo4j_gateway.graph
 
-        # new add attribute here to add time_create&time_modified
-        for node in data:
-            node.update({
-                "time_created": neotime.DateTime.utc_now(),
-                "time_lastmodified": neotime.DateTime.utc_now(),
-            })
+    @property
+    def nodes(self):
+        return NodeMatcher(self.graph)
 
-        result = create_nodes(self.graph.auto(), data, labels=extra_labels)
+    @property
+    def relationships(self):
+        return RelationshipMatcher(self.graph)
 
-        return result
+    def bulk_add_node(self, label, data, extra_labels=[]):
+        '''
+        create the nodes in one transaction with the label and the
+        extra labels, neo4j sets their timestamps. return the ids
+        of the created nodes
+        '''
+        labels = [label] + [x for x in extra_labels or [] if x != label]
+        for node in data:
+            shadow_properties.apply(node)
+
+        # the chunk shares one timestamp
+        query = "WITH localdatetime({timezone: 'UTC'}) AS now UNWIND $rows AS row " \
+                f"CREATE (n{format_labels(labels)}) SET n = row, n.time_created = now, n.time_lastmodified = now " \
+                "RETURN id(n) AS id"
+        node_ids = neo4j_sessions.write(lambda tx: [record["id"] for record in tx.run(query, rows=data)])
+        if any(tag_index.touches(node) for node in data):
+            tag_index.sync(node_ids)
+        write_epochs.bump(labels)
+        property_catalog.record((labels, node) for node in data)
+
+        return node_ids
+
+    def ingest_nodes(self, label, data, extra_labels=[], batch_size=1000, parallelism=4):
+        '''
+        create the nodes in transactions of batch_size nodes, at most
+        parallelism at a time. return the status of each chunk
+        '''
+        return run_chunks(data, lambda rows: self.bulk_add_node(label, rows, extra_labels), batch_size, parallelism)
+
+    def ingest_records(self, records, batch_size=1000, parallelism=4):
+        '''
+        write the (line, record) of a ndjson stream in batches of the same
+        shape and yield the status of each batch once written
+        '''
+        return pipeline(record_batches(records, self.write_records, batch_size), parallelism)
+
+    def write_records(self, shape, rows):
+        '''
+        write the rows of one ndjson batch, see ingest.record_shape
+        '''
+        if shape[0] == NODE_RECORD:
+            labels = shape[1]
+            self.bulk_add_node(labels[0], rows, labels[1:])
+            return None
+        _, relation_label, start_label, end_label, start_keys, end_keys = shape
+        missing = self.relate_nodes(relation_label, rows, start_label, end_label, start_keys, end_keys)
+        return {'missing': missing}
 
     def bulk_update_nodes(self, data, merge_key):
+        for node in data:
+            if isinstance(node, dict):
+                shadow_properties.apply(node)
         merge_nodes(self.graph.auto(), data, merge_key)
+        if "global_entity_id" in merge_key[1:] and all(isinstance(x, dict) for x in data):
+            geid_cache.invalidate([x.get("global_entity_id") for x in data])
+        else:
+            geid_cache.invalidate()
+        if isinstance(merge_key, (list, tuple)):
+            property_catalog.record((merge_key[:1], x) for x in data if isinstance(x, dict))
+        tagged = [x for x in data if isinstance(x, dict) and tag_index.touches(x)]
+        if tagged and len(merge_key) > 1:
+            tag_index.sync_matching(merge_key[0], merge_key[1:], tagged)
+        write_epochs.bump(merge_key[0] if isinstance(merge_key, (list, tuple)) else None)
+
+    def patch_nodes(self, data, key='global_entity_id', label=None, return_nodes=True, update_modified_time=True,
+                    batch_size=1000, parallelism=4, lock_order=True):
+        '''
+        set the properties of every row on the node matched on row[key]
+        within the label, in transactions of batch_size rows. with
+        lock_order the rows are sorted on the key so the transactions lock
+        the nodes in the same order. return the status of each chunk and
+        the updated nodes
+        '''
+        rows = []
+        for item in data:
+            if item.get(key) is None:
+                raise Exception(f'{key} is required in every row')
+            properties = {k: v for k, v in item.items() if k != key}
+            rows.append({'key': item[key], 'properties': shadow_properties.apply(properties)})
+        if lock_order:
+            rows.sort(key=lambda x: str(x['key']))
+
+        query = f"UNWIND $rows AS row MATCH (n{format_labels(label)}) WHERE n.{escape_identifier(key)} = row.key " \
+                "SET n += row.properties"
+        if update_modified_time:
+            query += ", n.time_lastmodified = localdatetime({timezone: 'UTC'})"
+        query += " RETURN row.key AS key, id(n) AS id, labels(n) AS labels"
+        if return_nodes:
+            query += ", n AS node"
+        nodes = []
+
+        def write(chunk):
+            records = neo4j_sessions.write(lambda tx: [dict(record) for record in tx.run(query, rows=chunk)])
+            found = {x['key'] for x in records}
+            properties = {x['key']: x['properties'] for x in chunk}
+            tag_index.sync([x['id'] for x in records if tag_index.touches(properties[x['key']])])
+            write_epochs.bump([label for x in records for label in x['labels']])
+            property_catalog.record((x['labels'], properties[x['key']]) for x in records)
+            if return_nodes:
+                nodes.extend(x['node'] for x in records)
+            return {'updated': len(records), 'missing': [x['key'] for x in chunk if x['key'] not in found]}
+
+        try:
+            chunks = run_chunks(rows, write, batch_size, parallelism)
+        finally:
+            if key == 'global_entity_id':
+                geid_cache.invalidate([x['key'] for x in rows])
+            else:
+                geid_cache.invalidate()
+        return chunks, nodes
 
     def add_node(self, label, name, param={}):
         if label[0].isnumeric():
@@ -98,6 +246,7 @@ class Neo4jClient(object):
             time_lastmodified=neotime.DateTime.utc_now(),
             **param,
         )
+        shadow_properties.apply(node)
 
         if extra_labels:
             for label in extra_labels:
@@ -111,12 +260,68 @@ class Neo4jClient(object):
             relationship = Relationship(node, parent_relation, end_node)
             self.graph.create(relationship)
         self.graph.create(node)
+        if tag_index.touches(node):
+            tag_index.sync([node.identity])
+        write_epochs.bump(list(node.labels) + ([RELATIONSHIPS] if parent_id and parent_relation else []))
+        property_catalog.record([(list(node.labels), dict(node))])
         return node
 
+    def add_node_grouped(self, label, name, param={}):
+        '''
+        add_node sharing its transaction with the other nodes of the same
+        labels created at the same time, when the group commit is enabled
+        '''
+        if not group_commit.enabled:
+            return self.add_node(label, name, param)
+        if label[0].isnumeric():
+            raise Exception("Invalid input")
+        properties = dict(param)
+        extra_labels = properties.pop("extra_labels", None)
+        if extra_labels and not isinstance(extra_labels, list):
+            raise Exception("extra_labels needs to be a list")
+        labels = tuple([label] + [x for x in extra_labels or [] if x != label])
+        properties["name"] = name
+        shadow_properties.apply(properties)
+        parent_relation = properties.get("parent_relation") if properties.get("parent_id") else None
+        return group_commit.submit((labels, parent_relation), properties, self.write_node_group)
+
+    def write_node_group(self, key, items):
+        '''
+        create the nodes of a group in one transaction, see add_node_grouped
+        '''
+        labels, parent_relation = key
+        query = "WITH localdatetime({timezone: 'UTC'}) AS now UNWIND $rows AS row "
+        if parent_relation:
+            query += "MATCH (p) WHERE id(p) = row.properties.parent_id "
+        query += f"CREATE (n{format_labels(labels)}) " \
+                 "SET n = row.properties, n.time_created = now, n.time_lastmodified = now "
+        if parent_relation:
+            query += f"CREATE (n)-[:{escape_identifier(parent_relation)}]->(p) "
+        query += "RETURN row.index AS index, n AS node"
+        rows = [{"index": index, "properties": properties} for index, properties in enumerate(items)]
+        nodes = neo4j_sessions.write(
+            lambda tx: {record["index"]: record["node"] for record in tx.run(query, rows=rows)})
+
+        tag_index.sync([nodes[index].id for index in nodes if tag_index.touches(items[index])])
+        write_epochs.bump(list(labels) + ([RELATIONSHIPS] if parent_relation else []))
+        property_catalog.record((list(labels), items[index]) for index in nodes)
+        return [nodes.get(index, Exception("parent node not found")) for index in range(len(items))]
+
     def get_node(self, label, id):
         return self.graph.nodes.match(label).where("id(_) = %d" % id).first()
         # return self.graph.nodes.get(id)
 
+    def get_node_metadata(self, label, id):
+        '''
+        the serialised node read with a single driver query, its
+        properties are part of the etag validating a cached copy
+        '''
+        query = f'MATCH (n{format_labels(label)}) WHERE id(n) = $id RETURN n'
+        records = neo4j_sessions.run(query, id=id)
+        if not records:
+            return None
+        return node_2_json(records[0]['n'])
+
     def get_node_by_geid(self, geid):
         return self.graph.nodes.match(**{"global_entity_id": geid}).first()
         # return self.graph.nodes.get(id)
@@ -132,10 +337,11 @@ class Neo4jClient(object):
         #    return key, collect(distinct n[key]) as options' % (label)
         #res = neo4j_session.run(query)
         # return res
-        return self.nodes.match(label).all()
+        return fetch(self.nodes.match(label))
 
     def update_node(self, label, id, params={}, update_modified_time=True):
         node = self.get_node(label, id)
+        geid = node.get("global_entity_id")
 
         extra_labels = params.get("extra_labels")
         if extra_labels:
@@ -147,95 +353,231 @@ class Neo4jClient(object):
             node.update(**params, time_lastmodified=neotime.DateTime.utc_now())
         else:
             node.update(**params)
+        shadow_properties.apply(node)
 
         if extra_labels:
             for label in extra_labels:
                 if not node.has_label(label):
                     node.add_label(label)
         self.graph.push(node)
+        if tag_index.touches(params):
+            tag_index.sync([node.identity])
+        write_epochs.bump(list(node.labels))
+        geid_cache.invalidate([geid, node.get("global_entity_id")])
+        property_catalog.record([(list(node.labels), dict(node))])
         return node
 
     def change_labels(self, id, labels):
         node = self.graph.nodes.get(id)
+        old_labels = list(node.labels)
         node.clear_labels()
         node.update_labels(labels)
         self.graph.push(node)
+        write_epochs.bump(old_labels + list(labels))
+        geid_cache.invalidate([node.get("global_entity_id")])
+        property_catalog.record([(list(node.labels), dict(node))])
         return node
 
-    def query_node(self, label, params=None, limit=None, skip=None, count=False, partial=False, order_by=None, order_type=None):
-        tags = []
+    def count_nodes(self, label, params=None, partial=False, search_mode=None):
+        '''
+        count the nodes query_node would match as (count, path), the
+        equality filters go through the count planner and the other
+        ones keep the full match
+        '''
+        equalities = self._equalities(label, params or {}, partial, search_mode)
+        if equalities is None:
+            return self.query_node(label, params, count=True, partial=partial, search_mode=search_mode), COUNT_MATCH
+        return count_planner.count(label, equalities)
+
+    def _equalities(self, label, params, partial, search_mode):
+        time_windows, params = split_time_ranges(params)
+        if time_windows or search_mode:
+            return None
+        equalities = {}
+        for key, value in params.items():
+            if key == "location" or (key == "full_path" and not partial):
+                equalities[key] = value
+                continue
+            if key in ("tags", "system_tags", "id") or value is None or isinstance(value, (list, dict)):
+                return None
+            key, predicate = predicate_planner.plan(label, key, value, partial)
+            if isinstance(predicate, EqualTo):
+                equalities[key] = predicate.value
+            elif isinstance(predicate, Predicate):
+                return None
+            else:
+                equalities[key] = predicate
+        return equalities
+
+    def query_node(
+        self,
+        label,
+        params=None,
+        limit=None,
+        skip=None,
+        count=False,
+        partial=False,
+        order_by=None,
+        order_type=None,
+        search_mode=None,
+        cursor=None,
+        total=None,
+    ):
+        '''
+        with a total mode the page comes back with the total number
+        of matches as (nodes, total, estimated)
+        '''
+        node_id = (params or {}).get("id")
+        if node_id is not None and not isinstance(node_id, (str, dict)):
+            query = self.nodes.match(label)
+            query = query.where("id(_) = %d" % node_id)
+            nodes = fetch(query)
+            return (nodes, len(nodes), False) if total else nodes
+
+        filters = self.node_filters(label, params, partial=partial, search_mode=search_mode)
+        if count:
+            return self.node_match(filters).count()
+        if total:
+            return self._page_and_total(filters, total, limit, skip, order_by, order_type, cursor)
+        query = self.node_match(filters)
+        # a cursor replaces the skip, an empty one starts the keyset
+        # pagination of an unordered query
+        if cursor:
+            query = query.where(cursor_predicate(cursor, order_by, order_type))
+            skip = None
+        if order_by or cursor is not None:
+            query = query.order_by(*order_clause('_', order_by, order_type, 'id(_)'))
+        if limit:
+            query = query.limit(limit)
+        if skip:
+            query = query.skip(skip)
+        return fetch(query)
+
+    def count_facets(self, label, params, facets, partial=False, search_mode=None, limit=DEFAULT_FACET_LIMIT):
+        '''
+        the most frequent values of the facets over the nodes
+        matching the query_node filters, counted in one read
+        '''
+        query, parameters = match_query(*self.node_filters(label, params, partial, search_mode)).add('RETURN _').build()
+        query, facet_parameters = facet_query(query, facets, limit)
+        parameters.update(facet_parameters)
+        return facet_result(neo4j_sessions.run(query, **parameters), facets)
+
+    def node_match(self, filters):
+        '''
+        the py2neo match of the node_filters
+        '''
+        labels, start, predicates = filters
+        if start:
+            query = StartingNodeMatch(self.graph, labels, start=start)
+        else:
+            query = self.nodes.match(*labels)
+        return query.where(*predicates) if predicates else query
+
+    def node_filters(self, label, params=None, partial=False, search_mode=None):
+        '''
+        the labels, the clause binding "_" ahead of the label match
+        or None and the (condition, parameters) predicates of the
+        query_node filters
+        '''
+        time_windows, params = split_time_ranges(params or {})
+        # the partial string filters covered by a fulltext index
+        # are searched in that index instead
+        fulltext = None
+        if partial and search_mode == FULLTEXT_MODE:
+            fulltext = fulltext_indexes.plan(label, params)
+
+        tags = {}
         query_params = {}
-        create_time = {}
+        tag_predicates = []
+        for key, window in time_windows.items():
+            query_params[key] = time_range_predicate(window)
         for key, value in params.items():
-            if "create_time" in key:
-                create_time[key] = value
-            elif key == "tags":
-                tags = value
+            if fulltext and key in fulltext[2]:
+                continue
+            elif key == "tags" or (key == "system_tags" and isinstance(value, list)):
                 if type(value) is str:
-                    tags = ast.literal_eval(value)
-            elif key == "description":
-                # LIKE uses a regex, so we use regex escape for special characters
-                #value = re.escape(value)
-                value = re.escape(value)
-                if partial:
-                    query_params[key] = LIKE(f"(?i)(?s)(?m).*{value}.*")
-                else:
-                    query_params[key] = LIKE(f"(?i)(?s)(?m){value}")
+                    value = ast.literal_eval(value)
+                tags[key] = value
             elif key == "location":
                 query_params[key] = value
             elif key == "full_path" and not partial:
                 query_params[key] = value
             elif key == "status" and isinstance(value, list):
                 query_params[key] = IN(value)
-            elif isinstance(value, str):
-                # LIKE uses a regex, so we use regex escape for special characters
-                value = re.escape(value)
-                if partial:
-                    query_params[key] = LIKE(f"(?i).*{value}.*")
-                else:
-                    query_params[key] = LIKE(f"(?i){value}")
-            elif key == "id":
-                query = self.nodes.match(label)
-                query = query.where("id(_) = %d" % value)
-                return query.all()
+            elif key == "id" and not isinstance(value, (str, dict)):
+                tag_predicates.append(("id(_) = $node_id", {"node_id": value}))
             else:
-                query_params[key] = value
+                # the planner picks the operator from the value
+                # and the partial flag
+                key, predicate = predicate_planner.plan(label, key, value, partial)
+                query_params[key] = predicate
 
         if isinstance(label, str):
             label = [label]
 
-        if query_params:
-            query = self.nodes.match(*label, **query_params)
-        else:
-            query = self.nodes.match(*label)
-
-        if create_time:
-            start = create_time.get(
-                "create_time_start", datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S"))
-            end = create_time.get(
-                "create_time_end", datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S"))
-            query = query.where(
-                f"datetime(_.time_created) > datetime('{start}')")
-            query = query.where(
-                f"datetime(_.time_created) < datetime('{end}')")
-        if tags:
-            for tag in tags:
-                tag = tag.replace("\\", "\\\\")
-                query = query.where(f"'{tag}' IN _.tags")
-
-        if count:
-            return query.count()
-        if order_by:
-            if order_type and order_type.lower() == "desc":
-                order_by = f"_.{order_by} DESC"
+        # clauses binding "_" ahead of the label match
+        starts = []
+        if fulltext:
+            starts.append((
+                FulltextIndexes.call_clause('$fulltext_index', '$fulltext_query', '_'),
+                {'fulltext_index': fulltext[0], 'fulltext_query': fulltext[1]},
+            ))
+        for key, values in tags.items():
+            if not values:
+                continue
+            names = {f'{key}_{i}': tag for i, tag in enumerate(values)}
+            if tag_index.covers(key):
+                starts.append((tag_index.match_clause('_', key, ['$' + x for x in names]), names))
             else:
-                order_by = f"_.{order_by}"
-            query = query.order_by(order_by)
-        if limit:
-            query = query.limit(limit)
-        if skip:
-            query = query.skip(skip)
-        return query.all()
+                tag_predicates += [(f'${name} IN _.{key}', {name: tag}) for name, tag in names.items()]
+
+        start = None
+        if starts:
+            start = (
+                ' WITH _ '.join(x[0] for x in starts),
+                {name: value for x in starts for name, value in x[1].items()},
+            )
+        else:
+            schema_registry.record(label, list(query_params) + list(tags))
+        # numbered parameters as py2neo does for match(**properties)
+        predicates = [Predicate.cast(value).compile(key, i) for i, (key, value) in enumerate(query_params.items(), 1)]
+        return label, start, predicates + tag_predicates
+
+    def _page_and_total(self, filters, total, limit, skip, order_by, order_type, cursor):
+        check_total_mode(total)
+        labels, start, predicates = filters
+        counted = match_query(labels, start, predicates)
+        if cursor:
+            predicates = predicates + [cursor_predicate(cursor, order_by, order_type)]
+            skip = None
+        page = match_query(labels, start, predicates).add('RETURN _')
+        if order_by or cursor is not None:
+            page.add('ORDER BY ' + ', '.join(order_clause('_', order_by, order_type, 'id(_)')))
+        page_query, page_parameters = page.page(skip, limit).build()
+
+        if total != TOTAL_EXACT:
+            nodes = neo4j_sessions.read(lambda tx: [record[0] for record in tx.run(page_query, page_parameters)])
+            count = short_page_total(nodes, limit, skip, cursor)
+            if count is not None or total == TOTAL_NONE:
+                return nodes, count, False
+            query, parameters = counted.add('RETURN _').build()
+            estimate = neo4j_sessions.estimate_rows(query, **parameters)
+            # the rows already seen are a lower bound
+            return nodes, max(estimate or 0, (skip or 0) + len(nodes) + 1), True
+
+        count_query, count_parameters = counted.add('RETURN count(_)').build()
+
+        # the page and the count share one read transaction
+        def work(tx):
+            nodes = [record[0] for record in tx.run(page_query, page_parameters)]
+            count = short_page_total(nodes, limit, skip, cursor)
+            if count is None:
+                count = tx.run(count_query, count_parameters).single()[0]
+            return nodes, count
+
+        nodes, count = neo4j_sessions.read(work)
+        return nodes, count, False
 
     # method allow to query the relationship
     # also the parameter allow the none so that we can query the 1-to-1
@@ -251,27 +593,55 @@ class Neo4jClient(object):
         if not str(start_node) or not str(end_node):
             return []
         if relation_label:
-            return self.relationships.match((start_node, end_node), r_type=relation_label).all()
-        else:
-            return self.relationships.match((start_node, end_node)).all()
-
-    def bulk_add_relation_between_nodes(self, relation_label, data, start_params_key=None, end_params_key=None):
-        if start_params_key and not end_params_key:
-            result = create_relationships(
-                self.graph.auto(), data, relation_label, start_node_key=start_params_key)
-            return result
-        if end_params_key and not start_params_key:
-            result = create_relationships(
-                self.graph.auto(), data, relation_label, end_node_key=end_params_key)
-            return result
-        if end_params_key and start_params_key:
-            result = create_relationships(
-                self.graph.auto(), data, relation_label, end_node_key=end_params_key, start_node_key=start_params_key)
-            return result
-        if not end_params_key and not start_params_key:
-            result = create_relationships(
-                self.graph.auto(), data, relation_label)
-            return result
+            return fetch(self.relationships.match((start_node, end_node), r_type=relation_label))
+        query = self.relationships.match((start_node, end_node))
+        excluded = tag_index.excluded_relationships()
+        if excluded:
+            # the tag links are not relations of the platform
+            query = query.where('NOT type(_) IN [%s]' % ', '.join(f"'{x}'" for x in excluded))
+        return fetch(query)
+
+    def ingest_relations(self, relation_label, rows, start_label=None, end_label=None, start_keys=None, end_keys=None,
+                         merge=False, batch_size=1000, parallelism=1):
+        '''
+        relate the nodes in transactions of batch_size rows, at most
+        parallelism at a time. return the status of each chunk with
+        the rows whose start or end node was not found
+        '''
+        def write(chunk):
+            return {'missing': self.relate_nodes(
+                relation_label, chunk, start_label, end_label, start_keys, end_keys, merge)}
+
+        return run_chunks(rows, write, batch_size, parallelism)
+
+    def relate_nodes(self, relation_label, rows, start_label=None, end_label=None, start_keys=None, end_keys=None,
+                     merge=False):
+        '''
+        create a relation for every {"index", "start", "end", "properties"}
+        row in one transaction. the endpoints are matched on their id when
+        the keys are None, otherwise on the keys of the start and end maps.
+        with merge an existing relation is updated instead. return the rows
+        whose start or end node was not found
+        '''
+        def endpoint(variable, label, keys, field):
+            # the label only scopes the matches on keys, an id is found whatever its labels
+            if keys is None:
+                return f'OPTIONAL MATCH ({variable}) WHERE id({variable}) = row.{field} '
+            condition = ' AND '.join(
+                f'{variable}.{escape_identifier(x)} = row.{field}.{escape_identifier(x)}' for x in keys)
+            return f'OPTIONAL MATCH ({variable}{format_labels(label)}) WHERE {condition} '
+
+        query = "UNWIND $rows AS row " \
+                + endpoint('s', start_label, start_keys, 'start') \
+                + endpoint('e', end_label, end_keys, 'end') \
+                + "FOREACH (x IN CASE WHEN s IS NULL OR e IS NULL THEN [] ELSE [1] END | " \
+                f"{'MERGE' if merge else 'CREATE'} (s)-[r:{escape_identifier(relation_label)}]->(e) " \
+                f"SET r {'+=' if merge else '='} row.properties) " \
+                "WITH row, s, e WHERE s IS NULL OR e IS NULL " \
+                "RETURN row.index AS index, s IS NOT NULL AS start_found, e IS NOT NULL AS end_found"
+        missing = neo4j_sessions.write(lambda tx: [dict(record) for record in tx.run(query, rows=rows)])
+        write_epochs.bump(RELATIONSHIPS)
+        return missing
 
     def add_relation_between_nodes(self, relation_label, start_id, end_id, properties={}):
         if type(start_id) == list and type(end_id) == list:
@@ -287,8 +657,55 @@ class Neo4jClient(object):
         for key, value in properties.items():
             relationship[key] = value
         self.graph.create(relationship)
+        write_epochs.bump(RELATIONSHIPS)
         return relationship
 
+    def add_relation_grouped(self, relation_label, start_id, end_id, properties={}):
+        '''
+        add_relation_between_nodes sharing its transaction with the other
+        relations of the label added at the same time, when the group
+        commit is enabled
+        '''
+        if not group_commit.enabled or isinstance(start_id, list) or isinstance(end_id, list):
+            return self.add_relation_between_nodes(relation_label, start_id, end_id, properties)
+        if start_id == end_id:
+            raise Exception("Error cannot add yourself as parent/child")
+        item = {"start_id": start_id, "end_id": end_id, "properties": properties or {}}
+        return group_commit.submit(relation_label, item, self.write_relation_group)
+
+    def write_relation_group(self, relation_label, items):
+        '''
+        add the relations of a group in one transaction, the nodes already
+        related are left as they are, see add_relation_grouped
+        '''
+        results = [None] * len(items)
+        rows = []
+        pairs = set()
+        for index, item in enumerate(items):
+            pair = (item["start_id"], item["end_id"])
+            if pair in pairs:
+                results[index] = Exception("dataset(s) already be the parent(s).")
+                continue
+            pairs.add(pair)
+            rows.append(dict(item, index=index))
+
+        query = "UNWIND $rows AS row " \
+                "MATCH (s) WHERE id(s) = row.start_id MATCH (e) WHERE id(e) = row.end_id " \
+                "OPTIONAL MATCH (s)-[x]->(e) WITH row, s, e, count(x) AS existing " \
+                "FOREACH (y IN CASE WHEN existing = 0 THEN [1] ELSE [] END | " \
+                f"CREATE (s)-[r:{escape_identifier(relation_label)}]->(e) SET r = row.properties) " \
+                "RETURN row.index AS index, existing"
+        existing = neo4j_sessions.write(
+            lambda tx: {record["index"]: record["existing"] for record in tx.run(query, rows=rows)})
+        write_epochs.bump(RELATIONSHIPS)
+
+        for row in rows:
+            if row["index"] not in existing:
+                results[row["index"]] = Exception("start or end node not found")
+            elif existing[row["index"]]:
+                results[row["index"]] = Exception("dataset(s) already be the parent(s).")
+        return results
+
     def update_relation(self, label, new_label, start_id, end_id, properties={}):
         start_node = self.nodes.get(start_id)
         end_node = self.nodes.get(end_id)
@@ -300,6 +717,7 @@ class Neo4jClient(object):
         for key, value in properties.items():
             relationship[key] = value
         self.graph.create(relationship)
+        write_epochs.bump(RELATIONSHIPS)
         return relationship
 
     def delete_relation(self, start_id, end_id):
@@ -309,6 +727,7 @@ class Neo4jClient(object):
             relationship = self.relationships.match(
                 (start_node, end_node)).first()
             self.graph.separate(relationship)
+            write_epochs.bump(RELATIONSHIPS)
             return relationship
         else:
             raise Exception
@@ -318,32 +737,38 @@ class Neo4jClient(object):
         if node:
             self.graph.separate(node)
             self.graph.delete(node)
+            write_epochs.bump(list(node.labels) + [RELATIONSHIPS])
+            geid_cache.invalidate([node.get("global_entity_id")])
         else:
             raise Exception
 
 
 class Neo4jNode(object):
-    # todo move the neo4j_connection here?
 
     # in order to facilitate the query in the frontend
     # we provide all the possible key with value with it
     def get_property_by_label(self, label):
-        neo4j_session = neo4j_connection.session()
-
         query = 'MATCH (n:%s) UNWIND keys(n) as key \
             return key, collect(distinct n[key]) as options' % (label)
 
-        res = neo4j_session.run(query)
+        res = neo4j_sessions.stream(query)
 
         return res
 
+    def get_property_sketches(self, label, top_k=10):
+        '''
+        the approximate cardinality and the top values of every
+        property of the label, the nodes are streamed
+        '''
+        query = f'MATCH (n{format_labels(label)}) RETURN properties(n) AS properties'
+        return sketch_properties((x['properties'] for x in neo4j_sessions.stream(query)), top_k=top_k)
+
     # delete node recursively, this function does not have API, test only
     def delete_node(self, node_id):
-        neo4j_session = neo4j_connection.session()
         query = "MATCH (n:test_label) \
                  where id(n)=%s \
                  DETACH DELETE n" % node_id
-        res = neo4j_session.run(query)
+        res = neo4j_sessions.run(query)
 
         return res
 
@@ -355,123 +780,115 @@ class Neo4jRelationship(object):
                                  start_label=None, end_label=None,
                                  start_params=None, end_params=None,
                                  count=False, partial=False, page_kwargs={}, extra_query="", sort_node="end"):
-        def format_label(label):
-            if isinstance(label, list):
-                result = ""
-                for l in label:
-                    if(l):
-                        result += ":" + l
-                return result
-            else:
-                if(label):
-                    return ':'+label
-                return ''
-
-        relation_label = format_label(relation_label)
-        start_label = format_label(start_label)
-        end_label = format_label(end_label)
-
-        create_time = {}
-
-        query = 'match p=(start_node%s)-[r%s]->(end_node%s) %s' % (
-                start_label, relation_label, end_label, extra_query)
-
-        if(isinstance(start_params, dict)):
-            query += 'where'
+        query = CypherQuery()
+        # the indexed tag filters find the end nodes first
+        tag_keys = [
+            key for key, value in end_params.items() if tag_index.covers(key) and isinstance(value, list) and value
+        ] if isinstance(end_params, dict) else []
+        for key in tag_keys:
+            placeholders = [query.param('end_tag', x) for x in end_params[key]]
+            query.add(tag_index.match_clause('end_node', key, placeholders))
+        if tag_keys:
+            query.add('WITH end_node')
+        query.add('MATCH p=(start_node%s)-[r%s]->(end_node%s)' % (
+            format_labels(start_label), format_labels(relation_label, separator='|'), format_labels(end_label)))
+        query.add(extra_query)
+
+        # the start node anchors the match unless only the end node is filtered
+        if start_params:
+            schema_registry.record(start_label, list(start_params))
+        elif isinstance(end_params, dict) and not tag_keys:
+            schema_registry.record(end_label, list(end_params))
+
+        conditions = []
+        if not relation_label and tag_index.enabled:
+            conditions.append(f'NOT type(r) IN {query.param("tag_relationships", tag_index.excluded_relationships())}')
+        if isinstance(start_params, dict):
             for key, value in start_params.items():
-                if type(value) == str:
-                    value = "'%s'" % value
-
+                placeholder = query.param('start_' + key, value)
                 # id have special function
                 if key == 'id':
-                    query += ' Id(start_node) = {value} and'.format(value=value)
+                    conditions.append(f'ID(start_node) = {placeholder}')
+                elif partial:
+                    conditions.append(f'start_node.{escape_identifier(key)} CONTAINS {placeholder}')
                 else:
-                    if partial:
-                        if key == 'name':
-                            query += ' start_node.{key} CONTAINS {value} and'.format(
-                                key=key, value=value)
-                        else:
-                            query += ' start_node.{key} contains {value} and'.format(
-                                key=key, value=value)
-                    else:
-                        query += ' start_node.{key} = {value} and'.format(
-                            key=key, value=value)
-            query = query[:-3]
-
-        if(isinstance(end_params, dict)):
-            query += 'with * where'
+                    conditions.append(f'start_node.{escape_identifier(key)} = {placeholder}')
+        query.where(conditions)
+
+        if isinstance(end_params, dict):
+            conditions = []
+            time_windows, end_params = split_time_ranges(end_params)
+            for key, window in time_windows.items():
+                property_key = 'end_node.' + escape_identifier(key)
+                if 'start' in window:
+                    conditions.append(f'{property_key} > {query.param(key + "_start", window["start"])}')
+                if 'end' in window:
+                    conditions.append(f'{property_key} < {query.param(key + "_end", window["end"])}')
             for key, value in end_params.items():
-                if type(value) == str:
-                    value = "'%s'" % value
+                property_key = 'end_node.' + escape_identifier(key)
                 # id have special function
                 if key == 'id':
-                    query += ' Id(end_node) = {value} and'.format(value=value)
-                elif "create_time" in key:
-                    create_time[key] = value
-                elif key == 'tags':
+                    conditions.append(f'ID(end_node) = {query.param("end_id", value)}')
+                elif key in tag_keys:
+                    continue
+                elif key == 'tags' or (key == 'system_tags' and isinstance(value, list)):
                     for tag in value:
-                        tag = tag.replace("\\", "\\\\")
-                        query += f' "{tag}" IN end_node.tags and'
+                        conditions.append(f'{query.param("end_tag", tag)} IN {property_key}')
+                elif not isinstance(value, str):
+                    conditions.append(f'{property_key} = {query.param("end_" + key, value)}')
                 else:
                     # Exclude from partial search in == is in value
-                    if value and isinstance(value, str) and value.startswith("'=="):
-                        value = "'" + value[3:]
-                        partial_exclude = True
-                    else:
-                        partial_exclude = False
+                    partial_exclude = value.startswith("==")
+                    if partial_exclude:
+                        value = value[2:]
+
+                    if key not in ["container_id"] and shadow_properties.covers(key):
+                        # compare with the indexed lower cased copy
+                        placeholder = query.param('end_' + key, value.lower())
+                        property_key = 'end_node.' + escape_identifier(shadow_properties.shadow_key(key))
+                        if partial and value and not partial_exclude:
+                            conditions.append(f'{property_key} CONTAINS {placeholder}')
+                        else:
+                            conditions.append(f'{property_key} = {placeholder}')
+                        continue
 
-                    if partial_exclude or isinstance(value, bool) or isinstance(value, int):
-                        if key in ["container_id"] or isinstance(value, bool) or isinstance(value, int):
-                            query += ' end_node.{key} = {value} and'.format(
-                                key=key, value=value)
+                    placeholder = query.param('end_' + key, value)
+                    if partial and value and not partial_exclude:
+                        if key in ["container_id"]:
+                            conditions.append(f'{property_key} CONTAINS {placeholder}')
                         else:
-                            query += ' TOLOWER(end_node.{key}) = TOLOWER({value}) and'.format(
-                                key=key, value=value)
+                            conditions.append(f'TOLOWER({property_key}) CONTAINS TOLOWER({placeholder})')
                     else:
-                        if partial and value:
-                            if key in ["container_id"]:
-                                query += ' end_node.{key} CONTAINS {value} and'.format(
-                                    key=key, value=value)
-                            else:
-                                query += ' TOLOWER(end_node.{key}) CONTAINS TOLOWER({value}) and'.format(
-                                    key=key, value=value)
+                        if key in ["container_id"]:
+                            conditions.append(f'{property_key} = {placeholder}')
                         else:
-                            if key in ["container_id"]:
-                                query += ' end_node.{key} = {value} and'.format(
-                                    key=key, value=value)
-                            else:
-                                query += ' TOLOWER(end_node.{key}) = TOLOWER({value}) and'.format(
-                                    key=key, value=value)
-            if create_time:
-                start = create_time.get(
-                    "create_time_start", "'" + datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S") + "'")
-                end = create_time.get(
-                    "create_time_end", "'" + datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S") + "'")
-                query += f" datetime(end_node.time_created) > datetime({start}) and"
-                query += f" datetime(end_node.time_created) < datetime({end}) and"
-            query = query[:-3]
+                            conditions.append(f'TOLOWER({property_key}) = TOLOWER({placeholder})')
+            query.where(conditions, keyword='WITH * WHERE')
+
         if count:
-            query += 'return count(*)'
+            query.add('RETURN count(*)')
         else:
-            query += 'return *'
-            if page_kwargs.get("order_by"):
-                order = page_kwargs['order_by']
-                if sort_node == "start":
-                    query += f' ORDER BY start_node.{order}'
-                else:
-                    query += f' ORDER BY end_node.{order}'
-            if page_kwargs.get("order_type"):
-                order_type = page_kwargs['order_type']
-                query += f' {order_type}'
-            if page_kwargs.get("skip"):
-                skip = page_kwargs["skip"]
-                query += f' skip {skip}'
-            if page_kwargs.get("limit"):
-                limit = page_kwargs["limit"]
-                query += f' limit {limit}'
-
-        neo4j_session = neo4j_connection.session()
-        res = neo4j_session.run(query)
+            order_node = 'start_node' if sort_node == 'start' else 'end_node'
+            order_by = page_kwargs.get("order_by")
+            order_type = page_kwargs.get("order_type")
+            # raises on an invalid order_type
+            format_order_type(order_type)
+            cursor = page_kwargs.get("cursor")
+            skip = page_kwargs.get("skip")
+            # the rows are keyed by the relationship id
+            if cursor:
+                value, row_id = decode_cursor(cursor, order_by, order_type)
+                condition = cursor_condition(order_node, order_by, order_type, 'id(r)', value,
+                                             query.param('cursor_value', value), query.param('cursor_id', row_id))
+                query.where([condition], keyword='WITH * WHERE')
+                skip = None
+            query.add('RETURN *')
+            if order_by or cursor is not None:
+                query.add('ORDER BY ' + ', '.join(order_clause(order_node, order_by, order_type, 'id(r)')))
+            query.page(skip=skip, limit=page_kwargs.get("limit"))
+
+        query, params = query.build()
+        res = neo4j_sessions.run(query, **params)
 
         return res
 
@@ -487,85 +904,149 @@ class Neo4jRelationship(object):
         else:
             query += 'where ID(end_node)=$node_id return start_node as node'
 
-        neo4j_session = neo4j_connection.session()
-        res = neo4j_session.run(query, node_id=node_id)
+        res = neo4j_sessions.run(query, node_id=node_id)
 
         return res
 
-    def relation_query_multiple_labels(self, start_label, end_labels, query_params={}, page_kwargs={}):
+    def relation_query_multiple_labels(self, start_label, end_labels, query_params={}, page_kwargs={}, search_mode=None,
+                                       total=TOTAL_EXACT):
+        '''
+        return the page of records, the total and whether the total
+        is an estimate
+        '''
+        check_total_mode(total)
         start_query = query_params.get("start_params", {})
         end_query = query_params.get("end_params", {})
-        neo_query = f"MATCH p=(start_node:{start_label}"
+        match = f"MATCH p=(start_node:{start_label}"
         neo_params = {}
+        schema_registry.record(start_label, list(start_query))
         count = 0
         for key, value in start_query.items():
-            neo_query += "{" + key + ":$start_value_" + str(count) + "}"
+            match += "{" + key + ":$start_value_" + str(count) + "}"
             neo_params[f"start_value_{count}"] = value
             count += 1
-        neo_query += ")-[r]->(end_node) WITH * "
-
-        neo_query += "WHERE "
-        count = 0
-        for label in end_labels:
-            neo_query += f"(end_node:{label}"
-            neo_params[f"end_label_{count}"] = label
-            param_count = 0
-            partial_fields = end_query.get(label, {}).pop("partial", [])
-            startswith_fields = end_query.get(label, {}).pop("startswith", [])
-            for key, value in end_query.get(label, {}).items():
-                if not isinstance(value, str) and key in partial_fields:
-                    raise Exception(
-                        "Only string parameters can use partial search")
-                if key == "id":
-                    neo_query += f" AND ID(end_node) = $end_query_value_{count}{param_count}"
-                # elif key in ["time_created", "time_lastmodified"]:
-                #    pass
-                else:
-                    if partial_fields and key in partial_fields:
-                        neo_query += f" AND TOLOWER(end_node.{key}) CONTAINS TOLOWER($end_query_value_{count}{param_count})"
-                    elif startswith_fields and key in startswith_fields:
-                        neo_query += f" AND TOLOWER(end_node.{key}) STARTS WITH TOLOWER($end_query_value_{count}{param_count})"
-                    else:
-                        neo_query += f" AND end_node.{key} = $end_query_value_{count}{param_count}"
-                neo_params[f"end_query_value_{count}{param_count}"] = value
-                param_count += 1
-            neo_query += ")"
-            count += 1
-            if count != len(end_labels):
-                neo_query += " OR "
+        match += ")-[r]->(end_node) WITH * WHERE "
+
+        # the labels searched with a fulltext index start their match
+        # from the index hits, the other ones share one match
+        branches = []
+        conditions = []
+        for count, label in enumerate(end_labels):
+            condition, call = self._end_label_condition(label, count, end_query.get(label, {}), search_mode, neo_params)
+            if call:
+                branches.append(f"{call} {match}{condition}")
+            else:
+                conditions.append(condition)
+        if conditions:
+            branches.append(match + " OR ".join(conditions))
+        if len(branches) == 1:
+            neo_query = branches[0]
+        else:
+            neo_query = "CALL { " + " RETURN p, start_node, r, end_node UNION ".join(branches) \
+                + " RETURN p, start_node, r, end_node }"
         neo_count = neo_query + " RETURN count(*)"
-        neo4j_session = neo4j_connection.session()
-        total = neo4j_session.run(neo_count, **neo_params)
-        total = total.value()[0]
-
+        neo_estimate = neo_query + " RETURN *"
+
+        order_by = page_kwargs.get("order_by")
+        order_type = page_kwargs.get("order_type")
+        if order_type and not order_type.lower() in ["desc", "asc"]:
+            raise Exception("Invalid order_type")
+        cursor = page_kwargs.get("cursor")
+        skip = page_kwargs.get("skip")
+        # the rows are keyed by the relationship id
+        if cursor:
+            value, row_id = decode_cursor(cursor, order_by, order_type)
+            condition = cursor_condition(
+                "end_node", order_by, order_type, "id(r)", value, "$cursor_value", "$cursor_id"
+            )
+            neo_query += f" WITH * WHERE {condition}"
+            neo_params["cursor_value"] = driver_value(value)
+            neo_params["cursor_id"] = row_id
+            skip = None
         neo_query += " RETURN *"
-        if page_kwargs.get("order_by"):
-            order = page_kwargs['order_by']
-            neo_query += f' ORDER BY end_node.{order}'
-        if page_kwargs.get("order_type"):
-            order_type = page_kwargs['order_type']
-            if not order_type.lower() in ["desc", "asc"]:
-                raise Exception("Invalid order_type")
-            neo_query += f' {order_type}'
-        if page_kwargs.get("skip"):
-            skip = page_kwargs["skip"]
+        if order_by or cursor is not None:
+            neo_query += " ORDER BY " + ", ".join(order_clause("end_node", order_by, order_type, "id(r)"))
+        if skip:
             neo_query += f' skip {skip}'
-        if page_kwargs.get("limit"):
-            limit = page_kwargs["limit"]
+        limit = page_kwargs.get("limit")
+        if limit:
             neo_query += f' LIMIT {limit}'
-        neo4j_session = neo4j_connection.session()
         print(neo_query, neo_params)
-        result = neo4j_session.run(neo_query, **neo_params)
-        return result, total
+
+        # the page and the count share one read transaction
+        def work(tx):
+            result = list(tx.run(neo_query, **neo_params))
+            count = short_page_total(result, limit, skip, cursor)
+            if count is None and total == TOTAL_EXACT:
+                count = tx.run(neo_count, **neo_params).single()[0]
+            return result, count
+
+        result, count = neo4j_sessions.read(work)
+        if count is None and total == TOTAL_ESTIMATE:
+            estimate = neo4j_sessions.estimate_rows(neo_estimate, **neo_params)
+            # the rows already seen are a lower bound
+            return result, max(estimate or 0, (skip or 0) + len(result) + 1), True
+        return result, count, False
+
+    def _end_label_condition(self, label, count, end_query, search_mode, neo_params):
+        '''
+        the condition on the end nodes of one label and the fulltext
+        call yielding them as end_node, None without a fulltext index
+        '''
+        partial_fields = end_query.pop("partial", [])
+        startswith_fields = end_query.pop("startswith", [])
+        condition = f"(end_node:{label}"
+        neo_params[f"end_label_{count}"] = label
+        fulltext = None
+        if search_mode == FULLTEXT_MODE and partial_fields:
+            fulltext = fulltext_indexes.plan(label, {k: v for k, v in end_query.items() if k in partial_fields})
+        call = None
+        if fulltext:
+            call = FulltextIndexes.call_clause(f"$fulltext_index_{count}", f"$fulltext_query_{count}", "end_node")
+            neo_params[f"fulltext_index_{count}"] = fulltext[0]
+            neo_params[f"fulltext_query_{count}"] = fulltext[1]
+        param_count = 0
+        for key, value in end_query.items():
+            if not isinstance(value, str) and key in partial_fields:
+                raise Exception(
+                    "Only string parameters can use partial search")
+            if fulltext and key in fulltext[2]:
+                continue
+            name = f"end_query_value_{count}{param_count}"
+            clause, neo_params[name] = self._end_key_condition(key, value, name, partial_fields, startswith_fields)
+            condition += clause
+            param_count += 1
+        return condition + ")", call
+
+    @staticmethod
+    def _end_key_condition(key, value, name, partial_fields, startswith_fields):
+        '''
+        the condition on one property of the end node and the value
+        of its $name parameter
+        '''
+        if key == "id":
+            return f" AND ID(end_node) = ${name}", value
+        # elif key in ["time_created", "time_lastmodified"]:
+        #    pass
+        if (key in partial_fields or key in startswith_fields) \
+                and isinstance(value, str) and shadow_properties.covers(key):
+            # compare with the indexed lower cased copy
+            operator = "CONTAINS" if key in partial_fields else "STARTS WITH"
+            shadow_key = shadow_properties.shadow_key(key)
+            return f" AND end_node.{shadow_key} {operator} ${name}", value.lower()
+        if key in partial_fields:
+            return f" AND TOLOWER(end_node.{key}) CONTAINS TOLOWER(${name})", value
+        if key in startswith_fields:
+            return f" AND TOLOWER(end_node.{key}) STARTS WITH TOLOWER(${name})", value
+        return f" AND end_node.{key} = ${name}", value
 
     def get_connected_nodes(self, global_entity_id, relation='own', direction='input'):
-        neo4j_session = neo4j_connection.session()
         query_map_direction = {
             "input": 'MATCH ({global_entity_id: $geid})<-[:' + relation + '*]-(connected) RETURN connected as node',
             "output": 'MATCH ({global_entity_id: $geid})-[:' + relation + '*]->(connected) RETURN connected as node',
             "both": 'MATCH ({global_entity_id: $geid})<-[:' + relation + '*]->(connected) RETURN connected as node'
         }.get(direction.lower())
-        res = neo4j_session.run(query_map_direction, geid=global_entity_id)
+        res = neo4j_sessions.run(query_map_direction, geid=global_entity_id)
 
         return res
 
@@ -574,6 +1055,5 @@ def neo_quick_query(query):
     '''
     quick count number of nodes in neo4j
     '''
-    neo4j_session = neo4j_connection.session()
-    res = neo4j_session.run(query)
+    res = neo4j_sessions.run(query)
     return res
@@ -0,0 +1,163 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+#
+# one gateway per worker process holds every connection
+# pool used to talk to neo4j. both the py2neo Graph (used by
+# Neo4jClient) and the bolt driver (used by the raw cypher
+# queries) are created here so the pool size can be tuned
+# in a single place
+#
+# nothing is opened when the gateway is created. the pools
+# are opened on first use and reopened when the process id
+# changes, so the app can be preloaded by the gunicorn master
+# and every forked worker still gets its own sockets
+#
+
+import os
+import threading
+
+from neo4j import GraphDatabase
+from py2neo import Graph
+
+
+class Neo4jGateway(object):
+
+    def __init__(self, url, user, password, max_connections=50,
+                 connection_acquisition_timeout=60, max_connection_lifetime=3600):
+        self.url = url
+        self.max_connections = max_connections
+        self.connection_acquisition_timeout = connection_acquisition_timeout
+        self.max_connection_lifetime = max_connection_lifetime
+
+        self._user = user
+        self._password = password
+        self._lock = threading.Lock()
+        self._pid = None
+        self._driver = None
+        self._graph = None
+
+    def _check_pid(self):
+        # the pools inherited from the parent process share its
+        # sockets, so just drop them without closing
+        if self._pid != os.getpid():
+            self._driver = None
+            self._graph = None
+            self._pid = os.getpid()
+
+    @property
+    def driver(self):
+        with self._lock:
+            self._check_pid()
+            if self._driver is None:
+                self._driver = GraphDatabase.driver(
+                    self.url,
+                    auth=(self._user, self._password),
+                    encrypted=False,
+                    max_connection_pool_size=self.max_connections,
+                    connection_acquisition_timeout=self.connection_acquisition_timeout,
+                    max_connection_lifetime=self.max_connection_lifetime,
+                )
+            return self._driver
+
+    @property
+    def graph(self):
+        with self._lock:
+            self._check_pid()
+            if self._graph is None:
+                self._graph = Graph(
+                    self.url,
+                    username=self._user,
+                    password=self._password,
+                    max_connections=self.max_connections,
+                )
+            return self._graph
+
+    @property
+    def connected(self):
+        return self._pid == os.getpid() and (self._driver is not None or self._graph is not None)
+
+    def warm_up(self):
+        '''
+        open both pools and run a trivial query on each of them,
+        used by the gunicorn post_fork hook
+        '''
+        with self.session() as neo4j_session:
+            neo4j_session.run('RETURN 1').consume()
+        self.graph.evaluate('RETURN 1')
+
+    def session(self, **config):
+        return self.driver.session(**config)
+
+    def pool_stats(self):
+        '''
+        snapshot of both connection pools, the numbers come from
+        the driver internals so they are best effort only
+        '''
+        if not self.connected:
+            return {
+                'connected': False,
+                'max_connections': self.max_connections,
+            }
+        return {
+            'connected': True,
+            'max_connections': self.max_connections,
+            'connection_acquisition_timeout': self.connection_acquisition_timeout,
+            'max_connection_lifetime': self.max_connection_lifetime,
+            'driver': self._driver_pool_stats(),
+            'graph': self._graph_pool_stats(),
+        }
+
+    def _driver_pool_stats(self):
+        pool = getattr(self._driver, '_pool', None)
+        connections = getattr(pool, 'connections', {})
+        stats = {'size': 0, 'in_use': 0, 'addresses': {}}
+        for address, address_connections in list(connections.items()):
+            in_use = pool.in_use_connection_count(address)
+            stats['addresses'][str(address)] = {
+                'size': len(address_connections),
+                'in_use': in_use,
+            }
+            stats['size'] += len(address_connections)
+            stats['in_use'] += in_use
+        return stats
+
+    def _graph_pool_stats(self):
+        connector = self._graph.service.connector if self._graph else None
+        pools = getattr(connector, '_pools', {})
+        stats = {'size': 0, 'in_use': 0, 'addresses': {}}
+        for profile, pool in list(pools.items()):
+            stats['addresses'][str(profile.address)] = {
+                'size': pool.size,
+                'in_use': pool.in_use,
+            }
+            stats['size'] += pool.size
+            stats['in_use'] += pool.in_use
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                if self._driver is not None:
+                    self._driver.close()
+                if self._graph is not None:
+                    self._graph.service.connector.close()
+            self._driver = None
+            self._graph = None
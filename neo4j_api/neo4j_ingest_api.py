@@ -0,0 +1,124 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+#
+# ndjson streams of nodes and relationships. the records are
+# parsed from the request stream as they arrive and written in
+# batches, the memory only holds the batches being written.
+# the status of every batch is streamed back as a ndjson line
+# and the last line is the summary of the job. the job can also
+# be followed from its id, sent in the X-Ingest-Job header
+#
+
+import json
+
+from flask import Response
+from flask import request
+from flask import stream_with_context
+from flask_restx import Resource
+
+from config import ConfigClass
+from neo4j_api.ingest import INGEST_JOB_HEADER
+from neo4j_api.ingest import batch_options
+from neo4j_api.ingest import read_ndjson
+from neo4j_api.neo4j_base import Neo4jClient
+
+from . import ingest_jobs
+from . import ingest_ns
+
+
+class IngestStream(Resource):
+    neo4j_method = Neo4jClient()
+
+    post_returns = """
+    one line per written batch, then the summary of the job
+    {"chunk": 0, "offset": 0, "size": 1000, "status": "success"}
+    {"chunk": 1, "offset": 1000, "size": 200, "status": "success",
+     "missing": [{"index": 1042, "start_found": false, "end_found": true}]}
+    {"chunk": 2, "offset": 1200, "size": 1, "status": "failed", "error": "labels is required"}
+    {"summary": {"job_id": <job-id>, "status": "partial", "records": 1201, "written": 1199, "failed": 1,
+                 "missing_endpoints": 1, "chunks": 3, "failed_chunks": 1, "errors": [...], ...}}
+    """
+
+    @ingest_ns.response(200, post_returns)
+    @ingest_ns.response(400, 'Invalid batch_size or parallelism')
+    def post(self):
+        """
+        Stream newline delimited json records of nodes and relationships
+        Usage: used for importing large datasets
+        {"type": "node", "labels": ["File", "Greenroom"], "properties": {"name": "a.txt"}}
+        {"type": "relationship", "label": "own", "start_label": "Container", "start_params": {"code": "test"},
+         "end_label": "File", "end_params": {"global_entity_id": <geid>}, "properties": {}}
+        the endpoints can be given with start_id and end_id instead. the consecutive
+        records of the same shape are written together, the relationships are written
+        once the nodes before them are
+        """
+        # the parallel transactions are capped by the configuration
+        try:
+            batch_size, parallelism = batch_options(
+                request.args, ConfigClass.NEO4J_INGEST_BATCH_SIZE, ConfigClass.NEO4J_INGEST_PARALLELISM,
+                ConfigClass.NEO4J_INGEST_PARALLELISM)
+        except ValueError as e:
+            return str(e), 400
+
+        job = ingest_jobs.start()
+
+        def generate():
+            error = None
+            try:
+                records = read_ndjson(request.stream)
+                for status in self.neo4j_method.ingest_records(records, batch_size, parallelism):
+                    job.update(status)
+                    yield json.dumps(status) + '\n'
+            except GeneratorExit:
+                error = 'the response was closed before the end of the stream'
+                raise
+            except Exception as e:
+                error = e
+            finally:
+                job.finish(error)
+            yield json.dumps({'summary': job.to_dict()}) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                        headers={INGEST_JOB_HEADER: job.id})
+
+
+class IngestJobStatus(Resource):
+
+    get_returns = """
+    {
+        "job_id": <job-id>, "status": "running", "started_at": 1650000000.0, "finished_at": null,
+        "records": 52000, "written": 52000, "failed": 0, "missing_endpoints": 0,
+        "chunks": 52, "failed_chunks": 0, "errors": []
+    }
+    """
+
+    @ingest_ns.response(200, get_returns)
+    @ingest_ns.response(404, 'Job not found')
+    def get(self, job_id):
+        """
+        Get the progress of a stream
+        Usage: used for following a long import, the jobs are kept by the worker
+        writing them, for NEO4J_INGEST_JOB_TTL seconds
+        """
+        job = ingest_jobs.get(job_id)
+        if job is None:
+            return 'job %s not found' % job_id, 404
+        return job.to_dict(), 200
@@ -19,15 +19,37 @@
 # 
 
 from flask import request, make_response, jsonify
+from config import ConfigClass
 # from flask_restful import Resource
 from flask_restx import Api, Resource
-from . import neo4j_connection
+from . import count_cache
+from . import count_planner
+from . import geid_cache
+from . import property_catalog
+from . import single_flight
 from neo4j_api.neo4j_base import Neo4jNode, Neo4jClient, neo_quick_query
-from utils import neo4j_obj_2_json, node_2_json
+from neo4j_api.cache import RELATIONSHIPS
+from neo4j_api.conditional import body_etag
+from neo4j_api.conditional import conditional_request
+from neo4j_api.conditional import last_modified
+from neo4j_api.conditional import validated
+from neo4j_api.count_planner import COUNT_PATH_HEADER
+from neo4j_api.facets import DEFAULT_FACET_LIMIT
+from neo4j_api.ingest import batch_options
+from neo4j_api.ingest import ingest_summary
+from neo4j_api.pagination import TOTAL_EXACT
+from neo4j_api.pagination import node_cursor
+from neo4j_api.pagination import node_page_headers
+from neo4j_api.sketches import APPROXIMATE_MODE
+from neo4j_api.sketches import MAX_TOP_K
+from utils import SHADOW_SUFFIX
+from utils import node_2_json
 from . import node_ns
 from neo4j_api.swagger_modules import (
     node_update_module, node_create_module,
-    node_query_module, node_query_module_count, labels_module, node_query_module_v2, node_batch_update)
+    node_query_module, node_query_module_count, labels_module, node_query_module_v2, node_batch_update,
+    node_batch_patch, node_facet_module)
+import copy
 import math
 import json
 
@@ -95,6 +117,12 @@ class ActionOnNodeById(Resource):
         Usage: used for check if project exists
         """
         try:
+            # a client revalidating its copy is answered from one driver query
+            if conditional_request():
+                metadata = self.node_method.get_node_metadata(label, int(id))
+                if not metadata:
+                    return [], 200
+                return validated([metadata], body_etag([metadata]), last_modified([metadata]))
             result = self.node_method.get_node(label, int(id))
             if result:
                 result = [node_2_json(result)]
@@ -103,7 +131,9 @@ class ActionOnNodeById(Resource):
         except Exception as e:
             return str(e), 403
 
-        return result, 200
+        if not result:
+            return result, 200
+        return validated(result, body_etag(result), last_modified(result))
 
     put_returns = """
         Container response:
@@ -254,15 +284,17 @@ class ActionOnNodeByGeid(Resource):
         are use the geid
         """
         try:
-            result = self.node_method.get_node_by_geid(geid)
-            if result:
-                result = [node_2_json(result)]
-            else:
-                result = []
+            result = geid_cache.get_many([geid], self.load_nodes)
         except Exception as e:
             return str(e), 403
 
-        return result, 200
+        if not result:
+            return result, 200
+        return validated(result, body_etag(result), last_modified(result))
+
+    def load_nodes(self, geids):
+        node = self.node_method.get_node_by_geid(geids[0])
+        return [node_2_json(node)] if node else []
 
 
 class BatchCreateNode(Resource):
@@ -272,18 +304,27 @@ class BatchCreateNode(Resource):
         """
         Create New Node with Given Label
         Usage: used for creating new user or new project
+        The payload is written in chunks of batch_size nodes, the status of each chunk
+        is returned so the failed ones can be sent again
         """
         post_data = request.get_json()
         payload = post_data['payload']
         extra_labels = post_data.get('extra_labels', [])
+        # the parallel transactions are capped by the configuration
+        try:
+            batch_size, parallelism = batch_options(
+                post_data, ConfigClass.NEO4J_INGEST_BATCH_SIZE, ConfigClass.NEO4J_INGEST_PARALLELISM,
+                ConfigClass.NEO4J_INGEST_PARALLELISM)
+        except ValueError as e:
+            return str(e), 400
 
-        # try:
-        #     res = self.node_method.bulk_add_node(label, payload, extra_labels)
-        #     # res
-        # except Exception as e:
-        #     return str(e), 403
-        res = self.node_method.bulk_add_node(label, payload, extra_labels)
-        return {"result": "success"}, 200
+        try:
+            chunks = self.node_method.ingest_nodes(
+                label, payload, extra_labels, batch_size=batch_size, parallelism=parallelism)
+        except Exception as e:
+            return str(e), 403
+        result, status = ingest_summary(chunks)
+        return {"result": result, "chunks": chunks}, status
 
 
 class CreateNode(Resource):
@@ -355,7 +396,7 @@ class CreateNode(Resource):
         # node name is required
         node_name = post_data.pop("name", None)
         try:
-            res = self.node_method.add_node(label, node_name, post_data)
+            res = self.node_method.add_node_grouped(label, node_name, post_data)
             result = [node_2_json(res)]
         except Exception as e:
             return str(e), 403
@@ -417,6 +458,8 @@ class ActionOnNodeByQuery(Resource):
         order_by = None
         order_type = None
         is_all = None
+        search_mode = None
+        cursor = None
         if post_data:
             if "partial" in post_data:
                 partial = post_data["partial"]
@@ -436,6 +479,8 @@ class ActionOnNodeByQuery(Resource):
             if "is_all" in post_data:
                 is_all = post_data["is_all"]
                 del post_data["is_all"]
+            search_mode = post_data.pop("search_mode", None)
+            cursor = post_data.pop("cursor", None)
         try:
             nodes = []
             if is_all:
@@ -444,7 +489,8 @@ class ActionOnNodeByQuery(Resource):
                     post_data,
                     partial=partial,
                     order_by=order_by,
-                    order_type=order_type
+                    order_type=order_type,
+                    search_mode=search_mode
                 )
             else:
                 nodes = self.node_method.query_node(
@@ -454,13 +500,17 @@ class ActionOnNodeByQuery(Resource):
                     skip=skip,
                     partial=partial,
                     order_by=order_by,
-                    order_type=order_type
+                    order_type=order_type,
+                    search_mode=search_mode,
+                    cursor=cursor
                 )
             result = [node_2_json(x) for x in nodes]
         except Exception as e:
             return str(e), 403
 
-        return result, 200
+        # the cursor of the next page is sent in a header to keep the body a list
+        headers = {} if is_all else node_page_headers(nodes, limit, order_by, order_type, cursor)
+        return validated(result, body_etag(result, headers), headers=headers)
 
 
 class CountActionOnNodeByQuery(Resource):
@@ -487,14 +537,15 @@ class CountActionOnNodeByQuery(Resource):
         if "partial" in post_data:
             partial = post_data["partial"]
             del post_data["partial"]
+        search_mode = post_data.pop("search_mode", None)
 
         try:
-            res = self.node_method.query_node(
-                label, post_data, count=True, partial=partial)
+            res, path = self.node_method.count_nodes(
+                label, post_data, partial=partial, search_mode=search_mode)
         except Exception as e:
             return str(e), 403
 
-        return {"count": int(res)}, 200
+        return {"count": int(res)}, 200, {COUNT_PATH_HEADER: path}
 
 
 class ActionOnProperty(Resource):
@@ -528,23 +579,49 @@ class ActionOnProperty(Resource):
     Default response:
     {"attribute_1":["all possible value"],
      "attribute_2":["all possible value"],
+    }\n
+    Approximate mode:
+    {"name": {"cardinality": 120400, "top": [{"value": "a.txt", "count": 35}, ...], "truncated": true},
+     "tags": {"cardinality": 12, "top": [{"value": "raw", "count": 3021}, ...], "truncated": true}
     }
     """
 
-    @node_ns.doc(params={'label': 'Container'})
+    @node_ns.doc(params={
+        'label': 'Container',
+        'limit': 'maximum number of values listed per property',
+        'mode': '"approximate" for the estimated cardinality and the top values of each property',
+        'top_k': 'number of top values in the approximate mode'})
     @node_ns.response(200, get_returns)
     @node_ns.response(403, """Exception""")
     def get(self, label):
         """
         Retreive the All the Property and Possible Value with Given Label
         Usage: used for getting project properties such as metadata, tag, usecase.
+        The X-Truncated-Keys header lists the properties whose values are not all listed.
         """
         try:
+            limit = request.args.get('limit', None, type=int)
+            if request.args.get('mode') == APPROXIMATE_MODE:
+                top_k = max(1, min(request.args.get('top_k', 10, type=int), MAX_TOP_K))
+                result = count_cache.get_or_count(
+                    'property_sketches', label, [label, top_k],
+                    lambda: self.node_method.get_property_sketches(label, top_k=top_k))
+                return result, 200
+            if property_catalog.enabled:
+                result, truncated = property_catalog.values(label, limit=limit)
+                return result, 200, {'X-Truncated-Keys': ','.join(truncated)}
+
             res = self.node_method.get_property_by_label(label)
 
             result = {}
+            truncated = []
             for x in res:
                 temp = dict(x)
+                if temp["key"].endswith(SHADOW_SUFFIX):
+                    continue
+                if limit is not None and len(temp["options"]) > limit:
+                    temp["options"] = temp["options"][:limit]
+                    truncated.append(temp["key"])
                 result.update({temp["key"]: temp["options"]})
 
             # pop out the time type
@@ -553,7 +630,7 @@ class ActionOnProperty(Resource):
         except Exception as e:
             return str(e), 403
 
-        return result, 200
+        return result, 200, {'X-Truncated-Keys': ','.join(truncated)}
 
 
 class ChangeLabels(Resource):
@@ -631,9 +708,13 @@ class NodeQueryAPI(Resource):
     @node_ns.expect(node_query_module_v2)
     def post(self):
         data = request.get_json()
+        body = copy.deepcopy(data)
         partial = data.pop("partial", False)
         order_by = data.pop("order_by", None)
         order_type = data.pop("order_type", None)
+        search_mode = data.pop("search_mode", None)
+        cursor = data.pop("cursor", None)
+        total_mode = data.pop("total", TOTAL_EXACT)
         page = data.pop("page", 0)
         page_size = data.pop("page_size", 25)
         skip = page * page_size
@@ -642,19 +723,25 @@ class NodeQueryAPI(Resource):
         if not query["labels"]:
             return "labels is required in query", 400
         labels = query.pop("labels")
-        try:
-            nodes = self.node_method.query_node(
+
+        def run_query():
+            nodes, total, estimated = self.node_method.query_node(
                 labels,
                 query,
                 limit=limit,
                 skip=skip,
                 partial=partial,
                 order_by=order_by,
-                order_type=order_type
+                order_type=order_type,
+                search_mode=search_mode,
+                cursor=cursor,
+                total=total_mode
             )
-            total = self.node_method.query_node(
-                labels, query, count=True, partial=partial)
-            result = [node_2_json(x) for x in nodes]
+            return nodes, [node_2_json(x) for x in nodes], total, estimated
+
+        try:
+            # identical concurrent queries share the execution
+            nodes, result, total, estimated = single_flight.do('node_query', body, run_query, labels)
         except Exception as e:
             return str(e), 403
         response = {
@@ -663,7 +750,58 @@ class NodeQueryAPI(Resource):
             'result': result,
             'page': page,
             'total': total,
-            'num_of_pages': math.ceil(total / page_size),
+            'total_estimated': estimated,
+            'num_of_pages': math.ceil(total / page_size) if total is not None else None,
+        }
+        if order_by or cursor is not None:
+            response['next_cursor'] = node_cursor(nodes, limit, order_by, order_type)
+        return validated(response, body_etag(response))
+
+
+class NodeFacetsAPI(Resource):
+    node_method = Neo4jClient()
+    response = """
+    {
+    'code': 200,
+    'error_msg': '',
+    'result': {
+        'uploader': [{'value': 'admin', 'count': 120}, {'value': 'testzy', 'count': 33}],
+        'tags': [{'value': 'raw', 'count': 80}],
+        'archived': [{'value': False, 'count': 150}, {'value': True, 'count': 3}],
+        'labels': [{'value': 'File', 'count': 153}, {'value': 'Greenroom', 'count': 153}]
+    }
+    }
+    """
+
+    @node_ns.response(200, response)
+    @node_ns.expect(node_facet_module)
+    def post(self):
+        """
+        Count the values of several properties over the nodes matching the NodeQueryAPI filters
+        Usage: used for filling the filter sidebars with one request
+        """
+        data = request.get_json()
+        partial = data.get("partial", False)
+        search_mode = data.get("search_mode", None)
+        facets = data.get("facets", [])
+        facet_limit = data.get("facet_limit", DEFAULT_FACET_LIMIT)
+        query = dict(data.get("query") or {})
+        if not query.get("labels"):
+            return "labels is required in query", 400
+        if not facets:
+            return "facets is required", 400
+        labels = query.pop("labels")
+        try:
+            result = count_cache.get_or_count(
+                'node_facets', labels, data,
+                lambda: self.node_method.count_facets(
+                    labels, query, facets, partial=partial, search_mode=search_mode, limit=facet_limit))
+        except Exception as e:
+            return str(e), 403
+        response = {
+            'code': 200,
+            'error_msg': '',
+            'result': result,
         }
         return response, 200
 
@@ -694,26 +832,20 @@ class NodeQuickCountAPI(Resource):
             for arg_key in request.args:
                 if not arg_key == 'labels':
                     query_params_kwargs[arg_key] = request.args[arg_key]
-            where_condition = ""
-            if query_params_kwargs:
-                def convert_value(val):
-                    if val.startswith('[bool]'):
-                        return val.replace('[bool]', '').lower()
-                    if val.startswith('[int]'):
-                        return val.replace('[int]', '')
-                    return '"{}"'.format(val)
 
-                where_condition = " and ".join(['n.{}={}'.format(key, convert_value(query_params_kwargs[key]))
-                                                for key in query_params_kwargs])
-            query = 'MATCH (n:{}) '.format(labels)
-            if where_condition:
-                query += " where {}".format(where_condition)
-            query += " RETURN count(n) as count"
-            print(query)
-            res = neo_quick_query(query)
-            for record in res:
-                result = record.items()[0][1]
-            return {"result": result}, 200
+            def convert_value(val):
+                if val.startswith('[bool]'):
+                    return val.replace('[bool]', '').lower() == 'true'
+                if val.startswith('[int]'):
+                    return int(val.replace('[int]', ''))
+                return val
+
+            equalities = {key: convert_value(value) for key, value in query_params_kwargs.items()}
+            result, path = count_cache.get_or_count(
+                'nodes_quick_count', labels, [labels, equalities],
+                lambda: single_flight.do(
+                    'nodes_quick_count', [labels, equalities], lambda: count_planner.count(labels, equalities), labels))
+            return {"result": result}, 200, {COUNT_PATH_HEADER: path}
         except Exception as e:
             print(e)
             return str(e), 403
@@ -771,7 +903,11 @@ class FileQuickCountAPI(Resource):
                 query += " and {}".format(where_condition)
             query += " RETURN count(n) as count"
             print(query)
-            res = neo_quick_query(query)
+            depends_on = [labels, 'Container', RELATIONSHIPS]
+            args = sorted(request.args.items(multi=True))
+            res = count_cache.get_or_count(
+                'file_quick_count', depends_on, args,
+                lambda: single_flight.do('file_quick_count', args, lambda: neo_quick_query(query), depends_on))
             for record in res:
                 result = record.items()[0][1]
             return {"result": result}, 200
@@ -787,22 +923,100 @@ class BatchUpdate(Resource):
         [{'id': 49, 'labels': ['Folder', 'Core'], 'global_entity_id': '6785869f-b017-4ed3-b602-a4ce7e8dcda2-1621605134', 'display_path': 'admin/test_copy_rename_36/testzy3/test_dest/test_copy_rename_56/testzyparent_34', 'project_code': 'test0511', 'tags': ['test_bulk123'], 'folder_level': 2, 'archived': False, 'list_priority': 10, 'folder_relative_path': 'admin/test_copy_rename_36/testzy3/test_dest/test_copy_rename_56', 'time_lastmodified': '2021-06-01T13:13:09', 'uploader': 'admin', 'system_tags': ['copied-to-core'], 'name': 'testzyparent_34', 'time_created': '2021-05-21T13:52:14'}]
         }"""
 
+    node_method = Neo4jClient()
+
     @node_ns.response(200, response)
     @node_ns.expect(node_batch_update)
     def put(self, node_property):
+        """
+        Set node_property on the nodes of the listed global_entity_id
+        Usage: used for bulk tagging, the rows without global_entity_id are skipped
+        The rows are written in one transaction and the nodes returned in their order,
+        the optional label scopes the match to the label index
+        """
         try:
             post_data = request.get_json()
-            data = post_data.get('data')
-
-            query = f'UNWIND $data as p ' \
-                    f'MATCH (n) where n.global_entity_id = p.global_entity_id SET n.{node_property} = p.{node_property} return n'
-            neo4j_session = neo4j_connection.session()
-            res = neo4j_session.run(query, data=data)
-            result = [neo4j_obj_2_json(x).get('n') for x in res]
+            data = post_data.get('data') or []
+            # only node_property is set, a row without it removes the property
+            rows = [{'global_entity_id': p['global_entity_id'], node_property: p.get(node_property)}
+                    for p in data if p.get('global_entity_id') is not None]
+            chunks, nodes = self.node_method.patch_nodes(
+                rows, label=post_data.get('label'), update_modified_time=False,
+                batch_size=max(len(rows), 1), parallelism=1, lock_order=False)
+            failed = [x['error'] for x in chunks if 'error' in x]
+            if failed:
+                raise Exception(failed[0])
+            result = [node_2_json(x) for x in nodes]
             return {"result": result}, 200
         except Exception as error:
             return str(error), 403
 
+
+class BatchPatch(Resource):
+    """Set several properties on the nodes matched on a key, in chunks"""
+    node_method = Neo4jClient()
+
+    patch_returns = """
+    {
+        "result": "success",
+        "updated": 2,
+        "missing": [],
+        "chunks": [{"chunk": 0, "offset": 0, "size": 2, "status": "success", "updated": 2, "missing": 0}],
+        "nodes": [{"id": 49, "labels": ["Folder", "Core"], "global_entity_id": <geid>, "archived": true, ...}]
+    }
+    """
+
+    @node_ns.response(200, patch_returns)
+    @node_ns.response(207, patch_returns)
+    @node_ns.response(400, 'Invalid batch_size or parallelism')
+    @node_ns.response(403, 'Exception')
+    @node_ns.expect(node_batch_patch)
+    def patch(self):
+        """
+        Set the properties of each row on the node matched on its key
+        Usage: used for bulk tagging or archiving the content of a folder
+        Each row holds the key and the properties to set on its node. The label scopes
+        the match to the label index. The rows are written in chunks of batch_size,
+        with counts_only the updated nodes are not returned
+        """
+        post_data = request.get_json()
+        data = post_data.get('data', [])
+        key = post_data.get('key', 'global_entity_id')
+        counts_only = post_data.get('counts_only', False)
+        # the parallel transactions are capped by the configuration
+        try:
+            batch_size, parallelism = batch_options(
+                post_data, ConfigClass.NEO4J_INGEST_BATCH_SIZE, ConfigClass.NEO4J_INGEST_PARALLELISM,
+                ConfigClass.NEO4J_INGEST_PARALLELISM)
+        except ValueError as e:
+            return str(e), 400
+
+        try:
+            chunks, nodes = self.node_method.patch_nodes(
+                data, key=key, label=post_data.get('label'), return_nodes=not counts_only,
+                update_modified_time=post_data.get('update_modified_time', True),
+                batch_size=batch_size, parallelism=parallelism)
+        except Exception as e:
+            return str(e), 403
+
+        missing = []
+        for chunk in chunks:
+            missing += chunk.get('missing', [])
+            if 'missing' in chunk:
+                chunk['missing'] = len(chunk['missing'])
+        result, status = ingest_summary(chunks)
+        if missing and result == 'success':
+            result, status = 'partial', 207
+        response = {
+            "result": result,
+            "updated": sum(x.get('updated', 0) for x in chunks),
+            "missing": missing,
+            "chunks": chunks,
+        }
+        if not counts_only:
+            response["nodes"] = [node_2_json(x) for x in nodes]
+        return response, status
+
 class QueryByGeidBulk(Resource):
     node_method = Neo4jClient()
 
@@ -813,9 +1027,8 @@ class QueryByGeidBulk(Resource):
             return "geids parameter is required", 400
 
         try:
-            nodes = self.node_method.query_by_geid_bulk(geids)
-            total = len(nodes)
-            result = [node_2_json(x) for x in nodes]
+            result = geid_cache.get_many(geids, self.load_nodes)
+            total = len(result)
         except Exception as e:
             return "Error running neo4j query: " + str(e), 500
 
@@ -827,7 +1040,10 @@ class QueryByGeidBulk(Resource):
             'total': total,
             'num_of_pages': 1,
         }
-        return response, 200
+        return validated(response, body_etag(response))
+
+    def load_nodes(self, geids):
+        return [node_2_json(x) for x in self.node_method.query_by_geid_bulk(geids)]
 
 
 class BulkUpdate(Resource):
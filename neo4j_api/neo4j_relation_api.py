@@ -18,101 +18,82 @@
 # permissions and limitations under the Licence.
 # 
 
+import copy
+
 from flask import request, make_response, jsonify
 # from flask_restful import Resource
 from flask_restx import Api, Resource, fields
 
 from neo4j_api.neo4j_base import Neo4jRelationship, Neo4jClient
+from config import ConfigClass
+from neo4j_api.cache import RELATIONSHIPS
+from neo4j_api.ingest import batch_options
+from neo4j_api.ingest import ingest_summary
+from neo4j_api.ingest import relation_rows
+from neo4j_api.pagination import TOTAL_EXACT
+from neo4j_api.pagination import relation_cursor
 from utils import neo4j_obj_2_json, node_2_json, path_2_json
 from . import relationship_ns, module_api
+from . import count_cache
+from . import single_flight
 from neo4j_api.swagger_modules import *
 
 
 class BatchRelationshipActions(Resource):
     neo4j_method = Neo4jClient()
 
+    post_returns = """
+    {
+        "result": "partial",
+        "missing": [{"index": 3, "start_found": true, "end_found": false}],
+        "chunks": [{"chunk": 0, "offset": 0, "size": 1000, "status": "success", "missing": 1}]
+    }
+    """
+
+    @relationship_ns.response(200, post_returns)
+    @relationship_ns.response(207, post_returns)
+    @relationship_ns.response(400, 'Invalid batch_size or parallelism')
+    @relationship_ns.response(403, 'Exception')
     def post(self, label):
         """
         bulk add the relationship between the two node
         Usage: used for adding user to the project
+        The ends in params_location are matched on their start_params or end_params within
+        start_label or end_label, the other ones on their start_id or end_id. With merge the
+        existing relationships are updated instead of duplicated. The payload is written in
+        chunks of batch_size rows, the index of the rows whose ends were not found is returned
         """
         post_data = request.get_json()
         payload = post_data['payload']
         params_location = post_data['params_location']
         start_label = post_data['start_label']
         end_label = post_data['end_label']
-
-        data = []
-
+        merge = post_data.get('merge', False)
+        # the chunks linking the same nodes wait for each other's locks,
+        # they are written one at a time unless asked otherwise
         try:
-            if len(params_location) == 1:
-                if params_location[0] == 'end':
-                    for item in payload:
-                        params_data = tuple()
-                        params_key = (end_label,)
-
-                        end_params = item["end_params"]
-                        for key, value in end_params.items():
-                            params_key += (key, )
-                            params_data += (value, )
-
-                        if len(params_data) == 1:
-                            params_data = params_data[0]
-
-                        data.append((item['start_id'], {}, params_data))
-
-                    res = self.neo4j_method.bulk_add_relation_between_nodes(
-                        label, data, None, params_key)
-
-                else:
-                    for item in payload:
-                        params_data = tuple()
-                        params_key = (start_label, )
-
-                        start_params = item["start_params"]
-                        for key, value in start_params.items():
-                            params_key += (key, )
-                            params_data += (value, )
-
-                        if len(params_data) == 1:
-                            params_data = params_data[0]
-
-                        data.append((item['start_id'], {}, params_data))
-
-                    res = self.neo4j_method.bulk_add_relation_between_nodes(
-                        label, data, start_params, None)
-            else:
-                for item in payload:
-                    end_params_data = tuple()
-                    end_params_keys = (end_label,)
-
-                    start_params_data = tuple()
-                    start_params_keys = (start_label, )
-
-                    end_params = item["end_params"]
-                    for key, value in end_params.items():
-                        end_params_keys += (key, )
-                        end_params_data += (value, )
-
-                    start_params = item["start_params"]
-                    for key, value in start_params.items():
-                        start_params_keys += (key, )
-                        start_params_data += (value, )
-
-                    if len(start_params_data) == 1:
-                        start_params_data = start_params_data[0]
-
-                    if len(end_params_data) == 1:
-                        end_params_data = end_params_data[0]
-                    data.append((start_params_data, {}, end_params_data))
-
-                res = self.neo4j_method.bulk_add_relation_between_nodes(
-                    label, data, start_params_keys, end_params_keys)
+            batch_size, parallelism = batch_options(
+                post_data, ConfigClass.NEO4J_INGEST_BATCH_SIZE, 1, ConfigClass.NEO4J_INGEST_PARALLELISM)
+        except ValueError as e:
+            return str(e), 400
 
+        try:
+            start_keys, end_keys, rows = relation_rows(payload, params_location)
+            chunks = self.neo4j_method.ingest_relations(
+                label, rows, start_label, end_label, start_keys, end_keys,
+                merge=merge, batch_size=batch_size, parallelism=parallelism)
         except Exception as e:
             return str(e), 403
 
-        return {"result": "success"}, 200
+        missing = []
+        for chunk in chunks:
+            missing += chunk.get('missing', [])
+            if 'missing' in chunk:
+                chunk['missing'] = len(chunk['missing'])
+        result, status = ingest_summary(chunks)
+        if missing and result == 'success':
+            result, status = 'partial', 207
+        return {"result": result, "missing": missing, "chunks": chunks}, status
 
 
 class RelationshipActions(Resource):
@@ -142,7 +123,7 @@ class RelationshipActions(Resource):
             return 'start_id and end_id are required', 403
         # make the label between node to node
         try:
-            self.neo4j_method.add_relation_between_nodes(
+            self.neo4j_method.add_relation_grouped(
                 label, start_id, end_id, properties=properties)
         except Exception as e:
             return str(e), 403
@@ -389,6 +370,7 @@ class ActionOnRelationshipByQuery(Resource):
             "skip": post_data.get("skip", None),
             "order_by": post_data.get("order_by"),
             "order_type": post_data.get("order_type"),
+            "cursor": post_data.get("cursor"),
         }
 
         # then call the function to see if we can get the infomation
@@ -410,7 +392,15 @@ class ActionOnRelationshipByQuery(Resource):
         for x in res:
             result.append(neo4j_obj_2_json(x))
 
-        return result, 200
+        # the cursor of the next page is sent in a header to keep the body a list
+        headers = {}
+        if page_kwargs["order_by"] or page_kwargs["cursor"] is not None:
+            order_node = 'start_node' if sort_node == 'start' else 'end_node'
+            next_page = relation_cursor(
+                res, page_kwargs["limit"], page_kwargs["order_by"], page_kwargs["order_type"], order_node)
+            if next_page:
+                headers['X-Next-Cursor'] = next_page
+        return result, 200, headers
 
 
 class CountActionOnRelationshipByQuery(Resource):
@@ -452,14 +442,23 @@ class CountActionOnRelationshipByQuery(Resource):
         partial = post_data.get('partial', False)
         extra_query = post_data.get('extra_query', "")
 
+        # without both labels, or with a free extra query, any write
+        # can change the count
+        depends_on = None
+        if start_label and end_label and not extra_query:
+            depends_on = [start_label, end_label, RELATIONSHIPS]
+
         # then call the function to see if we can get the infomation
         try:
-            res = self.neo4j_method.get_relation_with_params(
-                label, start_label, end_label, start_params, end_params, partial=partial, count=True, extra_query=extra_query)
+            res = count_cache.get_or_count(
+                'relations_count', depends_on, post_data,
+                lambda: self.neo4j_method.get_relation_with_params(
+                    label, start_label, end_label, start_params, end_params, partial=partial, count=True,
+                    extra_query=extra_query)[0][0])
         except Exception as e:
             return str(e), 403
 
-        return {"count": res.value()[0]}, 200
+        return {"count": res}, 200
 
 
 class RelationshipQueryV2(Resource):
@@ -480,21 +479,32 @@ class RelationshipQueryV2(Resource):
             "skip": post_data.get("skip", None),
             "order_by": post_data.get("order_by"),
             "order_type": post_data.get("order_type"),
+            "cursor": post_data.get("cursor"),
         }
         if not query.get("start_params"):
             return "start_params required", 400
-        result = []
+        body = copy.deepcopy(post_data)
+
+        def run_query():
+            res, total, estimated = self.client.relation_query_multiple_labels(
+                start_label, end_labels, query_params=query, page_kwargs=page_kwargs,
+                search_mode=post_data.get("search_mode"), total=post_data.get("total", TOTAL_EXACT))
+            return res, [neo4j_obj_2_json(x)["end_node"] for x in res], total, estimated
+
         try:
-            res, total = self.client.relation_query_multiple_labels(
-                start_label, end_labels, query_params=query, page_kwargs=page_kwargs)
-            for x in res:
-                result.append(neo4j_obj_2_json(x)["end_node"])
+            # identical concurrent queries share the execution
+            labels = [start_label] + (end_labels if isinstance(end_labels, list) else [end_labels]) + [RELATIONSHIPS]
+            res, result, total, estimated = single_flight.do('relation_query', body, run_query, labels)
         except Exception as e:
             return str(e), 403
         response = {
             "results": result,
             "total": total,
+            "total_estimated": estimated,
         }
+        if page_kwargs["order_by"] or page_kwargs["cursor"] is not None:
+            response["next_cursor"] = relation_cursor(
+                res, page_kwargs["limit"], page_kwargs["order_by"], page_kwargs["order_type"])
         return response
 
 
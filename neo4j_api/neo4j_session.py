@@ -0,0 +1,138 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+#
+# every cypher query sent through the bolt driver goes
+# through the session manager. the session only lives as
+# long as the query: the result is either read completely
+# before the session is closed, or streamed from a generator
+# that closes the session once it is exhausted or dropped.
+# the number of concurrent sessions per worker is capped,
+# extra requests wait for a free slot
+#
+
+import threading
+from contextlib import contextmanager
+
+
+class SessionManager(object):
+
+    def __init__(self, gateway, max_sessions=20, acquire_timeout=30):
+        self._gateway = gateway
+        self.max_sessions = max_sessions
+        self.acquire_timeout = acquire_timeout
+        self._slots = threading.BoundedSemaphore(max_sessions)
+        self._lock = threading.Lock()
+        self._counters = {
+            'opened': 0,
+            'closed': 0,
+            'waiting': 0,
+            'timeouts': 0,
+            'abandoned': 0,
+        }
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._counters[key] += amount
+
+    def _acquire(self):
+        self._count('waiting')
+        try:
+            acquired = self._slots.acquire(timeout=self.acquire_timeout)
+        finally:
+            self._count('waiting', -1)
+        if not acquired:
+            self._count('timeouts')
+            raise Exception('Timed out waiting for a free neo4j session')
+
+    @contextmanager
+    def session(self, **config):
+        self._acquire()
+        try:
+            neo4j_session = self._gateway.session(**config)
+            self._count('opened')
+        except Exception:
+            self._slots.release()
+            raise
+        try:
+            yield neo4j_session
+        finally:
+            try:
+                neo4j_session.close()
+            finally:
+                self._count('closed')
+                self._slots.release()
+
+    def run(self, query, **params):
+        '''
+        run the query and return all the records as a list, the
+        session is already closed when this returns
+        '''
+        with self.session() as neo4j_session:
+            return list(neo4j_session.run(query, **params))
+
+    def read(self, work):
+        '''
+        run work(tx) in a read transaction and return its result,
+        the queries of work share the session and the snapshot
+        '''
+        with self.session() as neo4j_session:
+            return neo4j_session.read_transaction(work)
+
+    def estimate_rows(self, query, **params):
+        '''
+        number of rows the planner expects from the query, read from
+        its EXPLAIN plan without running it
+        '''
+        with self.session() as neo4j_session:
+            plan = neo4j_session.run('EXPLAIN ' + query, **params).consume().plan
+        if not plan:
+            return None
+        return int(plan.get('args', {}).get('EstimatedRows', 0))
+
+    def write(self, work):
+        '''
+        run work(tx) in a write transaction and return its result,
+        the transient errors are retried by the driver
+        '''
+        with self.session() as neo4j_session:
+            return neo4j_session.write_transaction(work)
+
+    def stream(self, query, **params):
+        '''
+        yield the records one by one, the session is kept until
+        the generator is exhausted or closed. a generator dropped
+        before the end is counted as abandoned
+        '''
+        with self.session() as neo4j_session:
+            result = neo4j_session.run(query, **params)
+            try:
+                for record in result:
+                    yield record
+            except GeneratorExit:
+                self._count('abandoned')
+                raise
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        counters['active'] = counters['opened'] - counters['closed']
+        counters['max_sessions'] = self.max_sessions
+        return counters
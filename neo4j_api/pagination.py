@@ -0,0 +1,170 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+#
+# keyset pagination. SKIP makes neo4j produce and drop every
+# row before the page, so deep pages get slower and slower.
+# a cursor carries the sort value and the id of the last row
+# returned, the next page starts right after that row with a
+# WHERE condition the index on the sort key can serve. the
+# rows are ordered by the sort key then by id so the position
+# of a row is unique
+#
+
+import base64
+import json
+
+import neotime
+from neo4j.graph import Node
+
+from neo4j_api.cypher_builder import escape_identifier
+
+# how the total of a page is computed. the estimate comes from
+# the planner statistics and is not exact
+TOTAL_EXACT = 'exact'
+TOTAL_ESTIMATE = 'estimate'
+TOTAL_NONE = 'none'
+TOTAL_MODES = (TOTAL_EXACT, TOTAL_ESTIMATE, TOTAL_NONE)
+
+
+def _encode_value(value):
+    if hasattr(value, 'iso_format'):
+        return {'datetime': value.iso_format()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return neotime.DateTime.from_iso_format(value['datetime'])
+    return value
+
+
+def encode_cursor(order_by, order_type, value, row_id):
+    '''
+    opaque token for the row of the given sort value and id
+    '''
+    order = [order_by, (order_type or 'asc').lower()]
+    payload = json.dumps([order, _encode_value(value) if order_by else None, row_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor, order_by, order_type):
+    '''
+    return the sort value and the id of the cursor, it has to be
+    used with the ordering it was created for
+    '''
+    try:
+        order, value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        value = _decode_value(value)
+    except Exception:
+        raise Exception('Invalid cursor')
+    if order != [order_by, (order_type or 'asc').lower()] or not isinstance(row_id, int):
+        raise Exception('Invalid cursor, the order_by and order_type have to stay the same between the pages')
+    return value, row_id
+
+
+def next_cursor(rows, limit, order_by, order_type, row_value):
+    '''
+    cursor of the page following rows, None on the last page.
+    row_value returns the sort value and the id of a row
+    '''
+    if not limit or len(rows) < limit:
+        return None
+    value, row_id = row_value(rows[-1])
+    return encode_cursor(order_by, order_type, value, row_id)
+
+
+def order_clause(variable, order_by, order_type, id_expression):
+    '''
+    ORDER BY fields with the id as tie breaker
+    '''
+    descending = ' DESC' if (order_type or '').lower() == 'desc' else ''
+    fields = [f'{variable}.{escape_identifier(order_by)}{descending}'] if order_by else []
+    return fields + [f'{id_expression}{descending if order_by else ""}']
+
+
+def cursor_condition(variable, order_by, order_type, id_expression, value, value_param, id_param):
+    '''
+    WHERE condition selecting the rows after the cursor. nulls are
+    sorted last in ascending order and first in descending order
+    '''
+    if not order_by:
+        return f'{id_expression} > {id_param}'
+    key = f'{variable}.{escape_identifier(order_by)}'
+    descending = (order_type or '').lower() == 'desc'
+    if value is None:
+        if descending:
+            return f'({key} IS NOT NULL OR {id_expression} < {id_param})'
+        return f'({key} IS NULL AND {id_expression} > {id_param})'
+    if descending:
+        return f'({key} < {value_param} OR ({key} = {value_param} AND {id_expression} < {id_param}))'
+    return f'({key} > {value_param} OR ({key} = {value_param} AND {id_expression} > {id_param}) OR {key} IS NULL)'
+
+
+def node_cursor(nodes, limit, order_by, order_type):
+    '''
+    cursor after the last node of a query_node page, a py2neo node
+    or a driver node for the pages read with their total
+    '''
+    return next_cursor(
+        nodes,
+        limit,
+        order_by,
+        order_type,
+        lambda x: (x.get(order_by) if order_by else None, x.id if isinstance(x, Node) else x.identity),
+    )
+
+
+def node_page_headers(nodes, limit, order_by, order_type, cursor):
+    '''
+    X-Next-Cursor header of a query_node page whose body stays a
+    list, empty on the last page or without a keyset order
+    '''
+    if not order_by and cursor is None:
+        return {}
+    next_page = node_cursor(nodes, limit, order_by, order_type)
+    return {'X-Next-Cursor': next_page} if next_page else {}
+
+
+def relation_cursor(records, limit, order_by, order_type, order_node='end_node'):
+    '''
+    cursor after the last record of a relationship page
+    '''
+    return next_cursor(
+        records, limit, order_by, order_type, lambda x: (x[order_node].get(order_by) if order_by else None, x['r'].id)
+    )
+
+
+def check_total_mode(total):
+    if total not in TOTAL_MODES:
+        raise Exception(f'Invalid total, it should be one of {", ".join(TOTAL_MODES)}')
+
+
+def short_page_total(rows, limit, skip, cursor):
+    '''
+    the total told by a page shorter than the limit, None when it
+    has to be counted
+    '''
+    if not limit or len(rows) >= limit or cursor:
+        return None
+    if not rows and skip:
+        # past the last page
+        return None
+    return (skip or 0) + len(rows)
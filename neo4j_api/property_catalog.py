@@ -0,0 +1,183 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+#
+# listing the properties of a label collected every distinct
+# value of every node of the label. when enabled, the distinct
+# values are kept in one (:PropertyCatalog) node per label and
+# key, added to by the node write paths and capped per key.
+# each worker remembers the values it already recorded and the
+# full keys, only the new values are written. the values
+# removed by an update or a delete stay listed until the
+# catalog is rebuilt
+#
+
+import json
+import threading
+
+from logger import LoggerFactory
+
+from neo4j_api.cypher_builder import escape_identifier
+from neo4j_api.ingest import chunks
+from utils import SHADOW_SUFFIX
+
+CATALOG_LABEL = 'PropertyCatalog'
+
+# not listed, every node has its own
+EXCLUDED_KEYS = ('time_created', 'time_lastmodified')
+
+# the values are stored json encoded, a property holds a
+# list of a single type and no nested list
+_RECORD = f'''
+UNWIND $entries AS entry
+MERGE (c:{CATALOG_LABEL} {{name: entry.label + '.' + entry.key}})
+ON CREATE SET c.label = entry.label, c.key = entry.key, c.values = [], c.truncated = false
+WITH c, entry, [x IN entry.values WHERE NOT x IN c.values] AS added
+WITH c, entry, added, CASE WHEN size(c.values) < $max_values THEN $max_values - size(c.values) ELSE 0 END AS room
+SET c.values = c.values + added[..room],
+    c.truncated = c.truncated OR entry.truncated OR size(added) > room
+WITH c WHERE size(c.values) >= $max_values AND c.truncated
+RETURN c.label AS label, c.key AS key
+'''
+
+
+def encode_value(value):
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+class PropertyCatalog(object):
+
+    def __init__(self, sessions, enabled=False, max_values=1000):
+        self._sessions = sessions
+        self._logger = LoggerFactory('api_invitation').get_logger()
+        self.enabled = enabled
+        self.max_values = max_values
+        self._lock = threading.Lock()
+        # {(label, key): {<encoded value>}} already in the catalog
+        self._known = {}
+        # (label, key) with max_values values and more left out
+        self._full = set()
+
+    def entries(self, nodes):
+        '''
+        the distinct values of the (labels, properties) pairs
+        grouped by label and key, in the order the catalog nodes
+        are locked
+        '''
+        grouped = {}
+        for labels, properties in nodes:
+            for key, value in properties.items():
+                if value is None or key in EXCLUDED_KEYS or key.endswith(SHADOW_SUFFIX):
+                    continue
+                encoded = encode_value(value)
+                for label in labels:
+                    grouped.setdefault((label, key), {})[encoded] = None
+        return [
+            {
+                'label': label,
+                'key': key,
+                'values': list(values)[:self.max_values],
+                'truncated': len(values) > self.max_values,
+            }
+            for (label, key), values in sorted(grouped.items())
+        ]
+
+    def record(self, nodes):
+        '''
+        add the values of the written (labels, properties) pairs. the
+        full keys and the values already recorded are not written
+        again, the transient errors are retried by the driver
+        '''
+        if not self.enabled:
+            return
+        with self._lock:
+            entries = []
+            for entry in self.entries(nodes):
+                key = (entry['label'], entry['key'])
+                if key in self._full:
+                    continue
+                known = self._known.get(key, ())
+                values = [x for x in entry['values'] if x not in known]
+                if values:
+                    entries.append(dict(entry, values=values))
+        if not entries:
+            return
+        self._write(self._sessions, entries)
+
+    def _write(self, sessions, entries):
+        full = sessions.write(lambda tx: [
+            (record['label'], record['key']) for record in tx.run(_RECORD, entries=entries, max_values=self.max_values)
+        ])
+        with self._lock:
+            for entry in entries:
+                self._known.setdefault((entry['label'], entry['key']), set()).update(entry['values'])
+            for key in full:
+                self._full.add(key)
+                self._known.pop(key, None)
+
+    def values(self, label, limit=None):
+        '''
+        the catalog of the label as {key: [values]}, with the keys
+        whose values are not all listed
+        '''
+        records = self._sessions.run(
+            f'MATCH (c:{CATALOG_LABEL} {{label: $label}}) RETURN c.key AS key, c.values AS values, '
+            'c.truncated AS truncated',
+            label=label,
+        )
+        result, truncated = {}, []
+        for record in records:
+            values = record['values']
+            if limit is not None and len(values) > limit:
+                values = values[:limit]
+                truncated.append(record['key'])
+            elif record['truncated']:
+                truncated.append(record['key'])
+            result[record['key']] = [json.loads(x) for x in values]
+        return result, truncated
+
+    def create_indexes(self, sessions):
+        sessions.run(
+            f'CREATE CONSTRAINT property_catalog_name IF NOT EXISTS ON (c:{CATALOG_LABEL}) ASSERT c.name IS UNIQUE')
+        sessions.run(f'CREATE INDEX property_catalog_label IF NOT EXISTS FOR (c:{CATALOG_LABEL}) ON (c.label)')
+
+    def rebuild(self, sessions, label=None, batch_size=10000):
+        '''
+        drop the catalog of the label, or the whole catalog, and
+        record every node again in batches of the one pass over the
+        nodes. return the number of nodes processed
+        '''
+        if label:
+            sessions.run(f'MATCH (c:{CATALOG_LABEL} {{label: $label}}) DELETE c', label=label)
+            node = f'(n:{escape_identifier(label)})'
+        else:
+            sessions.run(f'MATCH (c:{CATALOG_LABEL}) DELETE c')
+            node = '(n)'
+        with self._lock:
+            self._known.clear()
+            self._full.clear()
+        query = f'MATCH {node} WHERE NOT n:{CATALOG_LABEL} RETURN labels(n) AS labels, properties(n) AS properties'
+        total = 0
+        for _, records in chunks(sessions.stream(query), batch_size):
+            entries = self.entries([([label] if label else x['labels'], x['properties']) for x in records])
+            if entries:
+                self._write(sessions, entries)
+            total += len(records)
+        return total
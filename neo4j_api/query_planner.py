@@ -0,0 +1,316 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+#
+# the planner decides which cypher operator is used for each
+# filter of query_node. the regex LIKE used to be applied to
+# every string, which always ends in a label scan. now the
+# filter intent is used to pick equality, STARTS WITH,
+# CONTAINS, IN or a range, and the schema indexes reported by
+# neo4j are checked: a case insensitive filter on an indexed
+# property seeks the range of its case variants before the
+# regex, only the filters without an index scan the label.
+# those filters move to the lower cased shadow property when
+# the shadow properties are enabled. the time windows compare
+# the stored temporal property with the bounds directly so
+# the range index on it can be used
+#
+
+import re
+import string
+import threading
+import time
+from datetime import datetime
+from datetime import timezone
+
+import neotime
+from logger import LoggerFactory
+from py2neo.matching import AND
+from py2neo.matching import CONTAINS
+from py2neo.matching import EQ
+from py2neo.matching import GE
+from py2neo.matching import GT
+from py2neo.matching import IN
+from py2neo.matching import LE
+from py2neo.matching import LIKE
+from py2neo.matching import LT
+from py2neo.matching import STARTS_WITH
+from py2neo.matching import NodeMatch
+
+from neo4j_api.cypher_builder import CypherQuery
+from neo4j_api.cypher_builder import format_labels
+
+# operators that can be requested explicitly with a filter
+# such as {"name": {"starts_with": "abc"}}
+OPERATORS = {
+    'eq': EQ,
+    'starts_with': STARTS_WITH,
+    'contains': CONTAINS,
+    'in': IN,
+    'gt': GT,
+    'gte': GE,
+    'lt': LT,
+    'lte': LE,
+}
+
+_ASCII_UPPER = str.maketrans(string.ascii_lowercase, string.ascii_uppercase)
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+# the time window filters <prefix>_start and <prefix>_end and
+# the stored property they bound. create_time is the older
+# name of the time_created window
+TIME_RANGE_PREFIXES = {
+    'create_time': 'time_created',
+    'time_created': 'time_created',
+    'time_lastmodified': 'time_lastmodified',
+}
+
+
+def time_bound(value):
+    '''
+    convert an iso formatted bound to the naive utc DateTime the
+    nodes are stored with
+    '''
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return neotime.DateTime.from_native(value)
+
+
+def split_time_ranges(filters):
+    '''
+    separate the time window filters from the others. return the
+    windows as {<property>: {'start': <bound>, 'end': <bound>}}
+    and the remaining filters. a create_time window missing one
+    of its bounds keeps the current time for it as it always did
+    '''
+    windows, remaining = {}, {}
+    for key, value in filters.items():
+        prefix, _, side = key.rpartition('_')
+        if prefix in TIME_RANGE_PREFIXES and side in ('start', 'end'):
+            window = windows.setdefault(TIME_RANGE_PREFIXES[prefix], {})
+            window[side] = time_bound(value)
+            if prefix == 'create_time':
+                now = neotime.DateTime.utc_now()
+                window.setdefault('start', now)
+                window.setdefault('end', now)
+        else:
+            remaining[key] = value
+    return windows, remaining
+
+
+def time_range_predicate(window):
+    '''
+    the exclusive range predicate of a time window
+    '''
+    predicates = []
+    if 'start' in window:
+        predicates.append(GT(window['start']))
+    if 'end' in window:
+        predicates.append(LT(window['end']))
+    return predicates[0] if len(predicates) == 1 else AND(*predicates)
+
+
+class SchemaIndexCatalog(object):
+    '''
+    cached copy of the indexes defined in neo4j, refreshed
+    after ttl seconds
+    '''
+
+    def __init__(self, sessions, ttl=60):
+        self._sessions = sessions
+        self._logger = LoggerFactory('api_invitation').get_logger()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._indexes = []
+        self._loaded_at = None
+
+    def _load(self):
+        try:
+            records = self._sessions.run('SHOW INDEXES YIELD *')
+        except Exception:
+            # neo4j before 4.2 only has the procedure
+            records = self._sessions.run('CALL db.indexes()')
+        indexes = []
+        for record in records:
+            record = dict(record)
+            indexes.append({
+                'name': record.get('name'),
+                'state': record.get('state'),
+                'type': record.get('type'),
+                'entity_type': record.get('entityType'),
+                'labels': list(record.get('labelsOrTypes') or []),
+                'properties': list(record.get('properties') or []),
+                # neo4j 5 reports the owning constraint instead
+                'unique': record.get('uniqueness') == 'UNIQUE' or bool(record.get('owningConstraint')),
+            })
+        return indexes
+
+    def refresh(self):
+        try:
+            indexes = self._load()
+        except Exception as e:
+            self._logger.error('Error loading the neo4j indexes: ' + str(e))
+            indexes = self._indexes
+        with self._lock:
+            self._indexes = indexes
+            self._loaded_at = time.monotonic()
+        return indexes
+
+    def indexes(self):
+        with self._lock:
+            expired = self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+        if expired:
+            return self.refresh()
+        return self._indexes
+
+    def has_index(self, labels, key, index_types=('BTREE', 'RANGE', 'TEXT')):
+        '''
+        true when an online node index on one of the labels starts
+        with the given property
+        '''
+        if isinstance(labels, str):
+            labels = [labels]
+        for index in self.indexes():
+            if index['entity_type'] != 'NODE' or index['state'] != 'ONLINE':
+                continue
+            if index['type'] not in index_types or not index['properties']:
+                continue
+            if index['properties'][0] == key and set(index['labels']) & set(labels):
+                return True
+        return False
+
+
+class PredicatePlanner(object):
+
+    def __init__(self, index_catalog, shadow_properties=None):
+        self.index_catalog = index_catalog
+        self.shadow_properties = shadow_properties
+
+    def plan(self, labels, key, value, partial=False):
+        '''
+        return the property key and the py2neo predicate used to
+        filter on it
+        '''
+        return self.explain(labels, key, value, partial)[:2]
+
+    def explain(self, labels, key, value, partial=False):
+        '''
+        same as plan with an extra flag telling if the predicate
+        can be served by a schema index
+        '''
+        if isinstance(value, dict):
+            predicate = self._explicit(value)
+            return key, predicate, self.index_catalog.has_index(labels, key)
+        if not isinstance(value, str):
+            return key, value, self.index_catalog.has_index(labels, key)
+
+        if self._caseless(value):
+            predicate = CONTAINS(value) if partial else EQ(value)
+            return key, predicate, self.index_catalog.has_index(labels, key)
+
+        if self.shadow_properties and self.shadow_properties.covers(key):
+            key = self.shadow_properties.shadow_key(key)
+            value = value.lower()
+            predicate = CONTAINS(value) if partial else EQ(value)
+            return key, predicate, self.index_catalog.has_index(labels, key)
+
+        # LIKE uses a regex, so we use regex escape for special characters
+        pattern = re.escape(value)
+        flags = '(?i)(?s)(?m)' if key == 'description' else '(?i)'
+        if partial:
+            return key, LIKE(f'{flags}.*{pattern}.*'), False
+        if self.index_catalog.has_index(labels, key):
+            # every ascii case variant of the value sorts between its upper
+            # and lower cased forms, the index seeks that range and the
+            # regex only checks the nodes found in it
+            low, high = value.translate(_ASCII_UPPER), value.translate(_ASCII_LOWER)
+            return key, AND(GE(low), LE(high), LIKE(f'{flags}{pattern}')), True
+        return key, LIKE(f'{flags}{pattern}'), False
+
+    def _explicit(self, value):
+        predicates = []
+        for operator, operand in value.items():
+            if operator not in OPERATORS:
+                raise Exception(f'Unsupported operator {operator}')
+            predicates.append(OPERATORS[operator](operand))
+        if len(predicates) == 1:
+            return predicates[0]
+        return AND(*predicates)
+
+    @staticmethod
+    def _caseless(value):
+        # values such as uuids or numbers match the same with or
+        # without the case insensitive regex
+        return value.lower() == value.upper()
+
+
+class StartingNodeMatch(NodeMatch):
+    '''
+    NodeMatch starting from a clause binding "_", such as a
+    fulltext index call, instead of a scan of the labels. the
+    label match runs on the nodes found by that clause
+    '''
+
+    def __init__(self, graph, labels=frozenset(), predicates=tuple(), order_by=tuple(),
+                 skip=None, limit=None, start=None):
+        super(StartingNodeMatch, self).__init__(graph, labels, predicates, order_by, skip, limit)
+        # tuple of the cypher clause and its parameters
+        self._start = start
+
+    def _refine(self, match):
+        match._start = self._start
+        return match
+
+    def where(self, *predicates, **properties):
+        return self._refine(super(StartingNodeMatch, self).where(*predicates, **properties))
+
+    def order_by(self, *fields):
+        return self._refine(super(StartingNodeMatch, self).order_by(*fields))
+
+    def skip(self, amount):
+        return self._refine(super(StartingNodeMatch, self).skip(amount))
+
+    def limit(self, amount):
+        return self._refine(super(StartingNodeMatch, self).limit(amount))
+
+    def _query_and_parameters(self, count=False):
+        query, parameters = super(StartingNodeMatch, self)._query_and_parameters(count)
+        if not self._start:
+            return query, parameters
+        clause, start_parameters = self._start
+        parameters = dict(parameters, **start_parameters)
+        return f'{clause} WITH _ {query}', parameters
+
+
+def match_query(labels, start=None, predicates=()):
+    '''
+    CypherQuery matching the nodes as "_" like StartingNodeMatch,
+    the RETURN clause is left to the caller. the predicates are
+    (condition, parameters) tuples
+    '''
+    query = CypherQuery()
+    if start:
+        query.add(f'{start[0]} WITH _').bind(start[1])
+    query.add(f'MATCH (_{format_labels(labels)})')
+    for _, parameters in predicates:
+        query.bind(parameters)
+    return query.where([condition for condition, _ in predicates])
@@ -0,0 +1,166 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+#
+# declarative list of the indexes and uniqueness constraints
+# the queries of the service rely on. the registry compares it
+# with the schema reported by neo4j, creates what is missing
+# and keeps count of the query shapes seen by this worker so
+# the frequent ones without any supporting index stand out
+#
+
+import threading
+
+from logger import LoggerFactory
+
+from neo4j_api.cypher_builder import escape_identifier
+
+# {<property>: [<label>, ...]}
+UNIQUE_CONSTRAINTS = {
+    'global_entity_id': ['File', 'Folder', 'Container', 'Dataset', 'User'],
+    'code': ['Container', 'Dataset'],
+}
+
+INDEXES = {
+    'project_code': ['File', 'Folder'],
+    'name': ['File', 'Folder', 'Container', 'User'],
+    'email': ['User'],
+    'folder_relative_path': ['File', 'Folder'],
+    'display_path': ['File', 'Folder'],
+    'time_created': ['File', 'Folder'],
+    'time_lastmodified': ['File', 'Folder'],
+}
+
+# filters which never need an index
+_ALWAYS_SUPPORTED = {'id'}
+
+
+class SchemaRegistry(object):
+
+    def __init__(self, index_catalog, unique_constraints=None, indexes=None, max_shapes=1000):
+        self._logger = LoggerFactory('api_invitation').get_logger()
+        self.index_catalog = index_catalog
+        self.unique_constraints = UNIQUE_CONSTRAINTS if unique_constraints is None else unique_constraints
+        self.indexes = INDEXES if indexes is None else indexes
+        self.max_shapes = max_shapes
+        self._lock = threading.Lock()
+        # {(<labels>, <keys>): <number-of-queries>}
+        self._shapes = {}
+
+    def definitions(self):
+        result = []
+        for unique, declared in ((True, self.unique_constraints), (False, self.indexes)):
+            for key, labels in declared.items():
+                for label in labels:
+                    name = f'{label}_{key}_unique' if unique else f'{label}_{key}'
+                    result.append({'name': name, 'label': label, 'property': key, 'unique': unique})
+        return result
+
+    def _find(self, indexes, definition):
+        for index in indexes:
+            if index['entity_type'] == 'NODE' and index['labels'] == [definition['label']] \
+                    and index['properties'] == [definition['property']] and index['type'] != 'FULLTEXT':
+                return index
+        return None
+
+    def status(self, refresh=False):
+        '''
+        the declared schema with the state neo4j reports for it:
+        ONLINE, POPULATING, FAILED, MISSING, or NOT_UNIQUE when a
+        plain index is in the way of the uniqueness constraint
+        '''
+        indexes = self.index_catalog.refresh() if refresh else self.index_catalog.indexes()
+        result = []
+        for definition in self.definitions():
+            index = self._find(indexes, definition)
+            if index is None:
+                state = 'MISSING'
+            elif definition['unique'] and not index['unique']:
+                state = 'NOT_UNIQUE'
+            else:
+                state = index['state']
+            result.append(dict(definition, state=state))
+        return result
+
+    def ready(self):
+        return all(x['state'] == 'ONLINE' for x in self.status())
+
+    def ensure(self, sessions, dry_run=False):
+        '''
+        create the missing indexes and constraints. a constraint
+        failing, usually on duplicated values, does not stop the
+        others
+        '''
+        result = {'created': [], 'failed': {}, 'skipped': []}
+        for definition in self.status(refresh=True):
+            if definition['state'] != 'MISSING':
+                if definition['state'] == 'NOT_UNIQUE':
+                    result['skipped'].append(definition['name'])
+                continue
+            name = escape_identifier(definition['name'])
+            node = f'(n:{escape_identifier(definition["label"])})'
+            key = f'n.{escape_identifier(definition["property"])}'
+            if definition['unique']:
+                query = f'CREATE CONSTRAINT {name} IF NOT EXISTS ON {node} ASSERT {key} IS UNIQUE'
+            else:
+                query = f'CREATE INDEX {name} IF NOT EXISTS FOR {node} ON ({key})'
+            if dry_run:
+                result['created'].append(definition['name'])
+                continue
+            try:
+                sessions.run(query)
+                result['created'].append(definition['name'])
+            except Exception as e:
+                self._logger.error(f'Error creating {definition["name"]}: {e}')
+                result['failed'][definition['name']] = str(e)
+        if result['created'] and not dry_run:
+            self.index_catalog.refresh()
+        return result
+
+    def record(self, labels, keys):
+        '''
+        count a query filtering the labels on the keys
+        '''
+        if not keys:
+            return
+        if isinstance(labels, str):
+            labels = [labels]
+        shape = (tuple(sorted(labels or [])), tuple(sorted(set(keys))))
+        with self._lock:
+            if shape in self._shapes or len(self._shapes) < self.max_shapes:
+                self._shapes[shape] = self._shapes.get(shape, 0) + 1
+
+    def unsupported_shapes(self, limit=20):
+        '''
+        the most frequent query shapes none of whose keys has an
+        online index on one of the labels
+        '''
+        with self._lock:
+            shapes = sorted(self._shapes.items(), key=lambda x: -x[1])
+        result = []
+        for (labels, keys), count in shapes:
+            if _ALWAYS_SUPPORTED & set(keys):
+                continue
+            if any(self.index_catalog.has_index(list(labels), key) for key in keys):
+                continue
+            result.append({'labels': list(labels), 'keys': list(keys), 'count': count})
+            if len(result) >= limit:
+                break
+        return result
@@ -0,0 +1,96 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+#
+# case insensitive filters used TOLOWER(n.name) or a (?i)
+# regex, neither of them can use an index. when enabled, a
+# lower cased copy of the configured properties is written
+# next to the original one (name -> name__lc) so the filters
+# can be rewritten to plain, indexable comparisons
+#
+
+from neo4j_api.cypher_builder import escape_identifier
+from utils import SHADOW_SUFFIX
+
+
+class ShadowProperties(object):
+
+    def __init__(self, keys, enabled=False):
+        self.keys = set(keys)
+        self.enabled = enabled
+
+    @staticmethod
+    def shadow_key(key):
+        return key + SHADOW_SUFFIX
+
+    def covers(self, key):
+        return self.enabled and key in self.keys
+
+    def apply(self, properties):
+        '''
+        add the shadow properties to the dict of node properties,
+        the dict is updated in place and returned. a source set to
+        something else than a string gets a null shadow so that an
+        update removes the stale lower cased copy, a shadow left
+        without its source (py2neo drops the keys set to None) is
+        removed as well
+        '''
+        if not self.enabled:
+            return properties
+        for key in self.keys:
+            shadow_key = self.shadow_key(key)
+            value = properties.get(key)
+            if isinstance(value, str):
+                properties[shadow_key] = value.lower()
+            elif key in properties:
+                properties[shadow_key] = None
+            else:
+                properties.pop(shadow_key, None)
+        return properties
+
+    def create_indexes(self, sessions, labels):
+        for label in labels:
+            for key in sorted(self.keys):
+                shadow_key = self.shadow_key(key)
+                sessions.run(
+                    f'CREATE INDEX {escape_identifier(label + "_" + shadow_key)} IF NOT EXISTS '
+                    f'FOR (n:{escape_identifier(label)}) ON (n.{escape_identifier(shadow_key)})')
+
+    def backfill(self, sessions, label=None, batch_size=10000):
+        '''
+        write the missing or outdated shadow properties in batches,
+        return the number of updated nodes per key
+        '''
+        match = f'MATCH (n:{escape_identifier(label)})' if label else 'MATCH (n)'
+        updated = {}
+        for name in sorted(self.keys):
+            key = escape_identifier(name)
+            shadow_key = escape_identifier(self.shadow_key(name))
+            # STARTS WITH '' skips the non string values
+            query = f'{match} WHERE n.{key} STARTS WITH "" ' \
+                    f'AND (n.{shadow_key} IS NULL OR n.{shadow_key} <> toLower(n.{key})) ' \
+                    f'WITH n LIMIT $batch_size SET n.{shadow_key} = toLower(n.{key}) RETURN count(n)'
+            updated[name] = 0
+            while True:
+                count = sessions.run(query, batch_size=batch_size)[0][0]
+                updated[name] += count
+                if count < batch_size:
+                    break
+        return updated
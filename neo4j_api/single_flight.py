@@ -0,0 +1,120 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+#
+# request coalescing. the requests of a worker running the
+# same query at the same time share a single execution: the
+# first one runs it and the others wait for its result. the
+# key is the query shape with its normalised parameters, the
+# ignored keys are dropped from the parameters at any depth.
+# with write epochs, a request made after a write of this
+# worker does not join a query started before it
+#
+
+import threading
+
+from neo4j_api.cache import cache_key
+
+
+class _Call(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+def drop_keys(value, ignored_keys):
+    if isinstance(value, dict):
+        return {k: drop_keys(v, ignored_keys) for k, v in value.items() if k not in ignored_keys}
+    if isinstance(value, list):
+        return [drop_keys(x, ignored_keys) for x in value]
+    return value
+
+
+class SingleFlight(object):
+
+    def __init__(self, epochs=None, enabled=True, ignored_keys=(), normalizers=None):
+        self.epochs = epochs
+        self.enabled = enabled
+        self.ignored_keys = set(ignored_keys)
+        # {<shape>: function(params) returning the params to key on}
+        self.normalizers = dict(normalizers or {})
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def key(self, shape, params, labels=None):
+        if shape in self.normalizers:
+            params = self.normalizers[shape](params)
+        key = cache_key(shape, drop_keys(params, self.ignored_keys))
+        if self.epochs is not None:
+            key += self.epochs.stamp(labels)
+        return key
+
+    def do(self, shape, params, work, labels=None):
+        '''
+        return work(), shared with the identical calls in flight.
+        labels are the ones read by work, None for any
+        '''
+        if not self.enabled:
+            return work()
+        key = self.key(shape, params, labels)
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = work()
+            return call.result
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+                'errors': self.errors,
+                'in_flight': len(self._calls),
+            }
@@ -0,0 +1,144 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+#
+# summaries of the property values read in one pass with a
+# bounded memory: a hyperloglog estimates the number of
+# distinct values and a misra-gries summary keeps the most
+# frequent ones. the values of a list property are counted
+# one by one, as the tag pickers list the tags
+#
+
+import hashlib
+import json
+import math
+
+from utils import SHADOW_SUFFIX
+
+APPROXIMATE_MODE = 'approximate'
+MAX_TOP_K = 100
+
+# not summarised, every node has its own
+EXCLUDED_KEYS = ('time_created', 'time_lastmodified')
+
+
+def value_hash(value):
+    encoded = json.dumps(value, sort_keys=True, default=str).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(encoded, digest_size=8).digest(), 'big')
+
+
+class HyperLogLog(object):
+    '''
+    distinct count estimate with 2 ** precision registers, the
+    standard error is about 1.04 / sqrt(2 ** precision)
+    '''
+
+    def __init__(self, precision=12):
+        if not 4 <= precision <= 16:
+            raise Exception('Invalid precision')
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value):
+        hashed = value_hash(value)
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -x for x in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # linear counting is closer for the small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class TopValues(object):
+    '''
+    misra-gries summary keeping at most capacity counters, the
+    counts are lower bounds of the real ones
+    '''
+
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self.counters = {}
+        self.dropped = False
+
+    def add(self, value):
+        key = json.dumps(value, sort_keys=True, default=str)
+        if key in self.counters:
+            self.counters[key] += 1
+        elif len(self.counters) < self.capacity:
+            self.counters[key] = 1
+        else:
+            self.dropped = True
+            for other in list(self.counters):
+                self.counters[other] -= 1
+                if not self.counters[other]:
+                    del self.counters[other]
+
+    def top(self, k):
+        ranked = sorted(self.counters.items(), key=lambda x: (-x[1], x[0]))[:k]
+        return [{'value': json.loads(key), 'count': count} for key, count in ranked]
+
+
+class PropertySketch(object):
+
+    def __init__(self, top_k=10, precision=12):
+        self.top_k = top_k
+        self.distinct = HyperLogLog(precision)
+        # a few times k counters keep the top k values accurate
+        self.values = TopValues(capacity=max(10 * top_k, 100))
+
+    def add(self, value):
+        for item in (value if isinstance(value, list) else [value]):
+            self.distinct.add(item)
+            self.values.add(item)
+
+    def summary(self):
+        cardinality = self.distinct.estimate()
+        top = self.values.top(self.top_k)
+        return {
+            'cardinality': max(cardinality, len(top)),
+            'top': top,
+            # the top values are not all the values
+            'truncated': self.values.dropped or len(self.values.counters) > len(top),
+        }
+
+
+def sketch_properties(nodes, top_k=10, precision=12):
+    '''
+    summarise the properties of the streamed node properties
+    as {key: {"cardinality", "top", "truncated"}}
+    '''
+    sketches = {}
+    for properties in nodes:
+        for key, value in properties.items():
+            if value is None or key in EXCLUDED_KEYS or key.endswith(SHADOW_SUFFIX):
+                continue
+            if key not in sketches:
+                sketches[key] = PropertySketch(top_k, precision)
+            sketches[key].add(value)
+    return {key: sketch.summary() for key, sketch in sketches.items()}
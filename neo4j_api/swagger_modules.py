@@ -105,6 +105,8 @@ node_query_module = module_api.model('node_query_module', {
 node_query_module_count = module_api.model('node_query_module_count', {
     "count": fields.Boolean(readOnly=True, description='number of records'),
     "partial": fields.Boolean(readOnly=True, description='whether enable partial search'),
+    "search_mode": fields.String(readOnly=True, description="(optional) 'fulltext' to run the partial search "
+                                                            "on a fulltext index"),
     "name (optional)": fields.String(readOnly=True, description="The characters that account 'name' contains for filtering"),
     "email (optional)": fields.String(readOnly=True, description="The characters that account 'email' contains for filtering"),
 })
@@ -167,11 +169,22 @@ node_query_module_v2 = module_api.model('node_query', {
      "page": fields.Integer(),
      "page_size": fields.Integer(),
      "partial": fields.Boolean(),
+     "search_mode": fields.String(example="fulltext"),
+     "cursor": fields.String(description="next_cursor of the previous page, used instead of page"),
+     "total": fields.String(example="exact", description="exact, estimate or none to skip the count"),
      "order_by": fields.String(example="name"),
      "order_type": fields.String(example="desc"),
      "query": fields.Nested(node_query)
 })
 
+node_facet_module = module_api.model('node_facets', {
+     "partial": fields.Boolean(),
+     "search_mode": fields.String(example="fulltext"),
+     "query": fields.Nested(node_query),
+     "facets": fields.List(fields.String, example=["uploader", "tags", "archived", "labels"]),
+     "facet_limit": fields.Integer(example=20, description="number of values returned per facet"),
+})
+
 trashfile_module = module_api.model('file_trash', {
      "trash_full_path": fields.String(description="full_path to trash file"),
      "full_path": fields.String(description="full_path to file"),
@@ -183,4 +196,15 @@ node_batch_update = module_api.model('',{
 )
 })
 
+node_batch_patch = module_api.model('node_batch_patch', {
+    'data': fields.List(fields.Raw, example=[{'global_entity_id': "6785869f-b017-4ed3-b602-a4ce7e8dcda2-1621605134",
+                                              'archived': True, 'tags': ["test_bulk123"]}]),
+    'key': fields.String(example="global_entity_id", description="property matching the nodes of the rows"),
+    'label': fields.String(example="File", description="label of the nodes, uses its index"),
+    'counts_only': fields.Boolean(example=False),
+    'update_modified_time': fields.Boolean(example=True),
+    'batch_size': fields.Integer(example=1000),
+    'parallelism': fields.Integer(example=4),
+})
+
 #######################################################################
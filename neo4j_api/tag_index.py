@@ -0,0 +1,115 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+#
+# a tag filter checks the tags list of every node of the label.
+# when enabled, each tag is also kept as a (:Tag {name}) node
+# linked from the tagged nodes, so the tag filters can start
+# from the few nodes carrying the tag instead. the links are
+# rebuilt from the tags and system_tags properties by every
+# write path touching them
+#
+
+from neo4j_api.cypher_builder import escape_identifier
+from neo4j_api.ingest import chunks
+
+TAG_LABEL = 'Tag'
+
+# the tag properties and the relationship linking their tags
+TAG_RELATIONSHIPS = {
+    'tags': 'HAS_TAG',
+    'system_tags': 'HAS_SYSTEM_TAG',
+}
+
+# relink the tags of the nodes bound to n
+_SYNC = '''
+WITH DISTINCT n
+OPTIONAL MATCH (n)-[old:HAS_TAG|HAS_SYSTEM_TAG]->(:Tag)
+DELETE old
+WITH DISTINCT n
+FOREACH (name IN coalesce(n.tags, []) | MERGE (t:Tag {name: name}) MERGE (n)-[:HAS_TAG]->(t))
+FOREACH (name IN coalesce(n.system_tags, []) | MERGE (t:Tag {name: name}) MERGE (n)-[:HAS_SYSTEM_TAG]->(t))
+'''
+
+
+class TagIndex(object):
+
+    def __init__(self, sessions, enabled=False):
+        self._sessions = sessions
+        self.enabled = enabled
+
+    def covers(self, key):
+        return self.enabled and key in TAG_RELATIONSHIPS
+
+    def touches(self, properties):
+        '''
+        whether a write of these properties changes the tags
+        '''
+        return self.enabled and any(key in TAG_RELATIONSHIPS for key in properties)
+
+    @staticmethod
+    def match_clause(variable, key, placeholders):
+        '''
+        MATCH binding the variable to the nodes carrying all the tags
+        '''
+        relationship = TAG_RELATIONSHIPS[key]
+        patterns = [f'({variable})-[:{relationship}]->(:{TAG_LABEL} {{name: {x}}})' for x in placeholders]
+        return 'MATCH ' + ', '.join(patterns)
+
+    def excluded_relationships(self):
+        '''
+        relationship types hidden from the queries on any type
+        '''
+        return list(TAG_RELATIONSHIPS.values()) if self.enabled else []
+
+    def sync(self, node_ids):
+        if not self.enabled or not node_ids:
+            return
+        self._sessions.run('UNWIND $ids AS node_id MATCH (n) WHERE id(n) = node_id' + _SYNC, ids=list(node_ids))
+
+    def sync_matching(self, label, keys, rows):
+        '''
+        relink the nodes of the label whose keys match one of the rows
+        '''
+        if not self.enabled or not rows:
+            return
+        node = f'(n:{escape_identifier(label)})' if label else '(n)'
+        conditions = ' AND '.join(f'n.{escape_identifier(x)} = row.{escape_identifier(x)}' for x in keys)
+        self._sessions.run(
+            f'UNWIND $rows AS row MATCH {node} WHERE {conditions}' + _SYNC,
+            rows=[{x: row.get(x) for x in keys} for row in rows],
+        )
+
+    def create_indexes(self, sessions):
+        sessions.run(f'CREATE CONSTRAINT tag_name IF NOT EXISTS ON (t:{TAG_LABEL}) ASSERT t.name IS UNIQUE')
+
+    def rebuild(self, sessions, batch_size=10000):
+        '''
+        relink the tags of every tagged node in batches of the one
+        pass over the nodes, return the number of nodes processed
+        '''
+        query = f'MATCH (n) WHERE NOT n:{TAG_LABEL} AND (n.tags IS NOT NULL OR n.system_tags IS NOT NULL) ' \
+                'RETURN id(n) AS id'
+        total = 0
+        for _, records in chunks(sessions.stream(query), batch_size):
+            ids = [x['id'] for x in records]
+            sessions.run('UNWIND $ids AS node_id MATCH (n) WHERE id(n) = node_id' + _SYNC, ids=ids)
+            total += len(ids)
+        return total
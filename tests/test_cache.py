@@ -0,0 +1,164 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import pytest
+
+from neo4j_api.cache import RELATIONSHIPS
+from neo4j_api.cache import CountCache
+from neo4j_api.cache import GeidCache
+from neo4j_api.cache import TTLCache
+from neo4j_api.cache import WriteEpochs
+
+
+@pytest.fixture
+def epochs():
+    yield WriteEpochs()
+
+
+class TestTTLCache:
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.stats()['evictions'] == 1
+
+    def test_entries_expire(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+        with patch('neo4j_api.cache.time.monotonic', return_value=100):
+            cache.set('a', 1)
+        with patch('neo4j_api.cache.time.monotonic', return_value=111):
+            assert cache.get('a') is None
+
+        assert cache.stats()['expired'] == 1
+
+
+class TestWriteEpochs:
+    def test_stamp_changes_with_the_written_labels(self, epochs):
+        stamp = epochs.stamp(['File', RELATIONSHIPS])
+
+        epochs.bump('User')
+        assert epochs.stamp(['File', RELATIONSHIPS]) == stamp
+
+        epochs.bump('Greenroom:File')
+        assert epochs.stamp(['File', RELATIONSHIPS]) != stamp
+
+    def test_unknown_labels_change_every_stamp(self, epochs):
+        stamp = epochs.stamp('File')
+
+        epochs.bump()
+
+        assert epochs.stamp('File') != stamp
+
+    def test_no_labels_depends_on_every_write(self, epochs):
+        stamp = epochs.stamp(None)
+
+        epochs.bump('User')
+
+        assert epochs.stamp(None) != stamp
+
+
+class TestCountCache:
+    def test_repeated_count_is_served_from_the_cache(self, epochs):
+        cache = CountCache(epochs)
+        count = MagicMock(return_value=3)
+
+        assert cache.get_or_count('nodes', 'File', {'a': 1, 'b': 2}, count) == 3
+        assert cache.get_or_count('nodes', 'File', {'b': 2, 'a': 1}, count) == 3
+        count.assert_called_once()
+
+    def test_write_invalidates_the_count(self, epochs):
+        cache = CountCache(epochs)
+        count = MagicMock(side_effect=[3, 4])
+
+        cache.get_or_count('nodes', 'File', {}, count)
+        epochs.bump('File')
+
+        assert cache.get_or_count('nodes', 'File', {}, count) == 4
+        assert cache.stats()['stale'] == 1
+        assert cache.stats()['hits'] == 0
+
+    def test_disabled_cache_always_counts(self, epochs):
+        cache = CountCache(epochs, enabled=False)
+        count = MagicMock(return_value=3)
+
+        cache.get_or_count('nodes', 'File', {}, count)
+        cache.get_or_count('nodes', 'File', {}, count)
+
+        assert count.call_count == 2
+
+
+def load_nodes(geids):
+    return [{'global_entity_id': x, 'name': x, 'tags': [x]} for x in geids if x != 'unknown']
+
+
+class TestGeidCache:
+    def test_only_the_missing_nodes_are_loaded(self):
+        cache = GeidCache()
+        load = MagicMock(side_effect=load_nodes)
+
+        cache.get_many(['a', 'b'], load)
+        nodes = cache.get_many(['b', 'c', 'unknown'], load)
+
+        assert [x['global_entity_id'] for x in nodes] == ['b', 'c']
+        assert load.call_args_list[1][0][0] == ['c', 'unknown']
+
+    def test_invalidated_node_is_loaded_again(self):
+        cache = GeidCache()
+        load = MagicMock(side_effect=load_nodes)
+
+        cache.get('a', load)
+        cache.invalidate(['a'])
+        cache.get('a', load)
+
+        assert load.call_count == 2
+        assert cache.stats()['invalidations'] == 1
+
+    def test_load_overlapping_an_invalidation_is_not_cached(self):
+        cache = GeidCache()
+
+        def load(geids):
+            cache.invalidate(geids)
+            return load_nodes(geids)
+
+        cache.get('a', load)
+
+        assert cache.stats()['size'] == 0
+
+    def test_returned_nodes_are_copies(self):
+        cache = GeidCache()
+
+        cache.get('a', load_nodes)['name'] = 'changed'
+
+        assert cache.get('a', load_nodes)['name'] == 'a'
+
+    def test_nested_values_are_not_shared(self):
+        cache = GeidCache()
+
+        cache.get('a', load_nodes)['tags'].append('changed')
+        cache.get('a', load_nodes)['tags'].append('changed')
+
+        assert cache.get('a', load_nodes)['tags'] == ['a']
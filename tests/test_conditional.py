@@ -0,0 +1,63 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+import pytest
+from flask import Flask
+
+from neo4j_api.conditional import body_etag
+from neo4j_api.conditional import last_modified
+from neo4j_api.conditional import validated
+
+NODE = {'id': 5, 'labels': ['File', 'Greenroom'], 'name': 'a', 'time_lastmodified': '2021-06-01T13:13:09'}
+
+
+@pytest.fixture
+def app():
+    yield Flask(__name__)
+
+
+class TestConditional:
+    def test_etag_changes_with_any_property(self):
+        # a write not updating time_lastmodified still changes the etag
+        assert body_etag([NODE]) != body_etag([dict(NODE, tags=['a'])])
+        assert body_etag([NODE]) == body_etag([dict(reversed(list(NODE.items())))])
+        assert not body_etag([NODE]).startswith('W/')
+
+    def test_etag_changes_with_the_extra_parts(self):
+        assert body_etag([NODE]) != body_etag([NODE], {'X-Next-Cursor': 'abc'})
+
+    def test_last_modified_is_the_newest(self):
+        nodes = [NODE, dict(NODE, time_lastmodified='2021-06-02T00:00:00'), {'id': 7}]
+
+        assert last_modified(nodes) == 'Wed, 02 Jun 2021 00:00:00 GMT'
+        assert last_modified([{'id': 7}]) is None
+
+    def test_matching_etag_is_not_modified(self, app):
+        etag = body_etag([NODE])
+        with app.test_request_context(headers={'If-None-Match': etag}):
+            assert validated([NODE], etag)[:2] == (None, 304)
+        with app.test_request_context(headers={'If-None-Match': 'W/"other"'}):
+            assert validated([NODE], etag)[:2] == ([NODE], 200)
+
+    def test_if_modified_since(self, app):
+        modified = last_modified([NODE])
+        with app.test_request_context(headers={'If-Modified-Since': 'Tue, 01 Jun 2021 13:13:09 GMT'}):
+            assert validated([NODE], body_etag([NODE]), modified)[1] == 304
+        with app.test_request_context(headers={'If-Modified-Since': 'Tue, 01 Jun 2021 13:13:08 GMT'}):
+            assert validated([NODE], body_etag([NODE]), modified)[1] == 200
@@ -0,0 +1,70 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+from unittest.mock import MagicMock
+
+import pytest
+
+from neo4j_api.count_planner import COUNT_INDEX
+from neo4j_api.count_planner import COUNT_MATCH
+from neo4j_api.count_planner import COUNT_STORE
+from neo4j_api.count_planner import CountPlanner
+
+
+@pytest.fixture
+def index_catalog():
+    index_catalog = MagicMock()
+    index_catalog.has_index.side_effect = lambda labels, key: key == 'project_code'
+    yield index_catalog
+
+
+@pytest.fixture
+def sessions():
+    sessions = MagicMock()
+    sessions.run.return_value = [[42]]
+    yield sessions
+
+
+class TestCountPlanner:
+    def test_single_label_is_read_from_the_count_store(self, index_catalog, sessions):
+        planner = CountPlanner(index_catalog, sessions)
+
+        assert planner.count('File', {}) == (42, COUNT_STORE)
+        sessions.run.assert_called_once_with('MATCH (n:File) RETURN count(n) AS count')
+
+    def test_several_labels_need_a_match(self, index_catalog, sessions):
+        path, (query, params) = CountPlanner(index_catalog, sessions).plan('Greenroom:File', {})
+
+        assert path == COUNT_MATCH
+        assert query == 'MATCH (n:Greenroom:File) RETURN count(n) AS count'
+
+    def test_indexed_equality_is_an_index_count(self, index_catalog, sessions):
+        path, (query, params) = CountPlanner(index_catalog, sessions).plan(
+            'File', {'project_code': 'test', 'archived': False})
+
+        assert path == COUNT_INDEX
+        assert query == 'MATCH (n:File) WHERE n.project_code = $project_code AND n.archived = $archived ' \
+                        'RETURN count(n) AS count'
+        assert params == {'project_code': 'test', 'archived': False}
+
+    def test_unindexed_equality_is_a_match(self, index_catalog, sessions):
+        path, (query, params) = CountPlanner(index_catalog, sessions).plan('File', {'name': 'a"b'})
+
+        assert path == COUNT_MATCH
+        assert params == {'name': 'a"b'}
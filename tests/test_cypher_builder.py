@@ -0,0 +1,77 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+import neo4j.time
+import neotime
+import pytest
+
+from neo4j_api.cypher_builder import CypherQuery
+from neo4j_api.cypher_builder import escape_identifier
+from neo4j_api.cypher_builder import format_labels
+from neo4j_api.cypher_builder import format_order_type
+
+
+class TestCypherBuilder:
+    def test_escape_identifier_keeps_simple_names(self):
+        assert escape_identifier('project_code') == 'project_code'
+
+    def test_escape_identifier_quotes_other_names(self):
+        assert escape_identifier('a b`c') == '`a b``c`'
+
+    def test_format_labels_splits_combined_labels(self):
+        assert format_labels('Greenroom:File') == ':Greenroom:File'
+        assert format_labels(['User', None]) == ':User'
+        assert format_labels(None) == ''
+        assert format_labels(['admin', 'contributor'], separator='|') == ':admin|contributor'
+
+    def test_format_order_type_rejects_unknown_values(self):
+        assert format_order_type('desc') == ' DESC'
+        with pytest.raises(Exception):
+            format_order_type('desc; MATCH (n) DETACH DELETE n')
+
+    def test_query_text_does_not_depend_on_values(self):
+        def build(name, skip):
+            query = CypherQuery()
+            query.add('MATCH (n:User)')
+            query.where([f'n.name = {query.param("name", name)}'])
+            query.add('RETURN n')
+            query.page(skip=skip, limit=10)
+            return query.build()
+
+        first_query, first_params = build('alice', 10)
+        second_query, second_params = build("bob' OR 1=1 //", 20)
+
+        assert first_query == second_query
+        assert first_params == {'name': 'alice', 'skip': 10, 'limit': 10}
+        assert second_params['name'] == "bob' OR 1=1 //"
+
+    def test_param_names_are_unique(self):
+        query = CypherQuery()
+
+        assert query.param('tag', 'a') == '$tag'
+        assert query.param('tag', 'b') == '$tag_1'
+        assert query.param('tag name', 'c') == '$tag_name'
+
+    def test_bound_values_are_driver_values(self):
+        query = CypherQuery().add('MATCH (n) WHERE n.time_created > $`1`')
+
+        query.bind({'1': neotime.DateTime(2021, 1, 8, 17, 4, 4)})
+
+        assert query.build()[1] == {'1': neo4j.time.DateTime(2021, 1, 8, 17, 4, 4)}
@@ -0,0 +1,49 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+import pytest
+
+from neo4j_api.facets import MAX_FACET_LIMIT
+from neo4j_api.facets import facet_query
+from neo4j_api.facets import facet_result
+
+
+class TestFacets:
+    def test_aggregation_replaces_the_return(self):
+        query, params = facet_query('MATCH (_:File) WHERE _.archived = $`1` RETURN _', ['uploader', 'uploader', 'tags'])
+
+        assert query.startswith('MATCH (_:File) WHERE _.archived = $`1`\nWITH _ UNWIND $facets AS facet')
+        assert 'RETURN _' not in query
+        assert params['facets'] == ['uploader', 'tags']
+        assert params['list_facets'] == ['tags', 'system_tags']
+
+    def test_limit_is_bounded(self):
+        assert facet_query('MATCH (_) RETURN _', ['name'], limit=10 ** 6)[1]['facet_limit'] == MAX_FACET_LIMIT
+        assert facet_query('MATCH (_) RETURN _', ['name'], limit=0)[1]['facet_limit'] == 1
+
+    def test_facets_are_required(self):
+        with pytest.raises(Exception):
+            facet_query('MATCH (_) RETURN _', 'uploader')
+
+    def test_result_lists_every_facet(self):
+        records = [{'facet': 'uploader', 'values': [{'value': 'admin', 'count': 3}]}]
+
+        result = facet_result(records, ['uploader', 'tags'])
+
+        assert result == {'uploader': [{'value': 'admin', 'count': 3}], 'tags': []}
@@ -0,0 +1,69 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+from unittest.mock import MagicMock
+
+import pytest
+
+from neo4j_api.fulltext import FulltextIndexes
+from neo4j_api.fulltext import lucene_term
+from neo4j_api.query_planner import SchemaIndexCatalog
+
+
+@pytest.fixture
+def fulltext_indexes():
+    sessions = MagicMock()
+    sessions.run.return_value = [
+        {
+            'name': 'file_search',
+            'state': 'ONLINE',
+            'type': 'FULLTEXT',
+            'entityType': 'NODE',
+            'labelsOrTypes': ['File', 'Folder'],
+            'properties': ['name', 'description'],
+        },
+    ]
+    definitions = {
+        'file_search': {'labels': ['File', 'Folder'], 'properties': ['name', 'description']},
+        'user_search': {'labels': ['User'], 'properties': ['name', 'email']},
+    }
+    yield FulltextIndexes(SchemaIndexCatalog(sessions), definitions)
+
+
+class TestLuceneTerm:
+    def test_words_are_wildcarded_and_lower_cased(self):
+        assert lucene_term('Foo  bar') == '*foo* AND *bar*'
+
+    def test_special_characters_are_escaped(self):
+        assert lucene_term('a:b(1)') == r'*a\:b\(1\)*'
+
+
+class TestFulltextIndexes:
+    def test_plan_splits_the_covered_keys(self, fulltext_indexes):
+        name, search, covered = fulltext_indexes.plan(['File'], {'name': 'Foo', 'uploader': 'admin', 'archived': False})
+
+        assert name == 'file_search'
+        assert search == 'name:(*foo*)'
+        assert covered == ['name']
+
+    def test_plan_ignores_indexes_not_online(self, fulltext_indexes):
+        assert fulltext_indexes.plan(['User'], {'name': 'foo'}) is None
+
+    def test_plan_without_covered_key(self, fulltext_indexes):
+        assert fulltext_indexes.plan(['File'], {'uploader': 'admin'}) is None
@@ -0,0 +1,119 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+import threading
+
+import pytest
+
+from neo4j_api.group_commit import GroupCommit
+
+
+def submit_concurrently(group_commit, key, items, write):
+    results = {}
+
+    def submit(item):
+        try:
+            results[item] = group_commit.submit(key, item, write)
+        except Exception as e:
+            results[item] = e
+
+    threads = [threading.Thread(target=submit, args=(item,)) for item in items]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestGroupCommit:
+    def test_concurrent_items_share_one_write(self):
+        group_commit = GroupCommit(max_wait=1, max_batch=5, enabled=True)
+        writes = []
+
+        def write(key, items):
+            writes.append(list(items))
+            return [item * 10 for item in items]
+
+        results = submit_concurrently(group_commit, 'File', range(5), write)
+
+        assert results == {i: i * 10 for i in range(5)}
+        assert len(writes) == 1
+        assert group_commit.stats()['items'] == 5
+
+    def test_batches_are_bounded(self):
+        group_commit = GroupCommit(max_wait=0.05, max_batch=2, enabled=True)
+        writes = []
+
+        def write(key, items):
+            writes.append(len(items))
+            return list(items)
+
+        results = submit_concurrently(group_commit, 'File', range(5), write)
+
+        assert results == {i: i for i in range(5)}
+        assert max(writes) <= 2
+        assert sum(writes) == 5
+
+    def test_keys_are_written_apart(self):
+        group_commit = GroupCommit(max_wait=0.05, max_batch=10, enabled=True)
+        writes = []
+
+        def write(key, items):
+            writes.append((key, list(items)))
+            return list(items)
+
+        threads = [threading.Thread(target=group_commit.submit, args=(key, 1, write)) for key in ('File', 'Folder')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(x[0] for x in writes) == ['File', 'Folder']
+
+    def test_failed_batch_is_written_item_by_item(self):
+        group_commit = GroupCommit(max_wait=1, max_batch=3, enabled=True)
+
+        def write(key, items):
+            if 1 in items:
+                raise Exception('invalid item')
+            return list(items)
+
+        results = submit_concurrently(group_commit, 'File', range(3), write)
+
+        assert results[0] == 0 and results[2] == 2
+        assert str(results[1]) == 'invalid item'
+        assert group_commit.stats()['retried'] == 1
+
+    def test_exception_result_is_raised_to_its_caller(self):
+        group_commit = GroupCommit(max_wait=0, enabled=True)
+
+        with pytest.raises(Exception, match='not found'):
+            group_commit.submit('File', 1, lambda key, items: [Exception('not found')])
+
+    def test_disabled_writes_alone(self):
+        group_commit = GroupCommit()
+        writes = []
+
+        def write(key, items):
+            writes.append(list(items))
+            return list(items)
+
+        assert group_commit.submit('File', 1, write) == 1
+        assert writes == [[1]]
+        assert group_commit.stats()['batches'] == 0
@@ -0,0 +1,229 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+import io
+import threading
+import time
+
+import pytest
+
+from neo4j_api.ingest import CHUNK_FAILED
+from neo4j_api.ingest import CHUNK_SUCCESS
+from neo4j_api.ingest import NODE_RECORD
+from neo4j_api.ingest import RELATIONSHIP_RECORD
+from neo4j_api.ingest import IngestJob
+from neo4j_api.ingest import batch_options
+from neo4j_api.ingest import chunks
+from neo4j_api.ingest import ingest_summary
+from neo4j_api.ingest import pipeline
+from neo4j_api.ingest import read_ndjson
+from neo4j_api.ingest import record_batches
+from neo4j_api.ingest import record_shape
+from neo4j_api.ingest import relation_rows
+from neo4j_api.ingest import run_chunks
+
+
+class TestIngest:
+    def test_chunks_keep_the_offsets(self):
+        assert list(chunks(iter(range(5)), 2)) == [(0, [0, 1]), (2, [2, 3]), (4, [4])]
+
+    def test_failed_chunk_does_not_stop_the_others(self):
+        written = []
+
+        def write(rows):
+            if 3 in rows:
+                raise Exception('boom')
+            written.extend(rows)
+
+        statuses = run_chunks(range(7), write, batch_size=2, parallelism=2)
+
+        assert [x['status'] for x in statuses] == [CHUNK_SUCCESS, CHUNK_FAILED, CHUNK_SUCCESS, CHUNK_SUCCESS]
+        assert statuses[1] == {'chunk': 1, 'offset': 2, 'size': 2, 'status': CHUNK_FAILED, 'error': 'boom'}
+        assert sorted(written) == [0, 1, 4, 5, 6]
+
+    def test_parallel_writes_are_bounded(self):
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def write(rows):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.001)
+            with lock:
+                running[0] -= 1
+
+        run_chunks(range(100), write, batch_size=1, parallelism=3)
+
+        assert running[1] <= 3
+
+    def test_rows_are_read_lazily(self):
+        read = []
+
+        def rows():
+            for i in range(10):
+                read.append(i)
+                yield i
+
+        def write(chunk):
+            # the rows are read one chunk ahead of the writes at most
+            assert len(read) <= chunk[-1] + 1 + 2 * 2
+
+        run_chunks(rows(), write, batch_size=2, parallelism=2)
+
+    def test_summary(self):
+        assert ingest_summary([{'status': CHUNK_SUCCESS}]) == ('success', 200)
+        assert ingest_summary([{'status': CHUNK_SUCCESS}, {'status': CHUNK_FAILED}]) == ('partial', 207)
+        assert ingest_summary([{'status': CHUNK_FAILED}]) == ('failed', 500)
+
+    def test_batch_options(self):
+        assert batch_options({}, 1000, 4, 4) == (1000, 4)
+        assert batch_options({'batch_size': '10', 'parallelism': 16}, 1000, 4, 4) == (10, 4)
+        for options in ({'parallelism': 0}, {'parallelism': -1}, {'batch_size': 'a'}, {'batch_size': True}):
+            with pytest.raises(ValueError):
+                batch_options(options, 1000, 4, 4)
+
+    def test_invalid_batch_size(self):
+        with pytest.raises(Exception):
+            run_chunks([1], lambda rows: None, batch_size=0)
+
+
+class TestRelationRows:
+    def test_ends_outside_params_location_use_the_ids(self):
+        payload = [{'start_id': 1, 'end_params': {'code': 'a'}}, {'start_id': 2, 'end_params': {'code': 'b'}}]
+
+        start_keys, end_keys, rows = relation_rows(payload, ['end'])
+
+        assert (start_keys, end_keys) == (None, ('code',))
+        assert rows == [{'index': 0, 'start': 1, 'end': {'code': 'a'}, 'properties': {}},
+                        {'index': 1, 'start': 2, 'end': {'code': 'b'}, 'properties': {}}]
+
+    def test_both_ends_by_params(self):
+        payload = [{'start_params': {'name': 'u'}, 'end_params': {'code': 'a'}, 'properties': {'role': 'admin'}}]
+
+        start_keys, end_keys, rows = relation_rows(payload, ['start', 'end'])
+
+        assert (start_keys, end_keys) == (('name',), ('code',))
+        assert rows[0]['properties'] == {'role': 'admin'}
+
+    def test_items_share_the_keys(self):
+        payload = [{'start_id': 1, 'end_params': {'code': 'a'}}, {'start_id': 2, 'end_params': {'name': 'b'}}]
+
+        with pytest.raises(Exception):
+            relation_rows(payload, ['end'])
+
+    def test_missing_end(self):
+        with pytest.raises(Exception):
+            relation_rows([{'end_params': {'code': 'a'}}], ['end'])
+
+    def test_empty_payload(self):
+        assert relation_rows([], ['end']) == (None, None, [])
+
+
+class TestNdjson:
+    def test_lines_are_parsed_one_at_a_time(self):
+        stream = io.BytesIO(b'{"type": "node"}\n\n[1]\nnot json\n{"a": 1}')
+
+        records = list(read_ndjson(stream))
+
+        assert [x[0] for x in records] == [0, 2, 3, 4]
+        assert records[0][1] == {'type': 'node'}
+        assert isinstance(records[1][1], ValueError)
+        assert isinstance(records[2][1], ValueError)
+        assert records[3][1] == {'a': 1}
+
+    def test_node_shape(self):
+        record = {'type': 'node', 'labels': ['File', 'Greenroom'], 'properties': {'name': 'a'}}
+
+        assert record_shape(record) == ((NODE_RECORD, ('File', 'Greenroom')), {'name': 'a'})
+
+    def test_relationship_shape(self):
+        record = {'type': 'relationship', 'label': 'own', 'start_label': 'Container', 'start_id': 3,
+                  'end_label': 'File', 'end_params': {'name': 'a', 'code': 'b'}}
+
+        shape, row = record_shape(record)
+
+        assert shape == (RELATIONSHIP_RECORD, 'own', 'Container', 'File', None, ('code', 'name'))
+        assert row == {'start': 3, 'end': {'name': 'a', 'code': 'b'}, 'properties': {}}
+
+    @pytest.mark.parametrize('record', [
+        {'type': 'node'},
+        {'type': 'edge'},
+        {'type': 'node', 'labels': ['File'], 'properties': [1]},
+        {'type': 'relationship', 'label': 'own', 'start_id': 1},
+        {'type': 'relationship', 'label': 'own', 'start_id': 1, 'end_params': {}},
+    ])
+    def test_invalid_records(self, record):
+        with pytest.raises(ValueError):
+            record_shape(record)
+
+    def test_batches_group_the_records_of_the_same_shape(self):
+        node = {'type': 'node', 'labels': ['File']}
+        relation = {'type': 'relationship', 'label': 'own', 'start_id': 1, 'end_id': 2}
+        records = enumerate([node, node, node, {'type': 'node'}, relation, relation])
+
+        batches = list(record_batches(records, None, batch_size=2))
+
+        assert [(x[0], x[1], len(x[2])) for x in batches] == [
+            (NODE_RECORD, 0, 2), (NODE_RECORD, 3, 1), (NODE_RECORD, 2, 1), (RELATIONSHIP_RECORD, 4, 2)]
+        assert [x['index'] for x in batches[3][2]] == [4, 5]
+
+    def test_invalid_record_is_a_failed_batch(self):
+        batches = record_batches(enumerate([{'type': 'node'}]), None)
+
+        statuses = list(pipeline(batches))
+
+        assert statuses == [{'chunk': 0, 'offset': 0, 'size': 1, 'status': CHUNK_FAILED, 'error': 'labels is required'}]
+
+    def test_batches_are_written_with_their_shape(self):
+        written = []
+        records = enumerate([{'type': 'node', 'labels': 'File', 'properties': {'name': 'a'}}])
+
+        list(pipeline(record_batches(records, lambda shape, rows: written.append((shape, rows)))))
+
+        assert written == [((NODE_RECORD, ('File',)), [{'name': 'a'}])]
+
+    def test_next_phase_waits_for_the_running_batches(self):
+        events = []
+
+        def write(name, delay):
+            def run(rows):
+                time.sleep(delay)
+                events.append(name)
+            return run
+
+        batches = [('node', 0, [1], write('slow node', 0.05)), ('node', 1, [1], write('node', 0)),
+                   ('relationship', 2, [1], write('relationship', 0))]
+
+        list(pipeline(iter(batches), parallelism=4))
+
+        assert events[-1] == 'relationship'
+
+    def test_job_progress(self):
+        job = IngestJob()
+
+        job.update({'chunk': 0, 'offset': 0, 'size': 3, 'status': CHUNK_SUCCESS, 'missing': [{'index': 1}]})
+        job.update({'chunk': 1, 'offset': 3, 'size': 1, 'status': CHUNK_FAILED, 'error': 'boom'})
+        job.finish()
+
+        progress = job.to_dict()
+        assert progress['status'] == 'partial'
+        assert (progress['records'], progress['written'], progress['failed'], progress['missing_endpoints']) == \
+            (4, 2, 1, 1)
+        assert progress['errors'] == [{'offset': 3, 'error': 'boom'}]
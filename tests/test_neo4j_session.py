@@ -0,0 +1,91 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from neo4j_api.neo4j_session import SessionManager
+
+
+@pytest.fixture
+def gateway():
+    gateway = MagicMock()
+    gateway.session.return_value.run.return_value = iter([1, 2, 3])
+    yield gateway
+
+
+class TestSessionManager:
+    def test_run_consumes_result_and_closes_session(self, gateway):
+        manager = SessionManager(gateway, max_sessions=1)
+
+        result = manager.run('RETURN 1')
+
+        assert result == [1, 2, 3]
+        gateway.session.return_value.close.assert_called_once()
+        assert manager.stats()['active'] == 0
+
+    def test_stream_closes_session_when_exhausted(self, gateway):
+        manager = SessionManager(gateway, max_sessions=1)
+
+        records = manager.stream('RETURN 1')
+        assert next(records) == 1
+        assert manager.stats()['active'] == 1
+
+        assert list(records) == [2, 3]
+        gateway.session.return_value.close.assert_called_once()
+        assert manager.stats()['active'] == 0
+
+    def test_stream_dropped_early_is_counted_as_abandoned(self, gateway):
+        manager = SessionManager(gateway, max_sessions=1)
+
+        records = manager.stream('RETURN 1')
+        next(records)
+        records.close()
+
+        stats = manager.stats()
+        assert stats['abandoned'] == 1
+        assert stats['active'] == 0
+
+    def test_session_raises_when_no_slot_is_free(self, gateway):
+        manager = SessionManager(gateway, max_sessions=1, acquire_timeout=0.01)
+
+        with manager.session():
+            with pytest.raises(Exception):
+                manager.run('RETURN 1')
+
+        assert manager.stats()['timeouts'] == 1
+        assert manager.run('RETURN 1') == [1, 2, 3]
+
+    def test_estimate_rows_reads_the_plan(self, gateway):
+        gateway.session.return_value.run.return_value = MagicMock()
+        gateway.session.return_value.run.return_value.consume.return_value.plan = {'args': {'EstimatedRows': 41.7}}
+        manager = SessionManager(gateway, max_sessions=1)
+
+        assert manager.estimate_rows('MATCH (n:File) RETURN n') == 41
+        assert gateway.session.return_value.run.call_args[0][0] == 'EXPLAIN MATCH (n:File) RETURN n'
+        assert manager.stats()['active'] == 0
+
+    def test_write_runs_a_write_transaction(self, gateway):
+        manager = SessionManager(gateway, max_sessions=1)
+        gateway.session.return_value.write_transaction.side_effect = lambda work: work('tx')
+
+        assert manager.write(lambda tx: tx + '!') == 'tx!'
+        gateway.session.return_value.close.assert_called_once()
@@ -0,0 +1,110 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+from unittest.mock import MagicMock
+
+import neotime
+import pytest
+from neo4j.graph import Graph
+from neo4j.graph import Node
+
+from neo4j_api.pagination import check_total_mode
+from neo4j_api.pagination import cursor_condition
+from neo4j_api.pagination import decode_cursor
+from neo4j_api.pagination import encode_cursor
+from neo4j_api.pagination import node_cursor
+from neo4j_api.pagination import node_page_headers
+from neo4j_api.pagination import order_clause
+from neo4j_api.pagination import short_page_total
+
+
+class TestCursor:
+    def test_cursor_round_trip(self):
+        value = neotime.DateTime(2021, 1, 8, 17, 4, 4.123456789)
+        cursor = encode_cursor('time_created', 'DESC', value, 42)
+
+        assert decode_cursor(cursor, 'time_created', 'desc') == (value, 42)
+
+    def test_cursor_is_bound_to_the_ordering(self):
+        cursor = encode_cursor('name', None, 'abc', 42)
+
+        with pytest.raises(Exception, match='order_by and order_type'):
+            decode_cursor(cursor, 'name', 'desc')
+
+    def test_invalid_cursor(self):
+        with pytest.raises(Exception, match='Invalid cursor'):
+            decode_cursor('not a cursor', 'name', None)
+
+    def test_node_cursor_only_for_full_pages(self):
+        node = MagicMock(identity=7)
+        node.get.return_value = 'abc'
+
+        assert node_cursor([node], 2, 'name', None) is None
+        assert decode_cursor(node_cursor([node, node], 2, 'name', None), 'name', None) == ('abc', 7)
+
+    def test_node_cursor_of_a_driver_node(self):
+        node = Node(Graph(), 7, ['File'], {'name': 'abc'})
+
+        assert decode_cursor(node_cursor([node], 1, 'name', None), 'name', None) == ('abc', 7)
+
+    def test_node_page_headers_only_with_a_keyset_order(self):
+        node = MagicMock(identity=7)
+        node.get.return_value = 'abc'
+
+        assert node_page_headers([node, node], 2, None, None, None) == {}
+        assert node_page_headers([node], 2, 'name', None, None) == {}
+        assert node_page_headers([node, node], 2, 'name', None, None) == {
+            'X-Next-Cursor': node_cursor([node, node], 2, 'name', None)
+        }
+
+
+class TestCursorCondition:
+    def test_ascending_keeps_the_nulls_after_the_values(self):
+        condition = cursor_condition('_', 'name', 'asc', 'id(_)', 'abc', '$v', '$id')
+
+        assert condition == '(_.name > $v OR (_.name = $v AND id(_) > $id) OR _.name IS NULL)'
+
+    def test_descending_from_the_nulls(self):
+        condition = cursor_condition('_', 'name', 'desc', 'id(_)', None, '$v', '$id')
+
+        assert condition == '(_.name IS NOT NULL OR id(_) < $id)'
+
+    def test_id_only(self):
+        assert cursor_condition('_', None, None, 'id(r)', None, '$v', '$id') == 'id(r) > $id'
+
+    def test_order_clause_breaks_ties_on_the_id(self):
+        assert order_clause('end_node', 'name', 'DESC', 'id(r)') == ['end_node.name DESC', 'id(r) DESC']
+        assert order_clause('_', None, None, 'id(_)') == ['id(_)']
+
+
+class TestTotal:
+    def test_short_page_tells_the_total(self):
+        assert short_page_total([1, 2], 5, 10, None) == 12
+        assert short_page_total([1, 2], 5, None, None) == 2
+        assert short_page_total([], 5, None, None) == 0
+
+    def test_total_has_to_be_counted(self):
+        # full page, past the last page and cursor pages
+        assert short_page_total([1, 2], 2, 10, None) is None
+        assert short_page_total([], 5, 10, None) is None
+        assert short_page_total([1], 5, None, 'cursor') is None
+
+    def test_invalid_total_mode(self):
+        with pytest.raises(Exception, match='Invalid total'):
+            check_total_mode('approximate')
@@ -0,0 +1,124 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+from unittest.mock import MagicMock
+
+import pytest
+
+from neo4j_api.property_catalog import PropertyCatalog
+
+
+@pytest.fixture
+def sessions():
+    yield MagicMock()
+
+
+class TestPropertyCatalog:
+    def test_entries_group_the_distinct_values(self, sessions):
+        catalog = PropertyCatalog(sessions, enabled=True)
+
+        entries = catalog.entries([
+            (['File', 'Greenroom'], {'name': 'a', 'tags': ['x'], 'time_created': 'now', 'name__lc': 'a'}),
+            (['File'], {'name': 'a', 'archived': False}),
+        ])
+
+        assert {(x['label'], x['key']): x['values'] for x in entries} == {
+            ('File', 'name'): ['"a"'],
+            ('Greenroom', 'name'): ['"a"'],
+            ('File', 'tags'): ['["x"]'],
+            ('Greenroom', 'tags'): ['["x"]'],
+            ('File', 'archived'): ['false'],
+        }
+
+    def test_entries_are_capped(self, sessions):
+        catalog = PropertyCatalog(sessions, enabled=True, max_values=2)
+
+        entries = catalog.entries([(['File'], {'name': x}) for x in 'abc'])
+
+        assert entries == [{'label': 'File', 'key': 'name', 'values': ['"a"', '"b"'], 'truncated': True}]
+
+    def test_disabled_catalog_does_not_write(self, sessions):
+        PropertyCatalog(sessions, enabled=False).record([(['File'], {'name': 'a'})])
+
+        sessions.run.assert_not_called()
+        sessions.write.assert_not_called()
+
+    def test_entries_are_written_in_lock_order(self, sessions):
+        entries = PropertyCatalog(sessions, enabled=True).entries([
+            (['Greenroom', 'File'], {'uploader': 'a', 'archived': False}),
+        ])
+
+        assert [(x['label'], x['key']) for x in entries] == [
+            ('File', 'archived'), ('File', 'uploader'), ('Greenroom', 'archived'), ('Greenroom', 'uploader')]
+
+    def test_only_new_values_are_written(self, sessions):
+        tx = MagicMock()
+        tx.run.return_value = []
+        sessions.write.side_effect = lambda work: work(tx)
+        catalog = PropertyCatalog(sessions, enabled=True)
+
+        catalog.record([(['File'], {'uploader': 'a'})])
+        catalog.record([(['File'], {'uploader': 'a'})])
+        catalog.record([(['File'], {'uploader': 'a'}), (['File'], {'uploader': 'b'})])
+
+        assert [x[1]['entries'][0]['values'] for x in tx.run.call_args_list] == [['"a"'], ['"b"']]
+
+    def test_full_keys_are_not_written(self, sessions):
+        tx = MagicMock()
+        tx.run.return_value = [{'label': 'File', 'key': 'name'}]
+        sessions.write.side_effect = lambda work: work(tx)
+        catalog = PropertyCatalog(sessions, enabled=True, max_values=1)
+
+        catalog.record([(['File'], {'name': 'a'}), (['File'], {'name': 'b'})])
+        catalog.record([(['File'], {'name': 'c'})])
+
+        assert tx.run.call_count == 1
+
+    def test_write_errors_are_raised(self, sessions):
+        sessions.write.side_effect = Exception('deadlock')
+
+        with pytest.raises(Exception):
+            PropertyCatalog(sessions, enabled=True).record([(['File'], {'name': 'a'})])
+
+    def test_values_are_decoded_and_limited(self, sessions):
+        sessions.run.return_value = [
+            {'key': 'name', 'values': ['"a"', '"b"'], 'truncated': False},
+            {'key': 'tags', 'values': ['["x"]'], 'truncated': True},
+        ]
+
+        result, truncated = PropertyCatalog(sessions, enabled=True).values('File', limit=1)
+
+        assert result == {'name': ['a'], 'tags': [['x']]}
+        assert truncated == ['name', 'tags']
+
+    def test_rebuild_streams_the_nodes_once(self, sessions):
+        sessions.stream.return_value = iter([
+            {'labels': ['File'], 'properties': {'name': 'a'}},
+            {'labels': ['File'], 'properties': {'name': 'b'}},
+            {'labels': ['File'], 'properties': {'name': 'c'}},
+        ])
+        tx = MagicMock()
+        tx.run.return_value = []
+        sessions.write.side_effect = lambda work: work(tx)
+
+        count = PropertyCatalog(sessions, enabled=True).rebuild(sessions, label='File', batch_size=2)
+
+        assert count == 3
+        sessions.stream.assert_called_once()
+        assert [x[1]['entries'][0]['values'] for x in tx.run.call_args_list] == [['"a"', '"b"'], ['"c"']]
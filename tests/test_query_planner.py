@@ -0,0 +1,208 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+
+from unittest.mock import MagicMock
+
+import neotime
+import pytest
+from py2neo import Node
+from py2neo.matching import And
+from py2neo.matching import EqualTo
+from py2neo.matching import GreaterThan
+from py2neo.matching import Like
+from py2neo.matching import StartsWith
+
+from neo4j_api.query_planner import PredicatePlanner
+from neo4j_api.query_planner import SchemaIndexCatalog
+from neo4j_api.query_planner import match_query
+from neo4j_api.query_planner import split_time_ranges
+from neo4j_api.query_planner import time_bound
+from neo4j_api.query_planner import time_range_predicate
+from neo4j_api.shadow_properties import ShadowProperties
+
+
+@pytest.fixture
+def sessions():
+    sessions = MagicMock()
+    sessions.run.return_value = [
+        {
+            'name': 'index_code',
+            'state': 'ONLINE',
+            'type': 'BTREE',
+            'entityType': 'NODE',
+            'labelsOrTypes': ['Container'],
+            'properties': ['code'],
+        },
+        {
+            'name': 'index_name',
+            'state': 'POPULATING',
+            'type': 'BTREE',
+            'entityType': 'NODE',
+            'labelsOrTypes': ['User'],
+            'properties': ['name'],
+        },
+    ]
+    yield sessions
+
+
+@pytest.fixture
+def planner(sessions):
+    yield PredicatePlanner(SchemaIndexCatalog(sessions))
+
+
+class TestSchemaIndexCatalog:
+    def test_has_index_only_reports_online_indexes(self, sessions):
+        catalog = SchemaIndexCatalog(sessions)
+
+        assert catalog.has_index('Container', 'code')
+        assert catalog.has_index(['Greenroom', 'Container'], 'code')
+        assert not catalog.has_index('User', 'name')
+        assert not catalog.has_index('File', 'code')
+
+    def test_indexes_are_cached(self, sessions):
+        catalog = SchemaIndexCatalog(sessions, ttl=60)
+
+        catalog.indexes()
+        catalog.indexes()
+
+        sessions.run.assert_called_once()
+
+
+class TestPredicatePlanner:
+    def test_indexed_key_seeks_the_case_variants(self, planner):
+        key, predicate, indexed = planner.explain('Container', 'code', 'uTest')
+
+        assert key == 'code'
+        assert isinstance(predicate, And)
+        low, high, regex = predicate.values
+        assert (low.value, high.value, regex.value) == ('UTEST', 'utest', '(?i)uTest')
+        assert indexed
+
+    def test_case_variants_sort_between_the_bounds(self, planner):
+        low, high, _ = planner.plan('Container', 'code', 'Ab-é1')[1].values
+
+        for variant in ('ab-é1', 'AB-é1', 'aB-é1', 'Ab-é1'):
+            assert low.value <= variant <= high.value
+
+    def test_caseless_value_uses_equality(self, planner):
+        key, predicate = planner.plan('File', 'global_entity_id', '1234-5678')
+
+        assert isinstance(predicate, EqualTo)
+
+    def test_case_insensitive_string_keeps_regex(self, planner):
+        key, predicate, indexed = planner.explain('User', 'name', 'Admin', partial=True)
+
+        assert isinstance(predicate, Like)
+        assert predicate.value == '(?i).*Admin.*'
+        assert not indexed
+
+    def test_unindexed_key_keeps_regex(self, planner):
+        key, predicate, indexed = planner.explain('File', 'code', 'uTest')
+
+        assert isinstance(predicate, Like)
+        assert not indexed
+
+    def test_partial_indexed_key_keeps_regex(self, planner):
+        key, predicate = planner.plan('Container', 'code', 'test', partial=True)
+
+        assert isinstance(predicate, Like)
+
+    def test_explicit_operators(self, planner):
+        key, predicate = planner.plan('File', 'name', {'starts_with': 'abc'})
+        assert isinstance(predicate, StartsWith)
+
+        key, predicate = planner.plan('File', 'file_size', {'gte': 1, 'lt': 10})
+        assert isinstance(predicate, And)
+
+        with pytest.raises(Exception):
+            planner.plan('File', 'name', {'regex': '.*'})
+
+    def test_case_insensitive_string_uses_shadow_property(self, sessions):
+        shadow_properties = ShadowProperties(['name'], enabled=True)
+        planner = PredicatePlanner(SchemaIndexCatalog(sessions), shadow_properties=shadow_properties)
+
+        key, predicate = planner.plan('User', 'name', 'Admin')
+
+        assert key == 'name__lc'
+        assert isinstance(predicate, EqualTo)
+        assert predicate.value == 'admin'
+
+
+class TestMatchQuery:
+    def test_predicates_and_start_clause(self):
+        predicates = [EqualTo('a').compile('name', 1), ('$tag IN _.tags', {'tag': 'x'})]
+
+        query, params = match_query(['File'], ('CALL f() YIELD node AS _', {'q': 'b'}), predicates).build()
+
+        assert query == 'CALL f() YIELD node AS _ WITH _ MATCH (_:File) WHERE _.name = $`1` AND $tag IN _.tags'
+        assert params == {'q': 'b', '1': 'a', 'tag': 'x'}
+
+    def test_without_predicates(self):
+        assert match_query(['File']).build() == ('MATCH (_:File)', {})
+
+
+class TestShadowProperties:
+    def test_apply_adds_lower_cased_copies(self):
+        shadow_properties = ShadowProperties(['name', 'email'], enabled=True)
+
+        node = shadow_properties.apply({'name': 'Admin', 'email': None, 'code': 'ABC'})
+
+        assert node == {'name': 'Admin', 'name__lc': 'admin', 'email': None, 'email__lc': None, 'code': 'ABC'}
+
+    def test_apply_leaves_missing_sources_alone(self):
+        shadow_properties = ShadowProperties(['name'], enabled=True)
+
+        assert shadow_properties.apply({'code': 'ABC'}) == {'code': 'ABC'}
+
+    def test_apply_removes_the_shadow_of_a_removed_source(self):
+        shadow_properties = ShadowProperties(['name'], enabled=True)
+        node = Node('User', name='Admin', name__lc='admin')
+        node.update(name=None)
+
+        shadow_properties.apply(node)
+
+        assert dict(node) == {}
+
+    def test_apply_does_nothing_when_disabled(self):
+        shadow_properties = ShadowProperties(['name'])
+
+        assert shadow_properties.apply({'name': 'Admin'}) == {'name': 'Admin'}
+
+
+class TestTimeRanges:
+    def test_bounds_are_converted_to_naive_utc(self):
+        assert time_bound('2021-01-08T17:04:04') == neotime.DateTime(2021, 1, 8, 17, 4, 4)
+        assert time_bound('2021-01-08T17:04:04Z') == neotime.DateTime(2021, 1, 8, 17, 4, 4)
+        assert time_bound('2021-01-08T17:04:04+02:00') == neotime.DateTime(2021, 1, 8, 15, 4, 4)
+
+    def test_windows_are_split_from_the_filters(self):
+        windows, remaining = split_time_ranges(
+            {'time_lastmodified_start': '2021-01-08T00:00:00', 'name': 'abc', 'archived': False}
+        )
+
+        assert windows == {'time_lastmodified': {'start': neotime.DateTime(2021, 1, 8, 0, 0, 0)}}
+        assert remaining == {'name': 'abc', 'archived': False}
+        assert isinstance(time_range_predicate(windows['time_lastmodified']), GreaterThan)
+
+    def test_create_time_window_is_closed_with_the_current_time(self):
+        windows, _ = split_time_ranges({'create_time_start': '2021-01-08T00:00:00'})
+
+        assert windows['time_created']['end'] > windows['time_created']['start']
+        assert isinstance(time_range_predicate(windows['time_created']), And)
@@ -0,0 +1,102 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+from unittest.mock import MagicMock
+
+import pytest
+
+from neo4j_api.schema_registry import SchemaRegistry
+
+
+def index(label, key, state='ONLINE', unique=False):
+    return {
+        'name': f'{label}_{key}',
+        'state': state,
+        'type': 'BTREE',
+        'entity_type': 'NODE',
+        'labels': [label],
+        'properties': [key],
+        'unique': unique,
+    }
+
+
+@pytest.fixture
+def index_catalog():
+    index_catalog = MagicMock()
+    indexes = [
+        index('File', 'global_entity_id', unique=True),
+        index('Container', 'code'),
+        index('User', 'email', state='POPULATING'),
+    ]
+    index_catalog.indexes.return_value = indexes
+    index_catalog.refresh.return_value = indexes
+    index_catalog.has_index.side_effect = lambda labels, key: any(
+        x['state'] == 'ONLINE' and x['labels'][0] in labels and x['properties'] == [key] for x in indexes
+    )
+    yield index_catalog
+
+
+@pytest.fixture
+def registry(index_catalog):
+    yield SchemaRegistry(
+        index_catalog,
+        unique_constraints={'global_entity_id': ['File'], 'code': ['Container']},
+        indexes={'email': ['User'], 'name': ['User']},
+    )
+
+
+class TestSchemaRegistry:
+    def test_status_reports_the_state_of_each_definition(self, registry):
+        states = {x['name']: x['state'] for x in registry.status()}
+
+        assert states == {
+            'File_global_entity_id_unique': 'ONLINE',
+            'Container_code_unique': 'NOT_UNIQUE',
+            'User_email': 'POPULATING',
+            'User_name': 'MISSING',
+        }
+        assert not registry.ready()
+
+    def test_ensure_creates_only_the_missing_definitions(self, registry):
+        sessions = MagicMock()
+
+        result = registry.ensure(sessions)
+
+        assert result == {'created': ['User_name'], 'failed': {}, 'skipped': ['Container_code_unique']}
+        sessions.run.assert_called_once_with('CREATE INDEX User_name IF NOT EXISTS FOR (n:User) ON (n.name)')
+
+    def test_ensure_reports_the_failures(self, registry):
+        sessions = MagicMock()
+        sessions.run.side_effect = Exception('duplicated values')
+
+        result = registry.ensure(sessions)
+
+        assert result['failed'] == {'User_name': 'duplicated values'}
+
+    def test_unsupported_shapes_are_sorted_by_frequency(self, registry):
+        for _ in range(3):
+            registry.record('File', ['uploader'])
+        registry.record(['User'], ['name', 'archived'])
+        registry.record('Container', ['code'])
+        registry.record('File', ['id'])
+
+        assert registry.unsupported_shapes() == [
+            {'labels': ['File'], 'keys': ['uploader'], 'count': 3},
+            {'labels': ['User'], 'keys': ['archived', 'name'], 'count': 1},
+        ]
@@ -0,0 +1,100 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+import threading
+import time
+
+import pytest
+
+from neo4j_api.cache import WriteEpochs
+from neo4j_api.single_flight import SingleFlight
+
+
+def run_concurrently(single_flight, count, params, work, labels=None):
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(single_flight.do('query', params, work, labels)))
+        for _ in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+class TestSingleFlight:
+    def test_concurrent_identical_calls_share_one_execution(self):
+        single_flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def work():
+            calls.append(1)
+            release.wait(5)
+            return 42
+
+        threads, results = run_concurrently(single_flight, 5, {'a': 1, 'b': 2}, work)
+        while single_flight.stats()['coalesced'] < 4:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert results == [42] * 5
+        assert len(calls) == 1
+        assert single_flight.stats()['executions'] == 1
+        assert single_flight.stats()['in_flight'] == 0
+
+    def test_ignored_keys_are_normalised_away(self):
+        single_flight = SingleFlight(ignored_keys=['request_id'])
+
+        assert single_flight.key('query', {'a': 1, 'request_id': 'x'}) == \
+            single_flight.key('query', {'request_id': 'y', 'a': 1})
+        assert single_flight.key('query', {'a': 1}) != single_flight.key('query', {'a': 2})
+
+    def test_shape_normaliser(self):
+        single_flight = SingleFlight(normalizers={'query': lambda params: {'name': params['name'].lower()}})
+
+        assert single_flight.key('query', {'name': 'A'}) == single_flight.key('query', {'name': 'a'})
+
+    def test_write_separates_the_calls(self):
+        epochs = WriteEpochs()
+        single_flight = SingleFlight(epochs)
+        key = single_flight.key('query', {}, ['File'])
+
+        epochs.bump('File')
+
+        assert single_flight.key('query', {}, ['File']) != key
+
+    def test_error_is_raised_and_not_kept(self):
+        single_flight = SingleFlight()
+
+        def fail():
+            raise Exception('boom')
+
+        with pytest.raises(Exception):
+            single_flight.do('query', {}, fail)
+
+        assert single_flight.do('query', {}, lambda: 1) == 1
+        assert single_flight.stats()['errors'] == 1
+
+    def test_disabled(self):
+        single_flight = SingleFlight(enabled=False)
+
+        assert single_flight.do('query', {}, lambda: 1) == 1
+        assert single_flight.stats()['executions'] == 0
@@ -0,0 +1,73 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+from neo4j_api.sketches import HyperLogLog
+from neo4j_api.sketches import TopValues
+from neo4j_api.sketches import sketch_properties
+
+
+class TestHyperLogLog:
+    def test_small_cardinality_is_close(self):
+        sketch = HyperLogLog()
+        for i in range(100):
+            sketch.add(f'value-{i % 50}')
+
+        assert 48 <= sketch.estimate() <= 52
+
+    def test_large_cardinality_is_within_the_error(self):
+        sketch = HyperLogLog(precision=12)
+        for i in range(50000):
+            sketch.add(i)
+
+        assert abs(sketch.estimate() - 50000) < 50000 * 0.05
+
+
+class TestTopValues:
+    def test_frequent_values_survive(self):
+        values = TopValues(capacity=5)
+        for i in range(1000):
+            values.add('frequent' if i % 3 == 0 else f'rare-{i}')
+
+        top = values.top(1)
+
+        assert top[0]['value'] == 'frequent'
+        assert values.dropped
+
+
+class TestSketchProperties:
+    def test_summary_of_each_property(self):
+        nodes = [
+            {'name': 'a', 'tags': ['raw', 'x'], 'time_created': 'now', 'name__lc': 'a'},
+            {'name': 'b', 'tags': ['raw']},
+            {'name': 'b', 'archived': None},
+        ]
+
+        result = sketch_properties(iter(nodes), top_k=1)
+
+        assert set(result) == {'name', 'tags'}
+        assert result['tags']['top'] == [{'value': 'raw', 'count': 2}]
+        assert result['tags']['cardinality'] == 2
+        assert result['tags']['truncated']
+        assert result['name']['top'] == [{'value': 'b', 'count': 2}]
+
+    def test_all_values_listed_is_not_truncated(self):
+        result = sketch_properties([{'archived': False}, {'archived': True}], top_k=5)
+
+        assert result['archived']['cardinality'] == 2
+        assert not result['archived']['truncated']
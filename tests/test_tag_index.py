@@ -0,0 +1,69 @@
+# Copyright 2022 Indoc Research
+# 
+# Licensed under the EUPL, Version 1.2 or – as soon they
+# will be approved by the European Commission - subsequent
+# versions of the EUPL (the "Licence");
+# You may not use this work except in compliance with the
+# Licence.
+# You may obtain a copy of the Licence at:
+# 
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+# 
+# Unless required by applicable law or agreed to in
+# writing, software distributed under the Licence is
+# distributed on an "AS IS" basis,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied.
+# See the Licence for the specific language governing
+# permissions and limitations under the Licence.
+# 
+from unittest.mock import MagicMock
+
+import pytest
+
+from neo4j_api.tag_index import TagIndex
+
+
+@pytest.fixture
+def sessions():
+    yield MagicMock()
+
+
+class TestTagIndex:
+    def test_disabled_index_does_not_write(self, sessions):
+        tag_index = TagIndex(sessions, enabled=False)
+
+        tag_index.sync([1, 2])
+        tag_index.sync_matching('File', ['global_entity_id'], [{'global_entity_id': 'geid'}])
+
+        assert not tag_index.covers('tags')
+        assert not tag_index.touches({'tags': ['a']})
+        sessions.run.assert_not_called()
+
+    def test_touches_only_the_tag_properties(self, sessions):
+        tag_index = TagIndex(sessions, enabled=True)
+
+        assert tag_index.touches({'name': 'a', 'system_tags': ['copied-to-core']})
+        assert not tag_index.touches({'name': 'a'})
+
+    def test_match_clause_requires_every_tag(self):
+        clause = TagIndex.match_clause('_', 'tags', ['$tag_0', '$tag_1'])
+
+        assert clause == 'MATCH (_)-[:HAS_TAG]->(:Tag {name: $tag_0}), (_)-[:HAS_TAG]->(:Tag {name: $tag_1})'
+
+    def test_sync_matching_sends_only_the_keys(self, sessions):
+        tag_index = TagIndex(sessions, enabled=True)
+
+        tag_index.sync_matching('File', ['global_entity_id'], [{'global_entity_id': 'geid', 'tags': ['a']}])
+
+        query = sessions.run.call_args[0][0]
+        assert query.startswith('UNWIND $rows AS row MATCH (n:File) WHERE n.global_entity_id = row.global_entity_id')
+        assert sessions.run.call_args[1] == {'rows': [{'global_entity_id': 'geid'}]}
+
+    def test_rebuild_streams_the_nodes_once(self, sessions):
+        sessions.stream.return_value = iter([{'id': 1}, {'id': 4}, {'id': 9}])
+        tag_index = TagIndex(sessions, enabled=True)
+
+        assert tag_index.rebuild(sessions, batch_size=2) == 3
+        sessions.stream.assert_called_once()
+        assert [x[1] for x in sessions.run.call_args_list] == [{'ids': [1, 4]}, {'ids': [9]}]
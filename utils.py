@@ -26,6 +26,11 @@ import neotime
 
 #from . import neo4j_connection
 
+# suffix of the lower cased copies of the searchable properties,
+# they are internal and never returned to the clients
+SHADOW_SUFFIX = '__lc'
+
+
 def node_2_json(obj):
     # print(obj)
     if hasattr(obj, "id"):
@@ -39,7 +44,8 @@ def node_2_json(obj):
             'labels': list(obj.labels)
         }
     # add the all the attribute all together
-    temp.update(dict(zip(obj.keys(), obj.values())))
+    temp.update({key: value for key, value in zip(obj.keys(), obj.values())
+                 if not key.endswith(SHADOW_SUFFIX)})
 
     # update the timestamp
     try: